@@ -3,7 +3,6 @@ import random
 import math
 import warnings
 from sys import maxsize
-import json
 
 
 """
@@ -22,6 +21,10 @@ Advanced strategy tips:
 class AlgoStrategy(gamelib.AlgoCore):
     def __init__(self):
         super().__init__()
+        # on_action_frame only reads breaches, so only they are decoded and frames without any are skipped
+        self.frame_fields = ["events.breach"]
+        # Number of turrets to build each turn beside the busiest tiles of the enemy's paths, 0 to not build any
+        self.heatmap_turrets = 0
         seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write('Random seed: {}'.format(seed))
@@ -94,8 +97,10 @@ class AlgoStrategy(gamelib.AlgoCore):
                 if game_state.turn_number % 2 == 1:
                     # To simplify we will just check sending them from back left and right
                     scout_spawn_location_options = [[13, 0], [14, 0]]
-                    best_location = self.least_damage_spawn_location(game_state, scout_spawn_location_options)
-                    game_state.attempt_spawn(SCOUT, best_location, 1000)
+                    # Paths and damage for every option are computed together, safest option first
+                    spawn_options = game_state.score_spawn_options(SCOUT, scout_spawn_location_options)
+                    if spawn_options:
+                        game_state.attempt_spawn(SCOUT, spawn_options[0].location, 1000)
 
                 # Lastly, if we have spare SP, let's build some supports
                 support_locations = [[13, 2], [14, 2], [13, 3], [14, 3]]
@@ -122,8 +127,9 @@ class AlgoStrategy(gamelib.AlgoCore):
 
     def build_reactive_defense(self, game_state):
         """
-        This function builds reactive defenses based on where the enemy scored on us from.
-        We can track where the opponent scored by looking at events in action frames 
+        This function builds reactive defenses based on where the enemy scored on us from,
+        and where enemy units would walk through our half of the map if they spawned now.
+        We can track where the opponent scored by looking at events in action frames
         as shown in the on_action_frame function
         """
         for location in self.scored_on_locations:
@@ -131,6 +137,36 @@ class AlgoStrategy(gamelib.AlgoCore):
             build_location = [location[0], location[1]+1]
             game_state.attempt_spawn(TURRET, build_location)
 
+        if self.heatmap_turrets > 0:
+            self.build_heatmap_turrets(game_state, self.heatmap_turrets)
+
+    def build_heatmap_turrets(self, game_state, count):
+        """
+        Builds up to count turrets beside the busiest tiles of the enemy's paths through our half.
+        Turrets only go on open tiles of our half that no enemy path crosses, so they don't reroute
+        the enemy, and never on our edges, so they don't block our own spawn locations.
+        """
+        heatmap = game_state.enemy_path_heatmap()
+        game_map = game_state.game_map
+        our_edges = game_map.get_edge_locations(game_map.BOTTOM_LEFT) + game_map.get_edge_locations(game_map.BOTTOM_RIGHT)
+        excluded = set(map(tuple, our_edges))
+        our_half = [location for location in game_map if location[1] < game_state.HALF_ARENA]
+        busiest = sorted(our_half, key=lambda location: heatmap[location[0]][location[1]], reverse=True)
+        built = 0
+        for x, y in busiest:
+            if built >= count or heatmap[x][y] == 0:
+                break
+            for build_location in ([x - 1, y], [x + 1, y], [x, y - 1], [x, y + 1]):
+                bx, by = build_location
+                if (by >= game_state.HALF_ARENA or tuple(build_location) in excluded
+                        or not game_map.in_arena_bounds(build_location) or heatmap[bx][by] > 0):
+                    continue
+                if game_state.attempt_spawn(TURRET, build_location):
+                    built += 1
+                    excluded.add((bx, by))
+                    break
+        return built
+
     def stall_with_interceptors(self, game_state):
         """
         Send out interceptors at random locations to defend our base from enemy moving units.
@@ -176,40 +212,14 @@ class AlgoStrategy(gamelib.AlgoCore):
         # By asking attempt_spawn to spawn 1000 units, it will essentially spawn as many as we have resources for
         game_state.attempt_spawn(DEMOLISHER, [24, 10], 1000)
 
-    def least_damage_spawn_location(self, game_state, location_options):
-        """
-        This function will help us guess which location is the safest to spawn moving units from.
-        It gets the path the unit will take then checks locations on that path to 
-        estimate the path's damage risk.
-        """
-        damages = []
-        # Get the damage estimate each path will take
-        for location in location_options:
-            path = game_state.find_path_to_edge(location)
-            damage = 0
-            for path_location in path:
-                # Get number of enemy turrets that can attack each location and multiply by turret damage
-                damage += len(game_state.get_attackers(path_location, 0)) * gamelib.GameUnit(TURRET, game_state.config).damage_i
-            damages.append(damage)
-        
-        # Now just return the location that takes the least damage
-        return location_options[damages.index(min(damages))]
-
     def detect_enemy_unit(self, game_state, unit_type=None, valid_x = None, valid_y = None):
-        total_units = 0
-        for location in game_state.game_map:
-            if game_state.contains_stationary_unit(location):
-                for unit in game_state.game_map[location]:
-                    if unit.player_index == 1 and (unit_type is None or unit.unit_type == unit_type) and (valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
-                        total_units += 1
-        return total_units
+        # The map indexes units by player and type, so only matching locations are visited
+        enemy_units = game_state.game_map.units_of(1, unit_type, valid_x, valid_y)
+        return len([unit for unit in enemy_units if unit.stationary])
         
     def filter_blocked_locations(self, locations, game_state):
-        filtered = []
-        for location in locations:
-            if not game_state.contains_stationary_unit(location):
-                filtered.append(location)
-        return filtered
+        blocked = game_state.game_map.blocked_board
+        return [location for location in locations if location not in blocked]
 
     def on_action_frame(self, turn_string):
         """
@@ -217,11 +227,12 @@ class AlgoStrategy(gamelib.AlgoCore):
         hundreds of times per turn and could slow the algo down so avoid putting slow code here.
         Processing the action frames is complicated so we only suggest it if you have time and experience.
         Full doc on format of a game frame at in json-docs.html in the root of the Starterkit.
+        AlgoCore passes a ParsedState, but a plain frame string, such as one from a replay file, works too.
         """
+        if not isinstance(turn_string, gamelib.ParsedState):
+            turn_string = gamelib.parse_fields(turn_string, ["events.breach"])
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
-        events = state["events"]
-        breaches = events["breach"]
+        breaches = turn_string.field("events.breach", [])
         for breach in breaches:
             location = breach[0]
             unit_owner_self = True if breach[4] == 1 else False
@@ -5,25 +5,53 @@ The GameState class in game_state.py is the main class most players interact wit
 It contains functions that let you get information about resources, deploy units, and help you strategize your move. \n
 
 The GameMap class in game_map.py represents the current game map. It can be used to access information related to the locations of units. 
-Investigating it is useful for any player that wants to access more information about the current state of the game. \n
+Investigating it is useful for any player that wants to access more information about the current state of the game. 
+ArrayGameMap is an alternative that stores units as columns in the UnitTable of unit_table.py and returns light views of them. \n
 
 The GameUnit class in unit.py represetns a single unit. 
 Investigating it is useful for any player that wants to access information about units. \n
 
 The AlgoCore class in algocore.py handles communication with the game engine, and forms the bones of an algo. AlgoStrategy inherits from it. 
-Investigating it is useful for advanced players interested in getting data from the action phase or communicating directly with the game engine. \n
+Investigating it is useful for advanced players interested in getting data from the action phase or communicating directly with the game engine. 
+It also starts a Deadline from deadline.py each turn, which anytime_search and iterative_deepening use to search for as long as the turn allows, 
+and can hand action frames to a BackgroundWorker from background.py to precompute the next turn. 
+It decodes each message once with message.py and passes the ParsedState, a str that also holds the decoded JSON in its data attribute. 
+Setting frame_fields makes it decode only those fields of action frames, and skip frames where they are empty. \n
 
-The Navigation class in navigation.py contains functions related to pathfinding, which are used by GameState in pathing related functions. 
-Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
+The Navigation classes in navigation.py contain functions related to pathfinding, which are used by GameState in pathing related functions. 
+GridPathFinder is the array backed default, ShortestPathFinder is the original reference implementation. \n 
 
-util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
+The Bitboard class in bitboard.py stores a set of map locations as the bits of a single int. 
+GameMap keeps bitboards of blocked locations, each player's structures and each unit type, which make flood fills and blocked checks cheap. \n
+
+geometry.py holds tables describing the arena that are built once on import: tile ids, bounds, edges, neighbors and distances. 
+GameMap, GameState and the pathfinders use them instead of recomputing the arena's shape. \n
+
+The DamageMap class in damage_map.py holds the damage per frame each location would receive from one player's enemies. 
+GameState.damage_map builds it once and updates only the locations that change. \n
+
+The Simulator class in simulator.py plays out the action phase that would follow a GameState, frame by frame. 
+It is useful for predicting breaches and destroyed structures before committing to a turn. 
+fidelity.py compares it with recorded replays, frame by frame. \n
+
+util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write(). 
+Its output goes to DEBUG_LOG in debug_log.py, a leveled log that is buffered and written once per turn. \n
+
+profiler.py times turns, gamelib functions and profile_section blocks once AlgoCore.enable_profiling is called, 
+and writes a JSON summary and collapsed stacks for flamegraphs at the end of the game. \n
+
+AlgoCore can record the messages it receives to record_path, and replayer.py plays such a recording back into an algo 
+in the same process with a fixed random seed, timing each turn and checking the commands are the same every run. 
 """
 
 from .algocore import AlgoCore
 from .util import debug_write
 from .game_state import GameState
 from .unit import GameUnit
-from .game_map import GameMap
+from .game_map import GameMap, ArrayGameMap
+from .bitboard import Bitboard
+from .message import ParsedState, decode, parse_fields
+from .profiler import profile_section
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util", "bitboard", "geometry", "unit_table", "damage_map", "simulator", "fidelity", "deadline", "background", "message", "debug_log", "profiler", "replayer"]
  
\ No newline at end of file
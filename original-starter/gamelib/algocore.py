@@ -1,7 +1,18 @@
-import json
+import time
+from functools import partial
 
 from .game_state import GameState
+from .deadline import Deadline
+from .background import BackgroundWorker, precompute_artifacts
+from .message import ParsedState, loads, classify, parse_fields, CONFIG, TURN, FRAME, END
 from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .debug_log import DEBUG_LOG
+from .profiler import PROFILER, profile_section
+
+"""
+Share of the engine's soft time limit per turn that turn_budget defaults to
+"""
+TURN_BUDGET_FRACTION = 0.8
 
 class AlgoCore(object):
     """
@@ -10,10 +21,27 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * turn_budget (float): Seconds on_turn may use. Set it in __init__ to override the default, TURN_BUDGET_FRACTION of the config's waitTimeBotSoft
+        * deadline (:obj: Deadline): The current turn's deadline, started as soon as the turn's game state was received
+        * background_worker (:obj: BackgroundWorker): Receives every action frame when enabled, None otherwise
+        * background_wait (float): Seconds to wait for a background computation in progress when a turn arrives
+        * precomputed: The artifacts the background worker finished last from the previous action phase, collected before each on_turn. None if there are none.
+        * frame_fields (list): The action frame fields on_action_frame needs, such as "events.breach". None to decode whole frames.
+            When set, frames are only partially decoded, and skipped if none of the fields are present and non empty.
+        * profile_path (str): Where the profile summary is written at the end of the game when profiling is enabled, None otherwise
+        * record_path (str): Set it in __init__ to save every message from the engine to this file, for replayer.py. None to not record.
 
     """
     def __init__(self):
         self.config = None
+        self.turn_budget = None
+        self.deadline = None
+        self.background_worker = None
+        self.background_wait = 0
+        self.precomputed = None
+        self.frame_fields = None
+        self.profile_path = None
+        self.record_path = None
 
     def on_game_start(self, config):
         """
@@ -23,10 +51,36 @@ class AlgoCore(object):
         """
         self.config = config
 
+    def enable_background_precompute(self, compute=None, mode="thread"):
+        """
+        Opts in to computing artifacts for the next turn from action frames in the background.
+        Call it from on_game_start, after the config is set. \n
+        compute is a function taking an action frame string and returning the artifacts, 
+        precompute_artifacts from background.py by default. mode is "thread" or "process", see BackgroundWorker.
+        A thread offers no isolation from on_turn, a computation still running when the turn arrives competes with it for the GIL. 
+        Each on_turn then finds the artifacts of the latest finished frame of the previous action phase in self.precomputed.
+        """
+        if compute is None:
+            compute = partial(precompute_artifacts, self.config)
+        self.background_worker = BackgroundWorker(compute, mode)
+
+    def enable_profiling(self, path="profile.json"):
+        """
+        Opts in to measuring where the algo's time goes with the profiler from profiler.py. 
+        Every on_turn and on_action_frame is timed, along with the gamelib functions in TIMED_FUNCTIONS 
+        and any profile_section blocks, and calls of the functions in COUNTED_FUNCTIONS are counted. 
+        At the end of the game the summary is written to path as JSON, and the collapsed stacks for 
+        flamegraphs next to it with a .folded extension.
+        """
+        self.profile_path = path
+        PROFILER.reset()
+        PROFILER.enable()
+
     def on_turn(self, game_state):
         """
         This step function is called at the start of each turn.
         It is passed the current game state, which can be used to initiate a new GameState object. 
+        The game state is a ParsedState: the message string, with its decoded JSON in game_state.data. 
         By default, it sends empty commands to the game engine. \n
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
@@ -40,6 +94,8 @@ class AlgoCore(object):
         The action phase is made up of a sequence of distinct frames. 
         Each of these frames is sent to the algo in order. 
         They can be handled in this function. 
+        Each frame is a ParsedState, use action_frame_game_state.data rather than decoding it again. 
+        Set self.frame_fields to only decode the fields you use, and read them with action_frame_game_state.field. 
         """
         pass
 
@@ -52,44 +108,94 @@ class AlgoCore(object):
         The algo continues this loop until it recieves the "End" turn message from the game.
         """
         debug_write(BANNER_TEXT)
+        DEBUG_LOG.flush()
+
+        recording = None
+        if self.record_path is not None:
+            try:
+                # Line buffered, so the recording keeps every message even if the engine kills the algo
+                recording = open(self.record_path, "w", buffering=1)
+            except OSError as error:
+                debug_write("Could not record the game to {}: {}".format(self.record_path, error))
 
-        while True:
-            # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
-            # manually kill this Python program.
-            game_state_string = get_command()
-            if "replaySave" in game_state_string:
-                """
-                This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
-                """
-                parsed_config = json.loads(game_state_string)
-                self.on_game_start(parsed_config)
-            elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
-                if stateType == 0:
+        try:
+            while True:
+                # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
+                # manually kill this Python program.
+                game_state_string = get_command()
+                received = time.monotonic()
+                if recording is not None:
+                    recording.write(game_state_string if game_state_string.endswith("\n") else game_state_string + "\n")
+                # Classified without decoding, action frames may not need to be decoded at all
+                kind = classify(game_state_string)
+                if kind == CONFIG:
+                    """
+                    This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
+                    """
+                    parsed_config = loads(game_state_string)
+                    if self.turn_budget is None:
+                        soft_limit = parsed_config.get("timingAndReplay", {}).get("waitTimeBotSoft")
+                        if soft_limit:
+                            self.turn_budget = soft_limit / 1000 * TURN_BUDGET_FRACTION
+                    self.on_game_start(parsed_config)
+                elif kind == TURN:
                     """
                     This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
                     deploy phase. Printing is handled by the provided functions.
                     """
-                    self.on_turn(game_state_string)
-                elif stateType == 1:
+                    self.deadline = Deadline(self.turn_budget, received)
+                    # Decoded once here, on_turn gets the decoded data along with the string
+                    state = ParsedState(game_state_string)
+                    if self.background_worker is not None:
+                        # Artifacts of an earlier action phase, or still being computed, are discarded
+                        self.precomputed = self.background_worker.collect(self.background_wait, state.data["turnInfo"][1])
+                    with profile_section("on_turn"):
+                        self.on_turn(state)
+                    PROFILER.record_turn(state.data["turnInfo"][1], time.monotonic() - received)
+                    # The turn has been submitted, so writing the debug output no longer delays it
+                    DEBUG_LOG.flush()
+                elif kind == FRAME:
                     """
-                    If stateType == 1, this game_state_string string represents a single frame of an action phase
+                    This game_state_string string represents a single frame of an action phase
                     """
-                    self.on_action_frame(game_state_string)
-                elif stateType == 2:
+                    if self.frame_fields is None:
+                        state = ParsedState(game_state_string)
+                    else:
+                        state = parse_fields(game_state_string, self.frame_fields)
+                    if self.background_worker is not None:
+                        # Frames of an action phase hold that phase's turn number, their artifacts are for the next turn
+                        self.background_worker.submit(state, state.field("turnInfo")[1] + 1)
+                    if self.frame_fields is None or any(state.field(path) for path in self.frame_fields):
+                        with profile_section("on_action_frame"):
+                            self.on_action_frame(state)
+                        # Written now rather than after the next turn, the action phase is not timed
+                        DEBUG_LOG.flush()
+                elif kind == END:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
                     """
                     debug_write("Got end state, game over. Stopping algo.")
+                    if self.background_worker is not None:
+                        self.background_worker.stop()
                     break
-                else:
+                elif "turnInfo" in game_state_string:
                     """
                     Something is wrong? Received an incorrect or improperly formatted string.
                     """
                     debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
-            else:
-                """
-                Something is wrong? Received an incorrect or improperly formatted string.
-                """
-                debug_write("Got unexpected string : {}".format(game_state_string))
+                else:
+                    """
+                    Something is wrong? Received an incorrect or improperly formatted string.
+                    """
+                    debug_write("Got unexpected string : {}".format(game_state_string))
+        finally:
+            # Written at the end of the game, or before the error if the algo crashed
+            if recording is not None:
+                recording.close()
+            if self.profile_path is not None:
+                PROFILER.disable()
+                try:
+                    PROFILER.write(self.profile_path)
+                except OSError as error:
+                    debug_write("Could not write the profile to {}: {}".format(self.profile_path, error))
+            DEBUG_LOG.flush()
@@ -0,0 +1,179 @@
+"""
+Background precomputation during the action phase.
+
+After a turn is submitted the algo mostly waits for action frames. A BackgroundWorker
+receives the latest frame from AlgoCore and computes artifacts for the next turn
+from it on another thread or forked process, while the main loop keeps reading frames.
+When the next turn arrives AlgoCore collects the most recent finished artifacts into
+self.precomputed before calling on_turn.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .util import debug_write
+from .debug_log import DEBUG_LOG
+
+
+class BackgroundWorker:
+    """Runs a function on the latest action frame in the background
+
+    Only one computation runs at a time. Frames that arrive while it is busy replace each
+    other, so when it finishes it moves straight on to the newest frame and never falls behind.
+
+    Each frame is tagged with the turn its artifacts are for. collect only hands back artifacts
+    tagged with the turn it asks for, and a computation still running when collect returns is
+    abandoned: it cannot be interrupted, but its artifacts are dropped when it finishes.
+
+    In "thread" mode the function shares the algo's memory, including the path cache used
+    by GameState, so paths it finds are already cached when on_turn runs. It must not change
+    objects the main thread uses. A thread offers no isolation: an abandoned computation keeps
+    running during on_turn and competes with it for the GIL, so keep the computation short or
+    set a background_wait long enough for it to finish. In "process" mode it runs in a forked
+    process, the artifacts must be picklable, and only the returned artifacts are shared. An
+    abandoned computation then only competes for a CPU core. Platforms without fork fall back
+    to a thread.
+
+    Attributes :
+        * compute (function): Takes an action frame string and returns the artifacts
+        * mode (str): "thread" or "process"
+        * frames_computed (int): Number of frames the function finished
+        * frames_skipped (int): Number of frames replaced by a newer one before they were started
+        * frames_discarded (int): Number of finished frames dropped because collect had moved on to another turn
+
+    """
+    def __init__(self, compute, mode="thread"):
+        self.compute = compute
+        self.frames_computed = 0
+        self.frames_skipped = 0
+        self.frames_discarded = 0
+        if mode == "process" and "fork" in multiprocessing.get_all_start_methods():
+            self.mode = "process"
+            self.__executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork"))
+        else:
+            if mode not in ("thread", "process"):
+                debug_write("Unknown background worker mode '{}', using 'thread'".format(mode))
+            elif mode == "process":
+                debug_write("Forked processes are not available, running the background worker on a thread")
+            self.mode = "thread"
+            self.__executor = ThreadPoolExecutor(max_workers=1)
+        self.__lock = threading.RLock()
+        self.__finished_condition = threading.Condition(self.__lock)
+        self.__future = None
+        self.__future_turn = None
+        self.__abandoned = False
+        self.__pending = None
+        self.__result = None
+        self.__result_turn = None
+        self.__has_result = False
+
+    def submit(self, frame, turn=None):
+        """Hands the worker the latest action frame. Returns immediately.
+
+        Args:
+            frame: The action frame
+            turn: The turn the artifacts are for, the frame's turn number plus one. None to not tag the frame.
+        """
+        with self.__lock:
+            if self.__future is None:
+                self.__start(frame, turn)
+            else:
+                if self.__pending is not None:
+                    self.frames_skipped += 1
+                self.__pending = (frame, turn)
+
+    def __start(self, frame, turn):
+        try:
+            self.__future = self.__executor.submit(self.compute, frame)
+        except RuntimeError:
+            # The executor has been shut down
+            self.__future = None
+            return
+        self.__future_turn = turn
+        self.__abandoned = False
+        self.__future.add_done_callback(self.__finished)
+
+    def __finished(self, future):
+        with self.__lock:
+            if future is not self.__future:
+                return
+            if not future.cancelled():
+                error = future.exception()
+                if error is not None:
+                    DEBUG_LOG.error("Background computation failed: {}", error)
+                elif self.__abandoned:
+                    self.frames_discarded += 1
+                else:
+                    self.__result = future.result()
+                    self.__result_turn = self.__future_turn
+                    self.__has_result = True
+                    self.frames_computed += 1
+            self.__future = None
+            self.__finished_condition.notify_all()
+            if self.__pending is not None:
+                frame, turn = self.__pending
+                self.__pending = None
+                self.__start(frame, turn)
+
+    def collect(self, timeout=0, turn=None):
+        """Takes the artifacts of the most recent finished frame, and drops frames not yet started
+
+        A computation still running afterwards is abandoned, its artifacts are never handed back.
+
+        Args:
+            timeout: Seconds to wait for a computation in progress to finish, 0 to not wait
+            turn: Only artifacts of frames submitted for this turn are returned, others are discarded. None to accept any.
+
+        Returns:
+            The artifacts, or None if no frame for the turn finished since the last collect
+        """
+        with self.__lock:
+            self.__pending = None
+            future = self.__future
+            if future is not None and timeout:
+                self.__finished_condition.wait_for(lambda: self.__future is not future, timeout)
+            if self.__future is not None:
+                self.__abandoned = True
+            result = self.__result if self.__has_result else None
+            if self.__has_result and turn is not None and self.__result_turn != turn:
+                self.frames_discarded += 1
+                result = None
+            self.__result = None
+            self.__has_result = False
+            return result
+
+    def stop(self):
+        """Stops the worker, without waiting for a computation in progress
+        """
+        with self.__lock:
+            self.__pending = None
+        self.__executor.shutdown(wait=False)
+
+
+def precompute_artifacts(config, frame):
+    """The default background computation: artifacts for the next turn from an action frame
+
+    Mobile units in the frame are ignored, so the artifacts describe the structures the next turn starts with.
+
+    Returns:
+        A dict with the frame's "turn" number, the "blocked_hash" of its map so it can be compared
+        with the next turn's game_map.blocked_hash, the "enemy_path_heatmap" and the "damage"
+        per frame at each tile id for each player, as a (mobile, structure) pair of lists
+    """
+    from .game_state import GameState
+    game_state = GameState(config, frame)
+    game_state.suppress_warnings(True)
+    game_map = game_state.game_map
+    for player_index in (0, 1):
+        for unit in game_map.units_of(player_index):
+            if not unit.stationary:
+                game_map.remove_unit([unit.x, unit.y])
+    damage = {}
+    for player_index in (0, 1):
+        damage_map = game_state.damage_map(player_index)
+        damage[player_index] = (list(damage_map.mobile), list(damage_map.structure))
+    return {
+        "turn": game_state.turn_number,
+        "blocked_hash": game_map.blocked_hash,
+        "enemy_path_heatmap": game_state.enemy_path_heatmap(),
+        "damage": damage}
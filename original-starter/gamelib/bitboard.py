@@ -0,0 +1,186 @@
+"""
+Bitboards store one bit per map location in a single Python int, so questions about
+the whole arena, like "which tiles are blocked" or "which tiles can a unit here reach",
+become a few integer operations instead of loops over the map.
+
+Location [x, y] is bit y * ROW_BITS + x. Each row has one unused padding bit past x = 27,
+so shifting by one to move left or right can never wrap a tile onto the next row.
+"""
+from . import geometry
+
+ARENA_SIZE = geometry.ARENA_SIZE
+HALF_ARENA = geometry.HALF_ARENA
+ROW_BITS = ARENA_SIZE + 1
+ROW_MASK = (1 << ARENA_SIZE) - 1
+
+
+def bit_index(x, y):
+    """The bit used for location [x, y]
+    """
+    return y * ROW_BITS + x
+
+
+def _mask(locations):
+    mask = 0
+    for x, y in locations:
+        mask |= 1 << bit_index(x, y)
+    return mask
+
+
+VALID_MASK = _mask(geometry.LOCATIONS)
+BOTTOM_HALF_MASK = VALID_MASK & ((1 << (HALF_ARENA * ROW_BITS)) - 1)
+TOP_HALF_MASK = VALID_MASK & ~BOTTOM_HALF_MASK
+ROW_MASKS = [VALID_MASK & (ROW_MASK << (y * ROW_BITS)) for y in range(ARENA_SIZE)]
+COLUMN_MASKS = [_mask((x, y) for y in range(ARENA_SIZE)) & VALID_MASK for x in range(ARENA_SIZE)]
+# The four edges in GameMap.get_edges order: top right, top left, bottom left, bottom right
+EDGE_MASKS = [_mask(edge) for edge in geometry.EDGES]
+
+
+_RANGE_BITS = {}
+
+
+def range_bits(x, y, reach):
+    """Bits of every arena location less than reach away from the tile [x, y], cached per tile and reach
+    """
+    key = (x, y, reach)
+    bits = _RANGE_BITS.get(key)
+    if bits is None:
+        bits = _mask(geometry.locations_in_range(x, y, reach))
+        if geometry.in_bounds(x, y):
+            _RANGE_BITS[key] = bits
+    return bits
+
+
+def contains(bits, location):
+    """Checks if a location is set in a bitboard int. Locations outside the arena are never set.
+    """
+    x, y = location
+    if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE):
+        return False
+    return bits >> (y * ROW_BITS + x) & 1 == 1
+
+
+def expand(bits, passable=VALID_MASK):
+    """Adds every passable neighbor of the set locations
+    """
+    return (bits | bits << 1 | bits >> 1 | bits << ROW_BITS | bits >> ROW_BITS) & passable
+
+
+def flood_fill(seed, passable):
+    """Grows seed through passable locations until it stops changing
+
+    Args:
+        seed: The bits to start from
+        passable: The bits the fill is allowed to spread into
+
+    Returns:
+        Every location connected to seed through passable locations, including seed
+    """
+    filled = seed
+    while True:
+        grown = filled | ((filled << 1 | filled >> 1 | filled << ROW_BITS | filled >> ROW_BITS) & passable)
+        if grown == filled:
+            return filled
+        filled = grown
+
+
+def iter_locations(bits):
+    """Yields the [x, y] location of every set bit, from the bottom row up
+    """
+    while bits:
+        low_bit = bits & -bits
+        index = low_bit.bit_length() - 1
+        yield [index % ROW_BITS, index // ROW_BITS]
+        bits ^= low_bit
+
+
+def count(bits):
+    """Number of set bits
+    """
+    return bin(bits).count("1")
+
+
+class Bitboard:
+    """A set of map locations stored as the bits of an int
+
+    Supports 'location in board', len, iteration over [x, y] locations and
+    the set operators |, &, -, ^ and ~ (the complement within the arena).
+
+    Attributes :
+        * bits (int): Bit y * ROW_BITS + x is set for every location [x, y] in the set
+
+    """
+    def __init__(self, bits=0):
+        self.bits = bits
+
+    @classmethod
+    def from_locations(cls, locations):
+        """Creates a bitboard holding the given locations
+        """
+        board = cls()
+        for location in locations:
+            board.add(location)
+        return board
+
+    @classmethod
+    def edge(cls, quadrant_description):
+        """Creates a bitboard of one edge, use the GameMap edge constants
+        """
+        return cls(EDGE_MASKS[quadrant_description])
+
+    def add(self, location):
+        x, y = location
+        self.bits |= 1 << bit_index(x, y)
+
+    def discard(self, location):
+        x, y = location
+        self.bits &= ~(1 << bit_index(x, y))
+
+    def expand(self, passable=None):
+        """Returns a new bitboard with every neighbor of these locations added, limited to passable if given
+        """
+        return Bitboard(expand(self.bits, VALID_MASK if passable is None else passable.bits & VALID_MASK))
+
+    def flood_fill(self, passable):
+        """Returns a new bitboard with every location connected to these locations through passable locations
+        """
+        return Bitboard(flood_fill(self.bits, passable.bits & VALID_MASK))
+
+    def copy(self):
+        return Bitboard(self.bits)
+
+    def __contains__(self, location):
+        return contains(self.bits, location)
+
+    def __iter__(self):
+        return iter_locations(self.bits)
+
+    def __len__(self):
+        return count(self.bits)
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __eq__(self, other):
+        return isinstance(other, Bitboard) and self.bits == other.bits
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __or__(self, other):
+        return Bitboard(self.bits | other.bits)
+
+    def __and__(self, other):
+        return Bitboard(self.bits & other.bits)
+
+    def __sub__(self, other):
+        return Bitboard(self.bits & ~other.bits)
+
+    def __xor__(self, other):
+        return Bitboard(self.bits ^ other.bits)
+
+    def __invert__(self):
+        return Bitboard(VALID_MASK & ~self.bits)
+
+    def __repr__(self):
+        return "Bitboard({})".format(list(self))
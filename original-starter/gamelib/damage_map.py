@@ -0,0 +1,149 @@
+"""
+Per location damage a player's units would take each frame, kept up to date as the map changes.
+"""
+from . import geometry
+from .bitboard import iter_locations, range_bits
+
+
+class DamageMap:
+    """The damage per frame every location would receive from units attacking one player
+
+    Uses the same rule as GameState.get_attackers: a unit with damage attacks every location
+    within its attackRange, including upgraded range and damage. Values are stored by
+    geometry tile id, so the damage at [x, y] is mobile[geometry.tile_id(x, y)].
+
+    The map listens for location changes on its GameMap and only recomputes the
+    attackers at changed locations the next time it is updated. Editing a unit's
+    attributes directly is not seen, use the GameMap functions instead.
+
+    Attributes :
+        * player_index (int): The defending player, 0 for you 1 for the enemy
+        * mobile (list): Damage per frame to a mobile unit at each tile id
+        * structure (list): Damage per frame to a structure at each tile id
+        * sources (dict): Maps each attacking location (x, y) to a tuple of (damage_i, damage_f, attackRange) per attacker
+
+    """
+    def __init__(self, game_map, player_index):
+        self.game_map = game_map
+        self.player_index = player_index
+        self.mobile = [0] * geometry.TILE_COUNT
+        self.structure = [0] * geometry.TILE_COUNT
+        self.sources = {}
+        self.__hit_radius = game_map.config["unitInformation"][0].get("getHitRadius", 0)
+        self.__dirty = set()
+
+        occupied = 0
+        for board in game_map.unit_boards.values():
+            occupied |= board.bits
+        for x, y in iter_locations(occupied):
+            self.__update_location(x, y)
+        game_map.add_tile_watcher(self.__mark_dirty)
+
+    def __mark_dirty(self, x, y):
+        self.__dirty.add((x, y))
+
+    def update(self):
+        """Recomputes the attackers at every location that changed since the last update
+        """
+        if self.__dirty:
+            dirty = self.__dirty
+            self.__dirty = set()
+            for x, y in dirty:
+                self.__update_location(x, y)
+
+    def __update_location(self, x, y):
+        attackers = tuple(
+            (unit.damage_i, unit.damage_f, unit.attackRange) for unit in self.game_map[x, y]
+            if unit.damage_i + unit.damage_f > 0 and unit.player_index != self.player_index)
+        old_attackers = self.sources.get((x, y), ())
+        if attackers == old_attackers:
+            return
+        for damage_i, damage_f, attack_range in old_attackers:
+            self.__apply(x, y, -damage_i, -damage_f, attack_range)
+        for damage_i, damage_f, attack_range in attackers:
+            self.__apply(x, y, damage_i, damage_f, attack_range)
+        if attackers:
+            self.sources[x, y] = attackers
+        else:
+            self.sources.pop((x, y), None)
+
+    def __apply(self, x, y, damage_i, damage_f, attack_range):
+        mobile = self.mobile
+        structure = self.structure
+        tile_ids = geometry.TILE_IDS
+        range_squared = attack_range * attack_range
+        for target_x, target_y in geometry.locations_in_range(x, y, attack_range + self.__hit_radius):
+            if (target_x - x) ** 2 + (target_y - y) ** 2 <= range_squared:
+                tile = tile_ids[target_x * geometry.ARENA_SIZE + target_y]
+                mobile[tile] += damage_i
+                structure[tile] += damage_f
+
+    def mobile_damage(self, location):
+        """Damage per frame a mobile unit at location would take, 0 outside the arena
+        """
+        tile = geometry.tile_id(*location)
+        return 0 if tile is None else self.mobile[tile]
+
+    def structure_damage(self, location):
+        """Damage per frame a structure at location would take, 0 outside the arena
+        """
+        tile = geometry.tile_id(*location)
+        return 0 if tile is None else self.structure[tile]
+
+    def path_damage(self, path):
+        """Sum of the damage per frame a mobile unit would take at each location of a path
+
+        Args:
+            path: A list of locations, as returned by find_path_to_edge. None counts as no damage.
+
+        Returns:
+            The total damage
+        """
+        if not path:
+            return 0
+        mobile = self.mobile
+        tile_ids = geometry.TILE_IDS
+        return sum(mobile[tile_ids[x * geometry.ARENA_SIZE + y]] for x, y in path)
+
+
+class SpawnOption:
+    """How a mobile unit spawned at one location would fare, as scored by GameState.score_spawn_options
+
+    Attributes :
+        * location ([int, int]): The spawn location
+        * path (list): The path the unit would take
+        * frames_per_tile (float): Frames the unit spends on each tile, 1 / speed
+        * damage (float): Damage the unit would take over its whole path, from the DamageMap
+        * targets (int): Number of enemy structures within the unit's attack range of some tile of the path
+        * score (float): The value the options were ranked by, lower is better
+
+    """
+    def __init__(self, location, path, frames_per_tile, damage, targets):
+        self.location = location
+        self.path = path
+        self.frames_per_tile = frames_per_tile
+        self.damage = damage
+        self.targets = targets
+        self.score = None
+
+    def __repr__(self):
+        return "SpawnOption({}, damage: {}, targets: {}, score: {})".format(self.location, self.damage, self.targets, self.score)
+
+
+def path_range_bits(path, reach):
+    """Bitboard bits of every location less than reach away from some location of a path
+    """
+    bits = 0
+    for x, y in path:
+        bits |= range_bits(x, y, reach)
+    return bits
+
+
+"""
+Metrics for GameState.score_spawn_options. Each takes a SpawnOption and returns its score, lower is better.
+"""
+SPAWN_METRICS = {
+    "damage": lambda option: option.damage,
+    "targets": lambda option: -option.targets,
+    "targets_per_damage": lambda option: -option.targets / (1 + option.damage),
+}
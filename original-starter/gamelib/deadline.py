@@ -0,0 +1,127 @@
+"""
+Time budgets for a turn, and searches that stop when the budget runs out.
+
+AlgoCore starts a Deadline as soon as each turn's game state arrives and keeps it
+in self.deadline, so on_turn can check how much time is left. anytime_search and
+iterative_deepening use a Deadline to keep improving an answer for as long as
+the turn allows and return the best one found.
+"""
+import time
+
+
+class Deadline:
+    """A time budget measured with a monotonic clock
+
+    Attributes :
+        * budget (float): The seconds available, None for no limit
+        * start (float): The clock time the budget started at
+        * clock (function): Returns the current time in seconds, time.monotonic by default
+
+    """
+    def __init__(self, budget, start=None, clock=time.monotonic):
+        self.budget = budget
+        self.clock = clock
+        self.start = clock() if start is None else start
+
+    def elapsed(self):
+        """Seconds since the deadline started
+        """
+        return self.clock() - self.start
+
+    def remaining(self):
+        """Seconds left before the deadline, never negative. Infinite without a budget.
+        """
+        if self.budget is None:
+            return float("inf")
+        return max(0.0, self.budget - self.elapsed())
+
+    def expired(self):
+        """Whether the deadline has passed
+        """
+        return self.budget is not None and self.elapsed() >= self.budget
+
+    def sub(self, seconds=None, fraction=None):
+        """Creates a deadline for part of the remaining time, starting now and never ending after this one
+
+        Args:
+            seconds: The most seconds the part may take
+            fraction: The most of the remaining time the part may take, between 0 and 1
+
+        Returns:
+            The new Deadline
+        """
+        budget = self.remaining()
+        if fraction is not None:
+            budget *= fraction
+        if seconds is not None:
+            budget = min(budget, seconds)
+        return Deadline(None if budget == float("inf") else budget, clock=self.clock)
+
+    def __repr__(self):
+        return "Deadline(budget: {}, elapsed: {:.3f})".format(self.budget, self.elapsed())
+
+
+def anytime_search(candidates, evaluate, deadline):
+    """Evaluates candidates until they run out or the deadline passes, keeping the best
+
+    At least one candidate is evaluated if there are any, so there is always an answer.
+
+    Args:
+        candidates: An iterable of candidates, ideally ordered from most to least promising. It may be a generator.
+        evaluate: A function taking a candidate and returning its score, higher is better
+        deadline: The Deadline to stop at
+
+    Returns:
+        A tuple of the best candidate, its score and the number of candidates evaluated.
+        The candidate and score are None if there were no candidates.
+    """
+    best = None
+    best_score = None
+    evaluated = 0
+    for candidate in candidates:
+        if evaluated and deadline.expired():
+            break
+        score = evaluate(candidate)
+        evaluated += 1
+        if best_score is None or score > best_score:
+            best = candidate
+            best_score = score
+    return best, best_score, evaluated
+
+
+def iterative_deepening(search, deadline, max_depth=None, start_depth=1):
+    """Runs a search at increasing depths while there is time to finish the next one
+
+    The time each depth takes is used to predict the next, assuming it grows by the
+    same factor, and a depth predicted to miss the deadline is not started. The search
+    itself should also check the deadline if a single depth can run long.
+
+    Args:
+        search: A function taking a depth and returning a result
+        deadline: The Deadline to stop at
+        max_depth: The deepest search to run, None for no limit. Without a limit on either the
+            depth or the deadline only start_depth is searched.
+        start_depth: The first depth to search, always run
+
+    Returns:
+        A tuple of the result of the deepest completed search and that depth
+    """
+    if max_depth is None and deadline.budget is None:
+        max_depth = start_depth
+    depth = start_depth
+    result = None
+    completed_depth = None
+    previous_seconds = None
+    while max_depth is None or depth <= max_depth:
+        began = deadline.clock()
+        result = search(depth)
+        completed_depth = depth
+        seconds = deadline.clock() - began
+        if deadline.expired():
+            break
+        growth = seconds / previous_seconds if previous_seconds else 2
+        if seconds * max(growth, 1) > deadline.remaining():
+            break
+        previous_seconds = seconds
+        depth += 1
+    return result, completed_depth
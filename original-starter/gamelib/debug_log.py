@@ -0,0 +1,138 @@
+"""
+Buffered debug output with levels.
+
+Writing to stderr and flushing it on every debug_write is slow enough to show up in
+turn times when called in loops. DEBUG_LOG keeps messages in memory instead, unformatted,
+and writes them all at once when flushed. AlgoCore flushes it after each turn has been
+submitted, after each action frame, at the end of the game and if the algo crashes, so the
+writing happens while the engine runs the turn rather than while the algo computes it.
+
+Messages below the log's level are dropped before they are formatted or stored. With the
+level set to OFF, the logging methods are replaced by a function that does nothing.
+"""
+import atexit
+import sys
+from collections import deque
+
+"""
+Message levels, from least to most important. OFF disables all messages.
+"""
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+def _ignore(*args, **kwargs):
+    pass
+
+
+class DebugLog:
+    """Leveled debug messages kept in a ring buffer until flushed
+
+    A message is a format string and its arguments, which are only formatted with str.format
+    when the log is flushed. A message may also be a function, called with the arguments
+    when the log is flushed to build the text. Arguments are kept by reference, so pass
+    values that will not change before the flush, or format the message yourself.
+
+    Attributes :
+        * level (int): Messages below this level are dropped
+        * capacity (int): Number of messages kept before the oldest are dropped
+        * buffered (bool): Whether messages wait for flush. When False each one is written and flushed immediately.
+        * stream: Where messages are written, sys.stderr at the time of writing if None
+        * dropped (int): Number of messages dropped from the full buffer since the last flush
+
+    """
+    def __init__(self, level=DEBUG, capacity=10000, buffered=True, stream=None):
+        self.capacity = capacity
+        self.buffered = buffered
+        self.stream = stream
+        self.dropped = 0
+        self.__buffer = deque(maxlen=capacity)
+        self.set_level(level)
+
+    def set_level(self, level):
+        """Sets the lowest level of messages kept, OFF to disable the log
+
+        Methods for levels below it are replaced by a function that does nothing, so
+        disabled calls cost only the call itself.
+        """
+        self.level = level
+        for name, method_level in (("debug", DEBUG), ("info", INFO), ("warning", WARNING), ("error", ERROR)):
+            if method_level < level:
+                setattr(self, name, _ignore)
+            else:
+                self.__dict__.pop(name, None)
+
+    def enabled_for(self, level):
+        """Whether messages of this level are kept, to skip building expensive arguments
+        """
+        return level >= self.level
+
+    def write(self, level, message, *args):
+        """Logs a message at a level
+
+        Args:
+            level: The message's level
+            message: A format string, or a function taking the arguments and returning the text
+            args: Arguments for the format string or function
+        """
+        if level < self.level:
+            return
+        if len(self.__buffer) == self.capacity:
+            self.dropped += 1
+        self.__buffer.append((level, message, args))
+        if not self.buffered:
+            self.flush()
+
+    def debug(self, message, *args):
+        self.write(DEBUG, message, *args)
+
+    def info(self, message, *args):
+        self.write(INFO, message, *args)
+
+    def warning(self, message, *args):
+        self.write(WARNING, message, *args)
+
+    def error(self, message, *args):
+        self.write(ERROR, message, *args)
+
+    def pending(self):
+        """Number of messages waiting to be flushed
+        """
+        return len(self.__buffer)
+
+    def flush(self):
+        """Formats the buffered messages and writes them in a single write
+        """
+        if not self.__buffer:
+            return
+        lines = []
+        if self.dropped:
+            lines.append("({} older debug messages dropped)".format(self.dropped))
+            self.dropped = 0
+        while self.__buffer:
+            level, message, args = self.__buffer.popleft()
+            try:
+                if callable(message):
+                    text = message(*args)
+                elif args:
+                    text = message.format(*args)
+                else:
+                    text = message
+            except Exception as error:
+                text = "Could not format {} message {!r}: {}".format(LEVEL_NAMES.get(level, level), message, error)
+            lines.append(str(text))
+        stream = sys.stderr if self.stream is None else self.stream
+        stream.write("\n".join(lines) + "\n")
+        stream.flush()
+
+
+"""
+The log debug_write and the rest of gamelib write to
+"""
+DEBUG_LOG = DebugLog()
+atexit.register(DEBUG_LOG.flush)
@@ -0,0 +1,256 @@
+"""
+Checks the simulator against recorded games.
+
+A replay file has one JSON object per line: the game config first, then every turn
+and action frame the engine produced. For each turn, the state at the first action
+frame, which already holds the units spawned that turn, is fed to a Simulator, and
+each later frame of the replay is compared with the simulated frame of the same number.
+
+Run it over a directory of replays from an algo folder with:
+
+    python -m gamelib.fidelity path/to/replays
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from .game_state import GameState
+from .simulator import Simulator
+
+ACTION_FRAME = 1
+
+
+class FrameDivergence:
+    """How far one simulated frame is from the replay
+
+    Attributes :
+        * replay (str): The replay file
+        * turn (int): The turn number
+        * frame (int): The frame number within the action phase
+        * position (int): Number of mobile units that are not where the replay has them
+        * health (float): Total absolute difference in health, summed by location and unit type
+        * breaches ([int, int]): Simulated minus recorded breaches so far this turn, for each player
+
+    """
+    def __init__(self, replay, turn, frame, position, health, breaches):
+        self.replay = replay
+        self.turn = turn
+        self.frame = frame
+        self.position = position
+        self.health = health
+        self.breaches = breaches
+
+    def sort_key(self):
+        """Orders frames from the best match to the worst
+        """
+        return (self.position, abs(self.breaches[0]) + abs(self.breaches[1]), self.health)
+
+    def __repr__(self):
+        return "{} turn {} frame {}: position {}, health {}, breaches {}".format(
+            os.path.basename(self.replay), self.turn, self.frame, self.position, round(self.health, 1), self.breaches)
+
+
+class ReplayReport:
+    """The divergence of every compared frame of one replay
+
+    Attributes :
+        * replay (str): The replay file
+        * turns (int): Number of action phases simulated
+        * frames (list): A FrameDivergence for each compared frame
+        * simulated_frames (int): Number of frames the simulator stepped
+        * seconds (float): Time spent building and stepping simulators
+        * error (str): Why the replay could not be checked, None if it was
+
+    """
+    def __init__(self, replay):
+        self.replay = replay
+        self.turns = 0
+        self.frames = []
+        self.simulated_frames = 0
+        self.seconds = 0
+        self.error = None
+
+    def frames_per_second(self):
+        return self.simulated_frames / self.seconds if self.seconds else 0
+
+    def exact_frames(self):
+        """Number of compared frames that match the replay in positions, health and breaches
+        """
+        return sum(1 for frame in self.frames if frame.sort_key() == (0, 0, 0))
+
+
+def load_replay(path):
+    """Reads a replay file
+
+    Returns:
+        The config and a dict mapping each turn number to the list of its action frames, in order
+    """
+    config = None
+    turns = {}
+    with open(path) as replay_file:
+        for line in replay_file:
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            if "debug" in data:
+                config = data
+            elif data.get("turnInfo", [None])[0] == ACTION_FRAME:
+                turns.setdefault(data["turnInfo"][1], []).append((line, data))
+    for frames in turns.values():
+        frames.sort(key=lambda frame: frame[1]["turnInfo"][2])
+    return config, turns
+
+
+def _recorded_units(state, categories):
+    mobile = Counter()
+    health = Counter()
+    for player_index, key in enumerate(("p1Units", "p2Units")):
+        for type_id, units in enumerate(state[key]):
+            if type_id >= len(categories) or categories[type_id] is None:
+                continue
+            for unit in units:
+                location = (player_index, type_id, int(unit[0]), int(unit[1]))
+                health[location] += float(unit[2])
+                if categories[type_id] == 1:
+                    mobile[location] += 1
+    return mobile, health
+
+
+def _simulated_units(simulator, type_index):
+    mobile = Counter()
+    health = Counter()
+    for unit in simulator.mobile_units:
+        location = (unit.player_index, type_index[unit.unit_type], unit.x, unit.y)
+        mobile[location] += 1
+        health[location] += unit.health
+    for unit in simulator.structures.values():
+        health[unit.player_index, type_index[unit.unit_type], unit.x, unit.y] += unit.health
+    return mobile, health
+
+
+def _compare(replay, turn, frame, simulator, state, categories, type_index, breaches):
+    recorded_mobile, recorded_health = _recorded_units(state, categories)
+    simulated_mobile, simulated_health = _simulated_units(simulator, type_index)
+    position = max(sum((recorded_mobile - simulated_mobile).values()), sum((simulated_mobile - recorded_mobile).values()))
+    health = sum(abs(recorded_health.get(key, 0) - simulated_health.get(key, 0)) for key in set(recorded_health) | set(simulated_health))
+    return FrameDivergence(replay, turn, frame, position, health,
+                           [simulator.result.breaches[player] - breaches[player] for player in (0, 1)])
+
+
+def check_replay(path):
+    """Simulates every action phase of a replay and compares it frame by frame
+
+    Returns:
+        A ReplayReport
+    """
+    report = ReplayReport(path)
+    try:
+        config, turns = load_replay(path)
+    except (OSError, ValueError) as error:
+        report.error = str(error)
+        return report
+    if config is None:
+        report.error = "No config line"
+        return report
+
+    # The unitCategory of each unit list: 0 for structures, 1 for mobile units and None for removals and upgrades
+    unit_information = config["unitInformation"]
+    categories = [type_config.get("unitCategory") for type_config in unit_information]
+    type_index = {type_config.get("shorthand"): type_id for type_id, type_config in enumerate(unit_information)}
+
+    for turn in sorted(turns):
+        frames = turns[turn]
+        start_line, start = frames[0]
+        start_frame = start["turnInfo"][2]
+        begin = time.perf_counter()
+        game_state = GameState(config, start_line)
+        game_state.suppress_warnings(True)
+        simulator = Simulator(game_state)
+        report.seconds += time.perf_counter() - begin
+        report.turns += 1
+
+        breaches = [0, 0]
+        for _, state in frames[1:]:
+            frame = state["turnInfo"][2]
+            for event in state.get("events", {}).get("breach", []):
+                breaches[event[4] - 1] += 1
+            begin = time.perf_counter()
+            while simulator.frame < frame - start_frame:
+                simulator.step()
+                report.simulated_frames += 1
+            report.seconds += time.perf_counter() - begin
+            report.frames.append(_compare(path, turn, frame, simulator, state, categories, type_index, breaches))
+    return report
+
+
+def replay_paths(paths):
+    """Expands directories into the .replay files inside them
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.replay"))))
+        else:
+            files.append(path)
+    return files
+
+
+def check_replays(paths, processes=None):
+    """Checks many replays in parallel, one replay per process
+
+    Args:
+        paths: A list of replay files or directories holding them
+        processes: Number of worker processes, the number of CPUs if None
+
+    Returns:
+        A list with the ReplayReport of each replay
+    """
+    files = replay_paths(paths)
+    if processes == 1 or len(files) < 2:
+        return [check_replay(path) for path in files]
+    with Pool(processes) as pool:
+        return pool.map(check_replay, files)
+
+
+def summarize(reports, worst=10):
+    """Describes a set of reports: totals, throughput and the worst mismatched frames
+
+    Returns:
+        The summary as a string
+    """
+    frames = [frame for report in reports for frame in report.frames]
+    simulated = sum(report.simulated_frames for report in reports)
+    seconds = sum(report.seconds for report in reports)
+    lines = ["Replays: {}, turns: {}, compared frames: {}, exact frames: {}".format(
+        len(reports), sum(report.turns for report in reports), len(frames), sum(report.exact_frames() for report in reports))]
+    if frames:
+        lines.append("Mean position divergence: {:.2f} units, mean health divergence: {:.1f}".format(
+            sum(frame.position for frame in frames) / len(frames), sum(frame.health for frame in frames) / len(frames)))
+    lines.append("Simulated {} frames in {:.3f}s, {:.0f} frames per second".format(simulated, seconds, simulated / seconds if seconds else 0))
+    for report in reports:
+        if report.error:
+            lines.append("Could not check {}: {}".format(report.replay, report.error))
+    mismatched = sorted((frame for frame in frames if frame.sort_key() != (0, 0, 0)), key=FrameDivergence.sort_key, reverse=True)
+    if mismatched:
+        lines.append("Worst frames:")
+        lines.extend("    {}".format(frame) for frame in mismatched[:worst])
+    return "\n".join(lines)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Compares the gamelib simulator with recorded replays")
+    parser.add_argument("paths", nargs="+", help="replay files or directories of replay files")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="number of worker processes, defaults to the number of CPUs")
+    parser.add_argument("-n", "--worst", type=int, default=10, help="number of worst frames to list")
+    options = parser.parse_args(args)
+    sys.stderr.write(summarize(check_replays(options.paths, options.processes), options.worst) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,17 @@
+import copy
 import math
+import random
 from .unit import GameUnit
+from .unit_table import UnitTable, UnitView
 from .util import debug_write
+from .debug_log import DEBUG_LOG
+from .bitboard import Bitboard, bit_index, iter_locations, ROW_MASKS, COLUMN_MASKS
+from . import geometry
+
+# Random key per tile, xor-ed into GameMap.blocked_hash while the tile holds a structure.
+# Uses its own generator so algos that seed the random module are unaffected.
+_zobrist_random = random.Random(0x5eed)
+ZOBRIST_KEYS = [[_zobrist_random.getrandbits(64) for y in range(28)] for x in range(28)]
 
 class GameMap:
     """Holds data about the current game map and provides functions
@@ -18,6 +29,18 @@ class GameMap:
         * TOP_LEFT (int): A constant that represents the top left edge
         * BOTTOM_LEFT (int): Hidden challenge! Can you guess what this constant represents???
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
+        * blocked_hash (int): Zobrist hash of the set of locations holding a structure. 
+        * blocked_board (:obj: Bitboard): The locations holding a structure
+        * structure_boards (list): A Bitboard per player index of the locations holding that player's structures
+        * unit_boards (dict): Maps a unit type to a Bitboard of the locations holding at least one unit of that type
+        * player_unit_boards (dict): Maps (player_index, unit_type) to a Bitboard of the locations holding that player's units of that type
+
+    blocked_hash and the bitboards are kept up to date by add_unit, place_unit, remove_unit, upgrade_unit and assignment 
+    through game_map[x, y]. Editing the list returned by game_map[x, y] in place will desynchronize them.
+
+    Those functions never modify a location's unit list in place, they replace it. This lets clone() share the
+    lists and units with the original map, and checkpoint() and rollback() undo changes by restoring old lists.
+    Units are shared between clones, so change them through upgrade_unit rather than by editing their attributes.
 
     """
     def __init__(self, config):
@@ -35,8 +58,14 @@ class GameMap:
         self.TOP_LEFT = 1
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
-        self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        self.__map = self._create_storage()
+        self.blocked_hash = 0
+        self.blocked_board = Bitboard()
+        self.structure_boards = [Bitboard(), Bitboard()]
+        self.unit_boards = {}
+        self.player_unit_boards = {}
+        self._undo_log = None
+        self._tile_watchers = []
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
@@ -46,26 +75,85 @@ class GameMap:
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
-            self.__map[location[0]][location[1]] = val
+            x, y = location
+            self.__set_tile(x, y, val)
             return
         self._invalid_coordinates(location)
 
+    def __set_tile(self, x, y, units):
+        self._log_tile(x, y)
+        self.__map[x][y] = units
+        self._refresh_tile(x, y)
+
     def __iter__(self):
-        self.__start = [13,0]
-        return self
-    
-    def __next__(self):
-        location = self.__start
-        if location == [15,27]:
-            raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
-            else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+        """Iterates over every location in the arena, row by row from [13, 0] to [14, 27]
+        """
+        return ([x, y] for x, y in geometry.LOCATIONS)
+
+    def _create_storage(self):
+        return self.__empty_grid()
+
+    def _tile_units(self, x, y):
+        """The units at an in bounds location, without copying or bounds checks
+        """
+        return self.__map[x][y]
+
+    def _tile_unit_info(self, x, y):
+        """(stationary, player_index, unit_type) of each unit at an in bounds location
+        """
+        return [(unit.stationary, unit.player_index, unit.unit_type) for unit in self.__map[x][y]]
+
+    def _save_tile(self, x, y):
+        return self.__map[x][y]
+
+    def _restore_tile(self, x, y, saved):
+        self.__map[x][y] = saved
+
+    def _log_tile(self, x, y):
+        """Records the units at a location before they change, if a checkpoint is active
+        """
+        if self._undo_log is not None:
+            self._undo_log.append((x, y, self._save_tile(x, y)))
+
+    def clone(self):
+        """Creates a copy of this map that can be changed without affecting the original
+
+        The config and the units themselves are shared, only the location table and bitboards are copied.
+
+        Returns:
+            A new GameMap
+        """
+        clone = copy.copy(self)
+        clone.__map = [column[:] for column in self.__map]
+        clone._copy_boards(self)
+        return clone
+
+    def _copy_boards(self, source):
+        self.blocked_board = source.blocked_board.copy()
+        self.structure_boards = [board.copy() for board in source.structure_boards]
+        self.unit_boards = {unit_type: board.copy() for unit_type, board in source.unit_boards.items()}
+        self.player_unit_boards = {key: board.copy() for key, board in source.player_unit_boards.items()}
+        self._undo_log = None
+        self._tile_watchers = []
+
+    def checkpoint(self):
+        """Starts recording changes to the map so rollback can undo them
+
+        Returns:
+            A marker to pass to rollback
+        """
+        if self._undo_log is None:
+            self._undo_log = []
+        return len(self._undo_log)
+
+    def rollback(self, checkpoint):
+        """Undoes every change to the map made since checkpoint() returned the given marker
+        """
+        log = self._undo_log
+        while log and len(log) > checkpoint:
+            x, y, saved = log.pop()
+            self._restore_tile(x, y, saved)
+            self._refresh_tile(x, y)
 
     def __empty_grid(self):
         grid = []
@@ -75,6 +163,44 @@ class GameMap:
                 grid[x].append([])
         return grid
 
+    def _refresh_tile(self, x, y):
+        """Updates blocked_hash and the bitboards after the units at a location change
+        """
+        bit = 1 << bit_index(x, y)
+        was_blocked = self.blocked_board.bits & bit
+        self.blocked_board.bits &= ~bit
+        for board in self.structure_boards:
+            board.bits &= ~bit
+        for board in self.unit_boards.values():
+            board.bits &= ~bit
+        for board in self.player_unit_boards.values():
+            board.bits &= ~bit
+
+        for stationary, player_index, unit_type in self._tile_unit_info(x, y):
+            if stationary:
+                self.blocked_board.bits |= bit
+                if player_index in (0, 1):
+                    self.structure_boards[player_index].bits |= bit
+            board = self.unit_boards.get(unit_type)
+            if board is None:
+                board = self.unit_boards[unit_type] = Bitboard()
+            board.bits |= bit
+            board = self.player_unit_boards.get((player_index, unit_type))
+            if board is None:
+                board = self.player_unit_boards[player_index, unit_type] = Bitboard()
+            board.bits |= bit
+
+        if bool(was_blocked) != bool(self.blocked_board.bits & bit):
+            self.blocked_hash ^= ZOBRIST_KEYS[x][y]
+        for watcher in self._tile_watchers:
+            watcher(x, y)
+
+    def add_tile_watcher(self, watcher):
+        """Registers a function called as watcher(x, y) whenever the units at a location change,
+        including changes undone by rollback. Clones start without watchers.
+        """
+        self._tile_watchers.append(watcher)
+
     def _invalid_coordinates(self, location):
         self.warn("{} is out of bounds.".format(str(location)))
 
@@ -89,19 +215,7 @@ class GameMap:
         
         """
         x, y = location
-        half_board = self.HALF_ARENA
-
-        row_size = y + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        top_half_check = (y < self.HALF_ARENA and x >= startx and x <= endx)
-
-        row_size = (self.ARENA_SIZE - 1 - y) + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        bottom_half_check = (y >= self.HALF_ARENA and x >= startx and x <= endx)
-
-        return bottom_half_check or top_half_check
+        return geometry.in_bounds(x, y)
 
     def get_edge_locations(self, quadrant_description):
         """Takes in an edge description and returns a list of locations.
@@ -127,35 +241,16 @@ class GameMap:
             A list with four lists inside of it of locations corresponding to the four edges.
             [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
         """
-        top_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = self.ARENA_SIZE - 1 - num
-            top_right.append([int(x), int(y)])
-        top_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = self.ARENA_SIZE - 1 - num
-            top_left.append([int(x), int(y)])
-        bottom_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = num
-            bottom_left.append([int(x), int(y)])
-        bottom_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = num
-            bottom_right.append([int(x), int(y)])
-        return [top_right, top_left, bottom_left, bottom_right]
+        return [[list(location) for location in edge] for edge in geometry.EDGES]
     
-    def add_unit(self, unit_type, location, player_index=0):
+    def add_unit(self, unit_type, location, player_index=0, health=None):
         """Add a single GameUnit to the map at the given location.
 
         Args:
             unit_type: The type of the new unit. Use the constants provided in algo_strategy.
             location: A list of two integers representing the [x,y] coordinate of the new unit
             player_index: The index corresponding to the player controlling the new unit, 0 for you 1 for the enemy
+            health: The health of the new unit, defaults to the unit type's starting health
 
         This function does not affect your turn and only changes the data stored in GameMap. The intended use of this function
         is to allow you to create arbitrary gamestates. Using this function on the game_map provided with game_state will 
@@ -166,12 +261,41 @@ class GameMap:
         if player_index < 0 or player_index > 1:
             self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
 
-        x, y = location
-        new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
-        if not new_unit.stationary:
-            self.__map[x][y].append(new_unit)
+        new_unit = GameUnit(unit_type, self.config, player_index, health, location[0], location[1])
+        self.place_unit(new_unit)
+
+    def place_unit(self, unit):
+        """Add an existing GameUnit to the map at the unit's own x, y location.
+
+        Args:
+            unit: The GameUnit to add. A structure replaces everything at its location, mobile units stack.
+
+        Like add_unit, this only changes the data stored in GameMap.
+        """
+        x, y = unit.x, unit.y
+        if not unit.stationary:
+            self.__set_tile(x, y, self.__map[x][y] + [unit])
         else:
-            self.__map[x][y] = [new_unit]
+            self.__set_tile(x, y, [unit])
+
+    def upgrade_unit(self, location):
+        """Upgrades the structure at a location
+
+        The structure is replaced by an upgraded copy, so clones sharing it are unaffected.
+
+        Returns:
+            True if there was a structure to upgrade
+        """
+        x, y = location
+        units = list(self.__map[x][y])
+        for index, unit in enumerate(units):
+            if unit.stationary:
+                upgraded = copy.copy(unit)
+                upgraded.upgrade()
+                units[index] = upgraded
+                self.__set_tile(x, y, units)
+                return True
+        return False
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -186,7 +310,48 @@ class GameMap:
             self._invalid_coordinates(location)
         
         x, y = location
-        self.__map[x][y] = []
+        self.__set_tile(x, y, [])
+
+    def units_of(self, player_index, unit_type=None, xs=None, ys=None):
+        """Gets the units a player controls, read from player_unit_boards so only matching locations are visited
+
+        Args:
+            player_index: 0 for you, 1 for the enemy
+            unit_type: Only return units of this type. All types if None.
+            xs: Only return units in these columns. All columns if None.
+            ys: Only return units in these rows. All rows if None.
+
+        Returns:
+            A list of the matching units, ordered by location in the same order the map is iterated
+
+        """
+        if unit_type is None:
+            bits = 0
+            for (player, _), board in self.player_unit_boards.items():
+                if player == player_index:
+                    bits |= board.bits
+        else:
+            board = self.player_unit_boards.get((player_index, unit_type))
+            bits = board.bits if board is not None else 0
+        if xs is not None:
+            columns = 0
+            for x in xs:
+                if 0 <= x < self.ARENA_SIZE:
+                    columns |= COLUMN_MASKS[x]
+            bits &= columns
+        if ys is not None:
+            rows = 0
+            for y in ys:
+                if 0 <= y < self.ARENA_SIZE:
+                    rows |= ROW_MASKS[y]
+            bits &= rows
+
+        units = []
+        for x, y in iter_locations(bits):
+            for unit in self._tile_units(x, y):
+                if unit.player_index == player_index and (unit_type is None or unit.unit_type == unit_type):
+                    units.append(unit)
+        return units
 
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
@@ -196,7 +361,21 @@ class GameMap:
             radius: The radius of our search area
 
         Returns:
-            The locations that are within our search area
+            The locations that are within our search area, as a new list of [x, y] lists
+
+        """
+        return [[x, y] for x, y in self.locations_in_range(location, radius)]
+
+    def locations_in_range(self, location, radius):
+        """Gets locations in a circular area around a location, like get_locations_in_range but faster
+
+        Args:
+            location: The center of our search area
+            radius: The radius of our search area
+
+        Returns:
+            The locations that are within our search area, as a tuple of (x, y) tuples.
+            Results for tile centers are cached and shared, so they must not be modified.
 
         """
         if radius < 0 or radius > self.ARENA_SIZE:
@@ -205,16 +384,24 @@ class GameMap:
             self._invalid_coordinates(location)
 
         x, y = location
-        locations = []
-        search_radius = math.ceil(radius)
         getHitRadius = self.config["unitInformation"][0]['getHitRadius']
-        for i in range(int(x - search_radius), int(x + search_radius + 1)):
-            for j in range(int(y - search_radius), int(y + search_radius + 1)):
-                new_location = [i, j]
-                # A unit with a given range affects all locations who's centers are within that range + get hit radius
-                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
-                    locations.append(new_location)
-        return locations
+        # A unit with a given range affects all locations who's centers are within that range + get hit radius
+        reach = radius + getHitRadius
+        if x == int(x) and y == int(y):
+            return geometry.locations_in_range(int(x), int(y), reach)
+
+        locations = []
+        if reach <= 0:
+            return tuple(locations)
+        reach_squared = reach * reach
+        search_radius = math.ceil(reach)
+        for i in range(max(int(x - search_radius), 0), min(int(x + search_radius + 1), self.ARENA_SIZE)):
+            x_distance_squared = (i - x) ** 2
+            # Only walk the part of column i that is inside the arena
+            for j in range(max(int(y - search_radius), geometry.ROW_START[i]), min(int(y + search_radius + 1), geometry.ROW_END[i] + 1)):
+                if x_distance_squared + (j - y) ** 2 < reach_squared:
+                    locations.append((i, j))
+        return tuple(locations)
 
     def distance_between_locations(self, location_1, location_2):
         """Euclidean distance
@@ -237,4 +424,149 @@ class GameMap:
         Used internally by game_map to print out default messaging
         """
         if(self.enable_warnings):
-            debug_write(message)
+            DEBUG_LOG.warning(message)
+
+
+class ArrayGameMap(GameMap):
+    """A GameMap that stores units as columns of a UnitTable instead of GameUnit objects
+
+    game_map[x, y] returns a new list of UnitViews, which read and write the table and can be
+    used like GameUnits. Assigning to game_map[x, y] or calling place_unit copies the given
+    units into the table. Everything else behaves as in GameMap.
+
+    Attributes :
+        * units (:obj: UnitTable): The columns holding every unit on the map
+
+    """
+    def _create_storage(self):
+        self.units = UnitTable(self.config)
+
+    def _save_tile(self, x, y):
+        return self.units.cell_rows(x, y)
+
+    def _restore_tile(self, x, y, saved):
+        self.units.relink_cell(x, y, saved)
+
+    def clone(self):
+        """Creates a copy of this map that can be changed without affecting the original
+
+        Returns:
+            A new ArrayGameMap with its own copy of the unit table
+        """
+        clone = copy.copy(self)
+        clone.units = self.units.copy()
+        clone._copy_boards(self)
+        return clone
+
+    def checkpoint(self):
+        """Starts recording changes to the map so rollback can undo them
+
+        Returns:
+            A marker to pass to rollback
+        """
+        return super().checkpoint(), len(self.units)
+
+    def rollback(self, checkpoint):
+        """Undoes every change to the map made since checkpoint() returned the given marker,
+        and drops the rows added to the unit table since then
+        """
+        log_length, row_count = checkpoint
+        super().rollback(log_length)
+        self.units.truncate(row_count)
+
+    def upgrade_unit(self, location):
+        x, y = location
+        units = self._tile_units(x, y)
+        for index, unit in enumerate(units):
+            if unit.stationary:
+                # Copy the tile into new rows first, so a checkpoint can restore the old ones
+                self[x, y] = units
+                self._tile_units(x, y)[index].upgrade()
+                return True
+        return False
+
+    def _tile_units(self, x, y):
+        return [UnitView(self.units, index) for index in self.units.cell_rows(x, y)]
+
+    def _tile_unit_info(self, x, y):
+        units = self.units
+        info = []
+        for index in units.cell_rows(x, y):
+            player = units.player[index]
+            info.append((units.stats(index)["stationary"], None if player == -1 else player, units.type_names[units.type_id[index]]))
+        return info
+
+    def __getitem__(self, location):
+        if len(location) == 2 and self.in_arena_bounds(location):
+            x, y = location
+            return self._tile_units(x, y)
+        self._invalid_coordinates(location)
+
+    def __setitem__(self, location, val):
+        if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
+            x, y = location
+            # Read the new units before clearing, in case they are views of this tile
+            units = [(unit.unit_type, unit.player_index, unit.health, unit.upgraded, unit.pending_removal) for unit in val]
+            self._log_tile(x, y)
+            self.units.clear_cell(x, y)
+            for unit_type, player_index, health, upgraded, pending_removal in units:
+                self.units.add(unit_type, x, y, player_index, health, upgraded, pending_removal)
+            self._refresh_tile(x, y)
+            return
+        self._invalid_coordinates(location)
+
+    def add_unit(self, unit_type, location, player_index=0, health=None):
+        if not self.in_arena_bounds(location):
+            self._invalid_coordinates(location)
+        if player_index < 0 or player_index > 1:
+            self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
+
+        x, y = location
+        self._log_tile(x, y)
+        if self.units.type_stats[self.units.type_ids[unit_type]][0]["stationary"]:
+            self.units.clear_cell(x, y)
+        self.units.add(unit_type, x, y, player_index, health)
+        self._refresh_tile(x, y)
+
+    def place_unit(self, unit):
+        x, y = unit.x, unit.y
+        self._log_tile(x, y)
+        if unit.stationary:
+            self.units.clear_cell(x, y)
+        self.units.add_unit_like(unit, x, y)
+        self._refresh_tile(x, y)
+
+    def remove_unit(self, location):
+        if not self.in_arena_bounds(location):
+            self._invalid_coordinates(location)
+
+        x, y = location
+        self._log_tile(x, y)
+        self.units.clear_cell(x, y)
+        self._refresh_tile(x, y)
+
+
+"""
+The GameMap storage GameState uses. "lists" keeps a list of GameUnits per location,
+"arrays" uses ArrayGameMap.
+"""
+DEFAULT_STORAGE = "lists"
+
+
+def create_game_map(config, storage=None):
+    """Creates a game map using the requested storage
+
+    Args:
+        config: The game config
+        storage: "lists" or "arrays". Uses DEFAULT_STORAGE if None.
+
+    Returns:
+        A GameMap or ArrayGameMap
+    """
+    if storage is None:
+        storage = DEFAULT_STORAGE
+    if storage == "arrays":
+        return ArrayGameMap(config)
+    if not storage == "lists":
+        debug_write("Unknown game map storage '{}', using 'lists'".format(storage))
+    return GameMap(config)
@@ -1,11 +1,18 @@
+import copy
 import math
 import json
 import sys
 
-from .navigation import ShortestPathFinder
+from .navigation import create_path_finder, IncrementalPathFinder, PATH_CACHE
 from .util import send_command, debug_write
+from .debug_log import DEBUG_LOG
+from .message import decode
 from .unit import GameUnit
-from .game_map import GameMap
+from .unit_table import UnitView
+from .game_map import create_game_map
+from .damage_map import DamageMap, SpawnOption, SPAWN_METRICS, path_range_bits
+from .bitboard import EDGE_MASKS, contains, count, iter_locations, range_bits
+from .geometry import location_distance_squared
 
 def is_stationary(unit_type):
     """
@@ -38,12 +45,14 @@ class GameState:
         * MP (int): A constant representing the Mobile Points resource, used in the get_resource function
         * SP (int): A constant representing the SP resource, used in the get_resource function
          
-        * game_map (:obj: GameMap): The current GameMap. To retrieve a list of GameUnits at a location, use game_map[x, y]
+        * game_map (:obj: GameMap): The current GameMap. To retrieve a list of GameUnits at a location, use game_map[x, y].
+          Set gamelib.game_map.DEFAULT_STORAGE to "arrays" to get an ArrayGameMap instead.
         * turn_number (int): The current turn number. Starts at 0.
         * my_health (int): Your current remaining health
         * my_time (int): The time you took to submit your previous turn
         * enemy_health (int): Your opponents current remaining health
         * enemy_time (int): Your opponents current remaining time
+        * path_cache (:obj: PathCache): Cache used by find_path_to_edge, shared between turns by default. Set to None to disable caching.
 
     """
 
@@ -52,7 +61,8 @@ class GameState:
 
         Args:
             * config (JSON): A json object containing information about the game
-            * serialized_string (string): A string containing information about the game state at the start of this turn
+            * serialized_string (string): A string containing information about the game state at the start of this turn.
+              A ParsedState, as passed to on_turn, is used without decoding it again.
 
         """
         self.serialized_string = serialized_string
@@ -60,23 +70,25 @@ class GameState:
         self.enable_warnings = True
 
         global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
-        UNIT_TYPE_TO_INDEX = {}
+        # Filled before it is published, since a background worker may create GameUnits at the same time
+        unit_type_to_index = {}
         WALL = config["unitInformation"][0]["shorthand"]
-        UNIT_TYPE_TO_INDEX[WALL] = 0
+        unit_type_to_index[WALL] = 0
         SUPPORT = config["unitInformation"][1]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SUPPORT] = 1
+        unit_type_to_index[SUPPORT] = 1
         TURRET = config["unitInformation"][2]["shorthand"]
-        UNIT_TYPE_TO_INDEX[TURRET] = 2
+        unit_type_to_index[TURRET] = 2
         SCOUT = config["unitInformation"][3]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SCOUT] = 3
+        unit_type_to_index[SCOUT] = 3
         DEMOLISHER = config["unitInformation"][4]["shorthand"]
-        UNIT_TYPE_TO_INDEX[DEMOLISHER] = 4
+        unit_type_to_index[DEMOLISHER] = 4
         INTERCEPTOR = config["unitInformation"][5]["shorthand"]
-        UNIT_TYPE_TO_INDEX[INTERCEPTOR] = 5
+        unit_type_to_index[INTERCEPTOR] = 5
         REMOVE = config["unitInformation"][6]["shorthand"]
-        UNIT_TYPE_TO_INDEX[REMOVE] = 6
+        unit_type_to_index[REMOVE] = 6
         UPGRADE = config["unitInformation"][7]["shorthand"]
-        UNIT_TYPE_TO_INDEX[UPGRADE] = 7
+        unit_type_to_index[UPGRADE] = 7
+        UNIT_TYPE_TO_INDEX = unit_type_to_index
 
         ALL_UNITS = [SCOUT, DEMOLISHER, INTERCEPTOR, WALL, SUPPORT, TURRET]
         STRUCTURE_TYPES = [WALL, SUPPORT, TURRET]
@@ -89,8 +101,10 @@ class GameState:
         MP = self.MP
         SP = self.SP
 
-        self.game_map = GameMap(self.config)
-        self._shortest_path_finder = ShortestPathFinder()
+        self.game_map = create_game_map(self.config)
+        self._shortest_path_finder = create_path_finder()
+        self.path_cache = PATH_CACHE
+        self._damage_maps = {}
         self._build_stack = []
         self._deploy_stack = []
         self._player_resources = [
@@ -103,7 +117,7 @@ class GameState:
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
         state_line is the game state as a json string.
         """
-        state = json.loads(state_line)
+        state = decode(state_line)
 
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
@@ -146,8 +160,7 @@ class GameState:
                     if self.contains_stationary_unit([x,y]):
                         self.game_map[x,y][0].upgrade()
                 else:
-                    unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+                    self.game_map.add_unit(unit_type, [x, y], player_number, hp)
 
     def __resource_required(self, unit_type):
         return self.SP if is_stationary(unit_type) else self.MP
@@ -180,6 +193,49 @@ class GameState:
         send_command(build_string)
         send_command(deploy_string)
 
+    def clone(self):
+        """Creates a copy of this game state for trying out hypothetical moves
+
+        The config, the turn information and the units are shared with this state. The map's
+        location table and bitboards, the resources and the queued spawns are copied, so
+        spawning, removing or upgrading on the clone does not affect this state.
+
+        Returns:
+            A new GameState
+        """
+        clone = copy.copy(self)
+        clone.game_map = self.game_map.clone()
+        clone._shortest_path_finder = create_path_finder()
+        clone._damage_maps = {}
+        clone._build_stack = list(self._build_stack)
+        clone._deploy_stack = list(self._deploy_stack)
+        clone._player_resources = [dict(resources) for resources in self._player_resources]
+        return clone
+
+    def checkpoint(self):
+        """Marks the current state so rollback can return to it
+
+        From the first checkpoint on, the game map records every location it changes.
+        Checkpoints can be nested, rolling back to one also undoes every later one.
+
+        Returns:
+            A marker to pass to rollback
+        """
+        resources = [dict(player_resources) for player_resources in self._player_resources]
+        return self.game_map.checkpoint(), resources, len(self._build_stack), len(self._deploy_stack)
+
+    def rollback(self, checkpoint):
+        """Undoes every map change, resource change and queued spawn since the given checkpoint
+
+        Args:
+            checkpoint: A marker returned by checkpoint
+        """
+        map_checkpoint, resources, build_length, deploy_length = checkpoint
+        self.game_map.rollback(map_checkpoint)
+        self._player_resources = [dict(player_resources) for player_resources in resources]
+        del self._build_stack[build_length:]
+        del self._deploy_stack[deploy_length:]
+
     def get_resource(self, resource_type, player_index = 0):
         """Gets a players resources
 
@@ -333,7 +389,7 @@ class GameState:
         stationary = is_stationary(unit_type)
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        on_edge = contains(EDGE_MASKS[self.game_map.BOTTOM_LEFT] | EDGE_MASKS[self.game_map.BOTTOM_RIGHT], location)
 
         if self.enable_warnings:
             fail_reason = ""
@@ -445,7 +501,7 @@ class GameState:
                     if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
-                        existing_unit.upgrade()
+                        self.game_map.upgrade_unit([x, y])
                         self._build_stack.append((UPGRADE, x, y))
                         spawned_units += 1
             else:
@@ -487,6 +543,9 @@ class GameState:
             A list of locations corresponding to the path the unit would take 
             to get from it's starting location to the best available end location
 
+        Paths are cached by game_map.blocked_hash, so structures should be changed through
+        GameMap functions (add_unit, remove_unit, game_map[x, y] = units) rather than by editing unit lists in place.
+
         """
         if self.contains_stationary_unit(start_location):
             self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
@@ -495,8 +554,169 @@ class GameState:
         if target_edge is None:
             target_edge = self.get_target_edge(start_location)
 
-        end_points = self.game_map.get_edge_locations(target_edge)
-        return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        if self.path_cache is None:
+            end_points = self.game_map.get_edge_locations(target_edge)
+            return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+
+        key = (start_location[0], start_location[1], target_edge, self.game_map.blocked_hash)
+        path = self.path_cache.get(key)
+        if path is None:
+            end_points = self.game_map.get_edge_locations(target_edge)
+            path = self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+            if path is None:
+                return
+            self.path_cache.put(key, path)
+        return [location[:] for location in path]
+
+    def find_paths_to_edge_batch(self, start_locations, target_edge=None):
+        """Gets the paths units at many locations would take.
+        Much faster than calling find_path_to_edge for each location, since all
+        locations heading to the same edge share one pathfinding search.
+
+        Args:
+            start_locations: A list of locations of hypothetical units
+            target_edge: The edge the units want to reach. Induced from each start location if None.
+
+        Returns:
+            A list with the path for each start location, in the same order.
+            Blocked start locations get None, like find_path_to_edge.
+
+        """
+        paths = [None] * len(start_locations)
+        pending = {}
+        for i, start_location in enumerate(start_locations):
+            if self.contains_stationary_unit(start_location):
+                self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+                continue
+            edge = self.get_target_edge(start_location) if target_edge is None else target_edge
+            if self.path_cache is not None:
+                path = self.path_cache.get((start_location[0], start_location[1], edge, self.game_map.blocked_hash))
+                if path is not None:
+                    paths[i] = [location[:] for location in path]
+                    continue
+            pending.setdefault(edge, []).append(i)
+
+        for edge, indices in pending.items():
+            end_points = self.game_map.get_edge_locations(edge)
+            starts = [start_locations[i] for i in indices]
+            for i, path in zip(indices, self._shortest_path_finder.navigate_batch(starts, end_points, self)):
+                if path is None:
+                    continue
+                if self.path_cache is not None:
+                    self.path_cache.put((start_locations[i][0], start_locations[i][1], edge, self.game_map.blocked_hash), path)
+                    path = [location[:] for location in path]
+                paths[i] = path
+        return paths
+
+    def enemy_path_heatmap(self):
+        """Counts how many enemy spawn locations have a path through each location.
+        Paths from every open location on the enemy's edges are found with find_paths_to_edge_batch,
+        so this costs about one pathfinding search per edge.
+
+        Returns:
+            A 28x28 list of lists where heatmap[x][y] is the number of enemy spawn paths that pass through [x, y]
+
+        """
+        spawn_locations = (self.game_map.get_edge_locations(self.game_map.TOP_LEFT) + 
+                           self.game_map.get_edge_locations(self.game_map.TOP_RIGHT))
+        spawn_locations = [location for location in spawn_locations if not self.contains_stationary_unit(location)]
+        heatmap = [[0] * self.ARENA_SIZE for _ in range(self.ARENA_SIZE)]
+        for path in self.find_paths_to_edge_batch(spawn_locations):
+            for x, y in path:
+                heatmap[x][y] += 1
+        return heatmap
+
+    def damage_map(self, player_index=0):
+        """Gets the damage per frame every location would receive from units attacking a player.
+        Built on the first call and then only updated at locations that changed, so it is cheap
+        to call again after spawning or removing units.
+
+        Args:
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            A DamageMap. Use path_damage(path) for the total damage along a path, or
+            mobile_damage(location) and structure_damage(location) for a single location.
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        damage_map = self._damage_maps.get(player_index)
+        if damage_map is None or damage_map.game_map is not self.game_map:
+            damage_map = self._damage_maps[player_index] = DamageMap(self.game_map, player_index)
+        damage_map.update()
+        return damage_map
+
+    def score_spawn_options(self, unit_type, locations, metric="damage", player_index=0):
+        """Scores and ranks locations to spawn a mobile unit from.
+        All paths are found with find_paths_to_edge_batch and damage is read from damage_map,
+        so scoring many options costs little more than scoring one.
+
+        Args:
+            unit_type: The mobile unit that would be spawned
+            locations: The spawn locations to compare
+            metric: "damage" for the least damage taken, "targets" for the most enemy structures in range of the path,
+                "targets_per_damage" for the most targets per damage taken, or a function taking a SpawnOption
+                and returning a score where lower is better
+            player_index: The player spawning the unit, 0 for you 1 for the enemy
+
+        Returns:
+            A list of SpawnOption, best first. Options with equal scores keep the order of locations.
+            Locations a unit cannot path from are left out.
+
+        """
+        if unit_type not in ALL_UNITS or is_stationary(unit_type):
+            self._invalid_unit(unit_type)
+            return
+        if not callable(metric):
+            if metric not in SPAWN_METRICS:
+                self.warn("Unknown spawn metric '{}'. Expected one of {}".format(metric, list(SPAWN_METRICS)))
+                return
+            metric = SPAWN_METRICS[metric]
+
+        unit = GameUnit(unit_type, self.config, player_index)
+        frames_per_tile = 1 / unit.speed if unit.speed > 0 else 1
+        reach = unit.attackRange + self.config["unitInformation"][0].get("getHitRadius", 0)
+        damage_map = self.damage_map(player_index)
+        enemy_structures = self.game_map.structure_boards[1 - player_index].bits
+
+        options = []
+        for location, path in zip(locations, self.find_paths_to_edge_batch(locations)):
+            if path is None:
+                continue
+            targets = count(path_range_bits(path, reach) & enemy_structures) if unit.attackRange > 0 else 0
+            options.append(SpawnOption(location, path, frames_per_tile, damage_map.path_damage(path) * frames_per_tile, targets))
+        for option in options:
+            option.score = metric(option)
+        options.sort(key=lambda option: option.score)
+        return options
+
+    def path_sensitivity(self, start_location, candidate_locations, target_edge=None):
+        """Checks how the path from a location would change if a structure was placed at each candidate location.
+        The distance field is repaired around each candidate instead of being rebuilt, 
+        so this is much cheaper than adding each structure and calling find_path_to_edge.
+
+        Args:
+            start_location: The location of a hypothetical unit
+            candidate_locations: Locations to try placing a structure at, one at a time
+            target_edge: The edge the unit wants to reach. Induced from start_location if None.
+
+        Returns:
+            A list of PathSensitivity objects, one for each candidate location that is not already blocked.
+            Each has the new path, whether it changed, the change in length and the index where it diverges.
+
+        """
+        if self.contains_stationary_unit(start_location):
+            self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+            return
+
+        if target_edge is None:
+            target_edge = self.get_target_edge(start_location)
+
+        path_finder = IncrementalPathFinder()
+        path_finder.prepare(self, self.game_map.get_edge_locations(target_edge))
+        return path_finder.path_sensitivity(start_location, candidate_locations)
 
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
@@ -512,6 +732,8 @@ class GameState:
             self.warn('Checked for stationary unit outside of arena bounds')
             return False
         x, y = map(int, location)
+        if not contains(self.game_map.blocked_board.bits, [x, y]):
+            return False
         for unit in self.game_map[x,y]:
             if unit.stationary:
                 return unit
@@ -522,7 +744,7 @@ class GameState:
         """
 
         if(self.enable_warnings):
-            debug_write(message)
+            DEBUG_LOG.warning(message)
 
     def suppress_warnings(self, suppress):
         """Suppress all warnings
@@ -550,12 +772,12 @@ class GameState:
 
         """
 
-        if not isinstance(attacking_unit, GameUnit):
+        if not isinstance(attacking_unit, (GameUnit, UnitView)):
             self.warn("Passed a {} to get_target as attacking_unit. Expected a GameUnit.".format(type(attacking_unit)))
             return
 
         attacker_location = [attacking_unit.x, attacking_unit.y]
-        possible_locations = self.game_map.get_locations_in_range(attacker_location, attacking_unit.attackRange)
+        possible_locations = self.game_map.locations_in_range(attacker_location, attacking_unit.attackRange)
         target = None
         target_stationary = True
         target_distance = sys.maxsize
@@ -570,7 +792,8 @@ class GameState:
 
                 new_target = False
                 unit_stationary = unit.stationary
-                unit_distance = self.game_map.distance_between_locations(location, [attacking_unit.x, attacking_unit.y])
+                # Squared distances order targets the same way as distances
+                unit_distance = location_distance_squared(location, attacker_location)
                 unit_health = unit.health
                 unit_y = unit.y
                 unit_x_distance = abs(self.HALF_ARENA - 0.5 - unit.x)
@@ -614,6 +837,61 @@ class GameState:
                     target_x_distance = unit_x_distance
         return target
 
+    def resolve_targets(self, units):
+        """Finds the target of many attacking units at once, using the same priority as get_target.
+        Only locations holding an opposing unit are visited, found with range bitboards,
+        and the units at each location are looked up once for all attackers.
+
+        Args:
+            units: A list of GameUnits, for example game_map.units_of(0, TURRET)
+
+        Returns:
+            A list with the GameUnit each unit would attack, or None if it has no target, in the same order as units
+
+        """
+        hit_radius = self.config["unitInformation"][0]['getHitRadius']
+        player_bits = {}
+        tile_units = {}
+        targets = []
+        for attacking_unit in units:
+            if not isinstance(attacking_unit, (GameUnit, UnitView)):
+                self.warn("Passed a {} to resolve_targets as an attacking unit. Expected a GameUnit.".format(type(attacking_unit)))
+                targets.append(None)
+                continue
+
+            player_index = attacking_unit.player_index
+            opponent_bits = player_bits.get(player_index)
+            if opponent_bits is None:
+                opponent_bits = 0
+                for (player, _), board in self.game_map.player_unit_boards.items():
+                    if player != player_index:
+                        opponent_bits |= board.bits
+                player_bits[player_index] = opponent_bits
+
+            attacker_x, attacker_y = attacking_unit.x, attacking_unit.y
+            hits_structures = attacking_unit.damage_f != 0
+            hits_mobile = attacking_unit.damage_i != 0
+            # Lower keys are better, in get_target's order: mobile, nearest, lowest health, lowest y (highest for the enemy), closest to an edge
+            y_sign = 1 if player_index == 0 else -1
+            target = None
+            target_key = None
+            in_range = range_bits(attacker_x, attacker_y, attacking_unit.attackRange + hit_radius) & opponent_bits
+            for x, y in iter_locations(in_range):
+                candidates = tile_units.get((x, y))
+                if candidates is None:
+                    candidates = tile_units[x, y] = self.game_map[x, y]
+                distance = (x - attacker_x) ** 2 + (y - attacker_y) ** 2
+                for unit in candidates:
+                    stationary = unit.stationary
+                    if unit.player_index == player_index or (stationary and not hits_structures) or (not stationary and not hits_mobile):
+                        continue
+                    key = (stationary, distance, unit.health, y_sign * unit.y, -abs(self.HALF_ARENA - 0.5 - unit.x))
+                    if target_key is None or key < target_key:
+                        target = unit
+                        target_key = key
+            targets.append(target)
+        return targets
+
     def get_attackers(self, location, player_index):
         """Gets the stationary units threatening a given location
 
@@ -639,9 +917,9 @@ class GameState:
         for unit in self.config["unitInformation"]:
             if unit.get('attackRange', 0) >= max_range:
                 max_range = unit.get('attackRange', 0)
-        possible_locations= self.game_map.get_locations_in_range(location, max_range)
+        possible_locations= self.game_map.locations_in_range(location, max_range)
         for location_unit in possible_locations:
             for unit in self.game_map[location_unit]:
-                if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
+                if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and location_distance_squared(location, location_unit) <= unit.attackRange ** 2:
                     attackers.append(unit)
         return attackers
@@ -0,0 +1,137 @@
+"""
+Static geometry of the diamond shaped arena, computed once when gamelib is imported.
+
+Every valid location has a tile id from 0 to 419, in the same order GameMap iterates
+the map: row by row from the bottom, left to right. GameMap, GameState and the
+pathfinders use these tables instead of recomputing bounds, edges and neighbors.
+"""
+import math
+from array import array
+
+ARENA_SIZE = 28
+HALF_ARENA = ARENA_SIZE // 2
+
+# The first and last valid x of each row. The arena is symmetric in x and y,
+# so ROW_START[x] and ROW_END[x] are also the first and last valid y of column x.
+ROW_START = tuple(HALF_ARENA - 1 - y if y < HALF_ARENA else y - HALF_ARENA for y in range(ARENA_SIZE))
+ROW_END = tuple(ARENA_SIZE - 1 - start for start in ROW_START)
+
+
+def in_bounds(x, y):
+    """Checks if [x, y] is inside the diamond shaped arena
+
+    Args:
+        x: The x coordinate
+        y: The y coordinate
+
+    Returns:
+        True if the location is on the board, False otherwise
+    """
+    try:
+        return 0 <= y < ARENA_SIZE and ROW_START[y] <= x <= ROW_END[y]
+    except TypeError:
+        # Non integer coordinates, fall back to the bounds formula
+        row_size = y + 1 if y < HALF_ARENA else ARENA_SIZE - y
+        return 0 <= y < ARENA_SIZE and HALF_ARENA - row_size <= x <= HALF_ARENA + row_size - 1
+
+
+LOCATIONS = tuple((x, y) for y in range(ARENA_SIZE) for x in range(ROW_START[y], ROW_END[y] + 1))
+TILE_COUNT = len(LOCATIONS)
+
+# Tile id of every location indexed by x * ARENA_SIZE + y, -1 outside the arena
+TILE_IDS = [-1] * (ARENA_SIZE * ARENA_SIZE)
+for _tile, (_x, _y) in enumerate(LOCATIONS):
+    TILE_IDS[_x * ARENA_SIZE + _y] = _tile
+del _tile, _x, _y
+
+
+def tile_id(x, y):
+    """Gets the tile id of a location
+
+    Returns:
+        The tile id, or None if the location is outside the arena
+    """
+    if in_bounds(x, y):
+        return TILE_IDS[int(x) * ARENA_SIZE + int(y)]
+    return None
+
+
+# The four edges in GameMap.get_edges order: top right, top left, bottom left, bottom right
+EDGES = (
+    tuple((HALF_ARENA + i, ARENA_SIZE - 1 - i) for i in range(HALF_ARENA)),
+    tuple((HALF_ARENA - 1 - i, ARENA_SIZE - 1 - i) for i in range(HALF_ARENA)),
+    tuple((HALF_ARENA - 1 - i, i) for i in range(HALF_ARENA)),
+    tuple((HALF_ARENA + i, i) for i in range(HALF_ARENA)))
+EDGE_IDS = tuple(tuple(tile_id(x, y) for x, y in edge) for edge in EDGES)
+
+# Neighbor tile ids in the order ShortestPathFinder._get_neighbors returns them: up, down, right, left
+NEIGHBORS = tuple(
+    tuple(tile_id(nx, ny) for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)) if in_bounds(nx, ny))
+    for x, y in LOCATIONS)
+
+# Squared euclidean distance between every pair of tiles, DISTANCE_SQUARED[tile_1 * TILE_COUNT + tile_2].
+# Squared distances are exact integers and order the same way as the distances themselves.
+DISTANCE_SQUARED = array("H", [(x1 - x2) ** 2 + (y1 - y2) ** 2 for x1, y1 in LOCATIONS for x2, y2 in LOCATIONS])
+
+
+def distance_squared(tile_1, tile_2):
+    """Squared euclidean distance between two tile ids
+    """
+    return DISTANCE_SQUARED[tile_1 * TILE_COUNT + tile_2]
+
+
+def distance(tile_1, tile_2):
+    """Euclidean distance between two tile ids
+    """
+    return math.sqrt(DISTANCE_SQUARED[tile_1 * TILE_COUNT + tile_2])
+
+
+def location_distance_squared(location_1, location_2):
+    """Squared euclidean distance between two [x, y] locations, looked up in
+    DISTANCE_SQUARED when both are tiles in the arena and computed otherwise
+    """
+    x1, y1 = location_1
+    x2, y2 = location_2
+    tile_1 = tile_id(x1, y1)
+    tile_2 = tile_id(x2, y2)
+    if tile_1 is None or tile_2 is None or x1 != int(x1) or x2 != int(x2) or y1 != int(y1) or y2 != int(y2):
+        return (x1 - x2) ** 2 + (y1 - y2) ** 2
+    return DISTANCE_SQUARED[tile_1 * TILE_COUNT + tile_2]
+
+
+_STENCILS = {}
+_RANGE_CACHE = {}
+
+
+def range_stencil(reach):
+    """Gets the offsets [dx, dy] that are less than reach away from a tile, ordered by dx then dy
+
+    Returns:
+        A tuple of (dx, dy) tuples, built once per reach
+    """
+    stencil = _STENCILS.get(reach)
+    if stencil is None:
+        extent = max(math.ceil(reach), 0)
+        reach_squared = reach * reach if reach > 0 else 0
+        stencil = tuple((dx, dy) for dx in range(-extent, extent + 1) for dy in range(-extent, extent + 1)
+                        if dx * dx + dy * dy < reach_squared)
+        _STENCILS[reach] = stencil
+    return stencil
+
+
+def locations_in_range(x, y, reach):
+    """Gets the arena locations less than reach away from the tile [x, y], ordered by x then y
+
+    The range stencil is clipped to the arena once per tile and reach and cached,
+    so later queries are a dictionary lookup.
+
+    Returns:
+        A tuple of (x, y) tuples. It is shared between callers and must not be modified.
+    """
+    key = (x, y, reach)
+    locations = _RANGE_CACHE.get(key)
+    if locations is None:
+        locations = tuple((x + dx, y + dy) for dx, dy in range_stencil(reach) if in_bounds(x + dx, y + dy))
+        if in_bounds(x, y):
+            _RANGE_CACHE[key] = locations
+    return locations
@@ -0,0 +1,164 @@
+"""
+Decoding of the messages the game engine sends.
+
+AlgoCore decodes each message once and passes on_turn and on_action_frame a
+ParsedState. It is still the message string, so existing code that treats it as
+one keeps working, but GameState and strategies can read the decoded JSON from
+its data attribute instead of decoding it again.
+
+loads uses the fastest JSON library installed: orjson, then ujson, then the
+standard json module.
+
+classify tells config, turn, frame and end messages apart by finding turnInfo in
+the string, without decoding it. parse_fields decodes only the parts of a frame a
+strategy asked for, which AlgoCore uses when its frame_fields are set.
+"""
+import json
+
+try:
+    import orjson as _fast_json
+    JSON_BACKEND = "orjson"
+except ImportError:
+    try:
+        import ujson as _fast_json
+        JSON_BACKEND = "ujson"
+    except ImportError:
+        _fast_json = None
+        JSON_BACKEND = "json"
+
+loads = json.loads if _fast_json is None else _fast_json.loads
+_decoder = json.JSONDecoder()
+
+"""
+Kinds of messages returned by classify
+"""
+CONFIG = "config"
+TURN = "turn"
+FRAME = "frame"
+END = "end"
+UNKNOWN = "unknown"
+
+_TURN_INFO_KEY = '"turnInfo":'
+_STATE_KINDS = {"0": TURN, "1": FRAME, "2": END}
+
+
+class ParsedState(str):
+    """A message from the game engine along with its decoded JSON
+
+    It is a str holding the raw message, so it can be passed anywhere the message string was.
+
+    Attributes :
+        * data (dict): The decoded message, or only some of its fields if it is not complete
+        * complete (bool): Whether data holds the whole message
+        * raw (str): The message as a plain string
+
+    """
+    def __new__(cls, raw, data=None, complete=True):
+        state = super().__new__(cls, raw)
+        state.data = loads(raw) if data is None else data
+        state.complete = complete or data is None
+        return state
+
+    @property
+    def raw(self):
+        return str.__str__(self)
+
+    def field(self, path, default=None):
+        """Gets a field of the decoded data
+
+        Args:
+            path: The keys leading to the field, separated by dots, for example "events.breach"
+            default: Returned if the field is missing
+
+        Returns:
+            The field's value
+        """
+        value = self.data
+        for key in path.split("."):
+            if not isinstance(value, dict) or key not in value:
+                return default
+            value = value[key]
+        return value
+
+    def __reduce__(self):
+        # Keep the decoded data when pickled, for example when sent to a background process
+        return (ParsedState, (self.raw, self.data, self.complete))
+
+
+def decode(message):
+    """Gets the decoded JSON of a message, without decoding it again if it is a ParsedState
+
+    Args:
+        message: A ParsedState, a JSON string or an already decoded dict
+
+    Returns:
+        The decoded message
+    """
+    if isinstance(message, ParsedState):
+        # orjson only accepts exact strs
+        return message.data if message.complete else loads(message.raw)
+    if isinstance(message, dict):
+        return message
+    return loads(message)
+
+
+def classify(message):
+    """Finds the kind of an engine message without decoding it
+
+    Turn, frame and end messages are told apart by the first number of their turnInfo,
+    the config by its replaySave setting.
+
+    Args:
+        message: The message string
+
+    Returns:
+        CONFIG, TURN, FRAME, END or UNKNOWN
+    """
+    index = message.find(_TURN_INFO_KEY)
+    if index >= 0:
+        index = message.find("[", index + len(_TURN_INFO_KEY)) + 1
+        while message[index:index + 1] == " ":
+            index += 1
+        return _STATE_KINDS.get(message[index:index + 1], UNKNOWN)
+    if "replaySave" in message:
+        return CONFIG
+    return UNKNOWN
+
+
+def _find_value(message, path):
+    # Each key is looked for after the previous one. This relies on the engine's keys
+    # being unique enough that the first match after the parent is the nested key.
+    index = 0
+    for key in path.split("."):
+        index = message.find('"{}":'.format(key), index)
+        if index < 0:
+            return False, None
+        index += len(key) + 3
+    while message[index:index + 1] == " ":
+        index += 1
+    return True, _decoder.raw_decode(message, index)[0]
+
+
+def parse_fields(message, fields):
+    """Decodes only some fields of a message, leaving the rest of it as text
+
+    The turnInfo is always decoded. Fields missing from the message are left out.
+
+    Args:
+        message: The message string
+        fields: A list of the fields to decode, each the keys leading to it separated by dots, for example "events.breach"
+
+    Returns:
+        An incomplete ParsedState holding the decoded fields, nested as they are in the message
+    """
+    data = {}
+    for path in ("turnInfo",) + tuple(fields):
+        found, value = _find_value(message, path)
+        if not found:
+            continue
+        keys = path.split(".")
+        parent = data
+        for key in keys[:-1]:
+            parent = parent.setdefault(key, {})
+        parent[keys[-1]] = value
+    return ParsedState(message, data, complete=False)
@@ -2,7 +2,70 @@ import heapq
 import math
 import sys
 import queue
+from collections import deque, OrderedDict
 from .util import debug_write
+from .debug_log import DEBUG_LOG
+from . import bitboard, geometry
+
+ARENA_SIZE = geometry.ARENA_SIZE
+HALF_ARENA = geometry.HALF_ARENA
+
+# Static tables used by GridPathFinder. Tiles are indexed by their geometry tile id.
+TILE_COUNT = geometry.TILE_COUNT
+TILE_LOCATIONS = [list(location) for location in geometry.LOCATIONS]
+# Neighbors are stored in the order ShortestPathFinder._get_neighbors returns them: up, down, right, left
+TILE_NEIGHBORS = geometry.NEIGHBORS
+
+
+def _idealness(x, y, direction):
+    """Idealness of a location that is not an end point, see ShortestPathFinder._get_idealness
+    """
+    return (ARENA_SIZE * (y if direction[1] == 1 else ARENA_SIZE - 1 - y)
+            + (x if direction[0] == 1 else ARENA_SIZE - 1 - x))
+
+
+def _get_direction(end_points):
+    x, y = end_points[0]
+    return [-1 if x < HALF_ARENA else 1, -1 if y < HALF_ARENA else 1]
+
+
+def _build_edge_tables(end_points):
+    """Builds the idealness table and end point mask for a set of end points
+
+    Returns:
+        A list with the idealness of every tile index, sys.maxsize for end points,
+        a bytearray with 1 for every tile index that is an end point,
+        and the end points as bitboard bits
+    """
+    direction = _get_direction(end_points)
+    idealness_table = [_idealness(x, y, direction) for x, y in geometry.LOCATIONS]
+    is_end = bytearray(TILE_COUNT)
+    end_bits = 0
+    for x, y in end_points:
+        index = geometry.tile_id(x, y)
+        if index is not None:
+            idealness_table[index] = sys.maxsize
+            is_end[index] = 1
+            end_bits |= 1 << bitboard.bit_index(x, y)
+    return idealness_table, is_end, end_bits
+
+
+# The four edges in GameMap.get_edges order: top right, top left, bottom left, bottom right
+EDGE_LOCATIONS = [[list(location) for location in edge] for edge in geometry.EDGES]
+EDGE_DIRECTIONS = [[1, 1], [-1, 1], [-1, -1], [1, -1]]
+# Built once when gamelib is imported, so pathfinding on a standard edge never computes idealness
+EDGE_TABLES = [_build_edge_tables(edge) for edge in EDGE_LOCATIONS]
+
+
+def get_edge_tables(end_points):
+    """Gets the idealness table, end point mask and end point bits for a set of end points.
+    The four edges use the precomputed EDGE_TABLES, any other end points get new tables.
+    """
+    edge = EDGE_DIRECTIONS.index(_get_direction(end_points))
+    if end_points == EDGE_LOCATIONS[edge]:
+        return EDGE_TABLES[edge]
+    return _build_edge_tables(end_points)
+
 
 class Node:
     """A pathfinding node
@@ -40,6 +103,7 @@ class ShortestPathFinder:
         self.HORIZONTAL = 1
         self.VERTICAL = 2
         self.initialized = False
+        self._table_end_points = None
 
     def initialize_map(self, game_state):
         """Initializes the map
@@ -79,6 +143,14 @@ class ShortestPathFinder:
         self._validate(ideal_endpoints, end_points)
         return self._get_path(start_point, end_points)
 
+    def navigate_batch(self, start_points, end_points, game_state):
+        """Finds the paths units at each start point would take to reach a set of endpoints
+
+        Returns:
+            A list with the result of navigate_multiple_endpoints for each start point
+        """
+        return [self.navigate_multiple_endpoints(start_point, end_points, game_state) for start_point in start_points]
+
     def _idealness_search(self, start, end_points):
         """
         Finds the most ideal tile in our 'pocket' of pathable space. 
@@ -137,26 +209,15 @@ class ShortestPathFinder:
     def _get_idealness(self, location, end_points):
         """Get the idealness of a tile, the reachable tile the unit most wants to path to.
         Better self destruct locations are more ideal. The endpoints are perfectly ideal. 
+        Looked up in the table for end_points, see get_edge_tables.
 
         Returns:
             A location the unit will attempt to reach
         """
-        if location in end_points:
-            return sys.maxsize
-
-        direction = self._get_direction_from_endpoints(end_points)
-
-        idealness = 0
-        if direction[1] == 1:
-            idealness += 28 * location[1]
-        else: 
-            idealness += 28 * (27 - location[1])
-        if direction[0] == 1:
-            idealness += location[0]
-        else: 
-            idealness += (27 - location[0])
-
-        return idealness
+        if end_points is not self._table_end_points:
+            self._table_end_points = end_points
+            self._idealness_table = get_edge_tables(end_points)[0]
+        return self._idealness_table[geometry.TILE_IDS[location[0] * ARENA_SIZE + location[1]]]
 
     def _validate(self, ideal_tile, end_points):
         """Breadth first search of the grid, setting the pathlengths of each node
@@ -297,20 +358,618 @@ class ShortestPathFinder:
             debug_write("Attempted to print_map before pathfinder initialization. Use 'this_object.initialize_map(game_state)' to initialize the map first")
             return
 
+        rows = []
         for y in range(28):
+            row = []
             for x in range(28):
                 node = self.game_map[x][28 - y - 1]
                 if not node.blocked and not node.pathlength == -1:
-                    self._print_justified(node.pathlength)
+                    row.append(self._justified(node.pathlength))
                 else:
-                    sys.stderr.write("   ")
-            debug_write("")
+                    row.append("   ")
+            rows.append("".join(row))
+        DEBUG_LOG.info("\n".join(rows))
+
+    def _justified(self, number):
+        """Formats a number between 100 and -10 in 3 spaces
+
+        """
+        return str(number).rjust(2) + " "
+
+
+class GridPathFinder:
+    """Handles pathfinding using flat arrays instead of a grid of Nodes
+
+    Follows the same idealness, validation and next move rules as ShortestPathFinder
+    and returns identical paths, but uses precomputed neighbor tables and a deque
+    so it is much cheaper to call many times per turn.
+
+    Attributes :
+        * HORIZONTAL (int): A constant representing a horizontal movement
+        * VERTICAL (int): A constant representing a vertical movement
+
+        * game_state (:obj: GameState): The current gamestate
+        * blocked (bytearray): 1 for each tile index that holds a structure
+        * pathlength (list): The distance between each tile index and the target, -1 if unreached
+
+    """
+    def __init__(self):
+        self.HORIZONTAL = 1
+        self.VERTICAL = 2
+        self.initialized = False
+
+    def initialize_map(self, game_state):
+        """Initializes the map
+
+        Args:
+            game_state: A GameState object representing the gamestate we want to traverse
+        """
+        self.initialized = True
+        self.game_state = game_state
+        self.blocked = bytearray(TILE_COUNT)
+        self.pathlength = [-1] * TILE_COUNT
+
+    def navigate_multiple_endpoints(self, start_point, end_points, game_state):
+        """Finds the path a unit would take to reach a set of endpoints
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            The path a unit at start_point would take when trying to reach end_points given the current game state.
+            Note that this path can change if a tower is destroyed during pathing, or if you or your enemy places structures.
+
+        """
+        if game_state.contains_stationary_unit(start_point):
+            return
+        start = self._get_index(start_point)
+        if start is None:
+            return
+
+        self.initialize_map(game_state)
+        self._fill_blocked(game_state)
+        end_indices = self._get_end_indices(end_points)
+        direction = self._get_direction_from_endpoints(end_points)
+        end_bits = get_edge_tables(end_points)[2]
+        ideal_tile, reached_edge, _ = self._fill_pocket(start, direction, end_bits)
+        self._validate(end_indices if reached_edge else [ideal_tile])
+        return self._get_path(start, direction)
+
+    def navigate_batch(self, start_points, end_points, game_state):
+        """Finds the paths units at each start point would take to reach a set of endpoints
+
+        Start points are grouped by the pocket of pathable space they are in. Every pocket touching
+        the edge shares the distance field from the end points, and every other pocket adds its most
+        ideal tile as another source, so a single breadth first search serves all start points.
+
+        Args:
+            * start_points: A list of starting locations
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            A list with the path for each start point, or None for start points that are blocked or out of bounds
+
+        """
+        self.initialize_map(game_state)
+        self._fill_blocked(game_state)
+        blocked = self.blocked
+        end_indices = self._get_end_indices(end_points)
+        direction = self._get_direction_from_endpoints(end_points)
+        end_bits = get_edge_tables(end_points)[2]
+
+        pocket_checked = 0
+        reached_edge = False
+        sources = []
+        starts = []
+        for start_point in start_points:
+            start = self._get_index(start_point)
+            if start is None or blocked[start]:
+                starts.append(None)
+                continue
+            starts.append(start)
+            if pocket_checked >> bitboard.bit_index(*TILE_LOCATIONS[start]) & 1:
+                continue
+            ideal_tile, pocket_has_edge, pocket = self._fill_pocket(start, direction, end_bits)
+            pocket_checked |= pocket
+            if pocket_has_edge:
+                reached_edge = True
+            else:
+                sources.append(ideal_tile)
+
+        self._validate(end_indices + sources if reached_edge else sources)
+        return [None if start is None else self._get_path(start, direction) for start in starts]
+
+    def _get_index(self, location):
+        """Gets the tile index of a location, or None if it is outside the arena
+        """
+        return geometry.tile_id(*location)
+
+    def _get_end_indices(self, end_points):
+        indices = []
+        for location in end_points:
+            index = self._get_index(location)
+            if index is not None:
+                indices.append(index)
+        return indices
+
+    def _fill_blocked(self, game_state):
+        """Marks every tile holding a structure as blocked, reading the game map's blocked bitboard
+        """
+        blocked = self.blocked
+        tile_ids = geometry.TILE_IDS
+        blocked_bits = game_state.game_map.blocked_board.bits
+        for x, y in bitboard.iter_locations(blocked_bits):
+            blocked[tile_ids[x * ARENA_SIZE + y]] = 1
+        self.open_bits = bitboard.VALID_MASK & ~blocked_bits
+
+    def _fill_pocket(self, start, direction, end_bits):
+        """Flood fills the pocket of pathable space around start with bitboards
+
+        Idealness orders tiles by row towards the target edge, then by column towards it,
+        so the most ideal tile is found from the extreme row of the pocket.
+
+        Returns:
+            The most ideal tile of the pocket, whether the pocket contains an end point, and the pocket bits
+        """
+        pocket = bitboard.flood_fill(1 << bitboard.bit_index(*TILE_LOCATIONS[start]), self.open_bits)
+        if pocket & end_bits:
+            return start, True, pocket
+        if direction[1] == 1:
+            y = (pocket.bit_length() - 1) // bitboard.ROW_BITS
+        else:
+            y = ((pocket & -pocket).bit_length() - 1) // bitboard.ROW_BITS
+        row = (pocket >> (y * bitboard.ROW_BITS)) & bitboard.ROW_MASK
+        if direction[0] == 1:
+            x = row.bit_length() - 1
+        else:
+            x = (row & -row).bit_length() - 1
+        return geometry.TILE_IDS[x * ARENA_SIZE + y], False, pocket
+
+    def _get_direction_from_endpoints(self, end_points):
+        """Gets the direction of an edge
+
+        Args:
+            * end_points: A set of endpoints, should be an edge
+
+        Returns:
+            A direction [x,y] representing the edge. For example, [1,1] for the top right and [-1, 1] for the top left
+
+        """
+        return _get_direction(end_points)
+
+    def _idealness_search(self, start, idealness_table, is_end):
+        """
+        Finds the most ideal tile in our 'pocket' of pathable space.
+        Returns the tile index and whether it is one of the end points.
+
+        Idealness only depends on the location, so each tile is scored once when it is first reached,
+        and the search stops as soon as an end point is found since nothing can beat it.
+        """
+        blocked = self.blocked
+        if is_end[start]:
+            return start, True
+
+        visited = bytearray(TILE_COUNT)
+        visited[start] = 1
+        most_ideal = start
+        best_idealness = -1
+        current = deque([start])
+        while current:
+            search_index = current.popleft()
+            if idealness_table[search_index] > best_idealness:
+                best_idealness = idealness_table[search_index]
+                most_ideal = search_index
+            for neighbor in TILE_NEIGHBORS[search_index]:
+                if blocked[neighbor] or visited[neighbor]:
+                    continue
+                if is_end[neighbor]:
+                    return neighbor, True
+                visited[neighbor] = 1
+                current.append(neighbor)
+        return most_ideal, False
 
-    def _print_justified(self, number):
-        """Prints a number between 100 and -10 in 3 spaces
+    def _validate(self, sources):
+        """Breadth first search of the grid, setting the pathlengths of each tile
 
         """
-        if number < 10 and number > -1:
-            sys.stderr.write(" ")
-        sys.stderr.write(str(number))
-        sys.stderr.write(" ")
+        blocked = self.blocked
+        pathlength = self.pathlength
+        current = deque()
+        for index in sources:
+            if pathlength[index] == -1:
+                pathlength[index] = 0
+                current.append(index)
+
+        while current:
+            current_index = current.popleft()
+            if blocked[current_index]:
+                continue
+            next_length = pathlength[current_index] + 1
+            for neighbor in TILE_NEIGHBORS[current_index]:
+                if not blocked[neighbor] and pathlength[neighbor] == -1:
+                    pathlength[neighbor] = next_length
+                    current.append(neighbor)
+
+    def _get_path(self, start, direction):
+        """Once all tiles are validated, and a target is found, the unit can path to its target
+
+        """
+        pathlength = self.pathlength
+        path = [TILE_LOCATIONS[start][:]]
+        current = start
+        move_direction = 0
+
+        while not pathlength[current] == 0:
+            next_move = self._choose_next_move(current, move_direction, direction)
+            if TILE_LOCATIONS[next_move][0] == TILE_LOCATIONS[current][0]:
+                move_direction = self.VERTICAL
+            else:
+                move_direction = self.HORIZONTAL
+            path.append(TILE_LOCATIONS[next_move][:])
+            current = next_move
+        return path
+
+    def _choose_next_move(self, current_index, previous_move_direction, direction):
+        """Given the current tile and adjacent tiles, return the best 'next step' for a given unit to take
+        """
+        blocked = self.blocked
+        pathlength = self.pathlength
+        ideal_neighbor = current_index
+        best_pathlength = pathlength[current_index]
+        for neighbor in TILE_NEIGHBORS[current_index]:
+            if blocked[neighbor]:
+                continue
+
+            current_pathlength = pathlength[neighbor]
+            if current_pathlength > best_pathlength:
+                continue
+            if current_pathlength == best_pathlength and not self._better_direction(
+                    current_index, neighbor, ideal_neighbor, previous_move_direction, direction):
+                continue
+
+            ideal_neighbor = neighbor
+            best_pathlength = current_pathlength
+        return ideal_neighbor
+
+    def _better_direction(self, prev_index, new_index, best_index, previous_move_direction, direction):
+        """Compare two tiles and return True if the unit would rather move to the new one.
+        Mirrors ShortestPathFinder._better_direction
+
+        """
+        prev_x, prev_y = TILE_LOCATIONS[prev_index]
+        new_x, new_y = TILE_LOCATIONS[new_index]
+        best_x, best_y = TILE_LOCATIONS[best_index]
+        if previous_move_direction == self.HORIZONTAL and not new_x == best_x:
+            return not prev_y == new_y
+        if previous_move_direction == self.VERTICAL and not new_y == best_y:
+            return not prev_x == new_x
+        if previous_move_direction == 0:
+            return not prev_y == new_y
+
+        if new_y == best_y:
+            return (direction[0] == 1 and new_x > best_x) or (direction[0] == -1 and new_x < best_x)
+        if new_x == best_x:
+            return (direction[1] == 1 and new_y > best_y) or (direction[1] == -1 and new_y < best_y)
+        return True
+
+    def print_map(self):
+        """Prints an ASCII version of the current game map for debug purposes
+
+        """
+        if not self.initialized:
+            debug_write("Attempted to print_map before pathfinder initialization. Use 'this_object.initialize_map(game_state)' to initialize the map first")
+            return
+
+        rows = []
+        for y in range(ARENA_SIZE):
+            row = []
+            for x in range(ARENA_SIZE):
+                index = geometry.tile_id(x, ARENA_SIZE - y - 1)
+                if index is not None and not self.blocked[index] and not self.pathlength[index] == -1:
+                    row.append(str(self.pathlength[index]).rjust(2) + " ")
+                else:
+                    row.append("   ")
+            rows.append("".join(row))
+        DEBUG_LOG.info("\n".join(rows))
+
+
+class PathSensitivity:
+    """How a unit's path changes if a structure is placed at one location
+
+    Attributes :
+        * location ([int, int]): The location a structure was placed at
+        * path (list): The path with the structure in place, None if the structure blocks the start location
+        * changed (bool): Whether path differs from the path without the structure
+        * length_change (int): Number of extra tiles the new path has, negative if it is shorter
+        * diverge_index (int): Index of the first tile where the paths differ, -1 if they do not
+
+    """
+    def __init__(self, location, base_path, path):
+        self.location = location
+        self.path = path
+        self.changed = path != base_path
+        base_length = len(base_path) if base_path else 0
+        self.length_change = (len(path) if path else 0) - base_length
+        self.diverge_index = -1
+        if self.changed:
+            self.diverge_index = 0
+            if path and base_path:
+                while (self.diverge_index < min(len(path), len(base_path))
+                       and path[self.diverge_index] == base_path[self.diverge_index]):
+                    self.diverge_index += 1
+
+
+class IncrementalPathFinder(GridPathFinder):
+    """A GridPathFinder that keeps the distance field to one edge between calls
+
+    Blocking or unblocking a single tile only repairs the part of the field whose
+    distances change, and every change is logged so hypothetical structures can
+    be rolled back. Useful for asking how paths react to many candidate placements.
+
+    Start points in a pocket that cannot reach the edge are pathed with a full search,
+    since their target tile depends on the pocket.
+
+    """
+    def prepare(self, game_state, end_points):
+        """Builds the blocked mask and the distance field to end_points
+
+        Args:
+            * game_state: The current game state
+            * end_points: The end points of the units, should be a list of edge locations
+        """
+        self.initialize_map(game_state)
+        self._fill_blocked(game_state)
+        self.end_points = end_points
+        self.end_indices = self._get_end_indices(end_points)
+        self.idealness_table, self.is_end, _ = get_edge_tables(end_points)
+        self.direction = self._get_direction_from_endpoints(end_points)
+        self._validate(self.end_indices)
+        self._undo_log = []
+
+    def checkpoint(self):
+        """Returns a marker that rollback can return to
+        """
+        return len(self._undo_log)
+
+    def rollback(self, checkpoint=0):
+        """Undoes every add_blocker and remove_blocker since the given checkpoint
+        """
+        log = self._undo_log
+        while len(log) > checkpoint:
+            index, pathlength, blocked = log.pop()
+            self.pathlength[index] = pathlength
+            self.blocked[index] = blocked
+
+    def _log(self, index):
+        self._undo_log.append((index, self.pathlength[index], self.blocked[index]))
+
+    def add_blocker(self, location):
+        """Blocks a tile and repairs the distances that went through it
+
+        Returns:
+            True if the tile was not already blocked
+        """
+        blocked_index = self._get_index(location)
+        if blocked_index is None or self.blocked[blocked_index]:
+            return False
+        blocked = self.blocked
+        pathlength = self.pathlength
+        old_length = pathlength[blocked_index]
+        self._log(blocked_index)
+        blocked[blocked_index] = 1
+        if not self.is_end[blocked_index]:
+            pathlength[blocked_index] = -1
+        if old_length == -1:
+            return True
+
+        # Find tiles that lost every neighbor one step closer to the target, in order of distance
+        affected = bytearray(TILE_COUNT)
+        affected_tiles = []
+        candidates = deque(neighbor for neighbor in TILE_NEIGHBORS[blocked_index]
+                           if not blocked[neighbor] and pathlength[neighbor] == old_length + 1)
+        while candidates:
+            index = candidates.popleft()
+            if affected[index]:
+                continue
+            parent_length = pathlength[index] - 1
+            supported = False
+            for neighbor in TILE_NEIGHBORS[index]:
+                if not blocked[neighbor] and not affected[neighbor] and pathlength[neighbor] == parent_length:
+                    supported = True
+                    break
+            if supported:
+                continue
+            affected[index] = 1
+            affected_tiles.append(index)
+            for neighbor in TILE_NEIGHBORS[index]:
+                if not blocked[neighbor] and pathlength[neighbor] == parent_length + 2:
+                    candidates.append(neighbor)
+
+        for index in affected_tiles:
+            self._log(index)
+            pathlength[index] = -1
+
+        # Rebuild the affected region from its unaffected border
+        frontier = []
+        for index in affected_tiles:
+            best = -1
+            for neighbor in TILE_NEIGHBORS[index]:
+                if not blocked[neighbor] and not affected[neighbor] and pathlength[neighbor] != -1:
+                    if best == -1 or pathlength[neighbor] + 1 < best:
+                        best = pathlength[neighbor] + 1
+            if best != -1:
+                heapq.heappush(frontier, (best, index))
+        while frontier:
+            length, index = heapq.heappop(frontier)
+            if pathlength[index] != -1:
+                continue
+            pathlength[index] = length
+            for neighbor in TILE_NEIGHBORS[index]:
+                if affected[neighbor] and pathlength[neighbor] == -1:
+                    heapq.heappush(frontier, (length + 1, neighbor))
+        return True
+
+    def remove_blocker(self, location):
+        """Unblocks a tile and spreads the shorter distances through it
+
+        Returns:
+            True if the tile was blocked
+        """
+        unblocked_index = self._get_index(location)
+        if unblocked_index is None or not self.blocked[unblocked_index]:
+            return False
+        blocked = self.blocked
+        pathlength = self.pathlength
+        self._log(unblocked_index)
+        blocked[unblocked_index] = 0
+        if not self.is_end[unblocked_index]:
+            for neighbor in TILE_NEIGHBORS[unblocked_index]:
+                if not blocked[neighbor] and pathlength[neighbor] != -1:
+                    if pathlength[unblocked_index] == -1 or pathlength[neighbor] + 1 < pathlength[unblocked_index]:
+                        pathlength[unblocked_index] = pathlength[neighbor] + 1
+            if pathlength[unblocked_index] == -1:
+                return True
+
+        current = deque([unblocked_index])
+        while current:
+            index = current.popleft()
+            next_length = pathlength[index] + 1
+            for neighbor in TILE_NEIGHBORS[index]:
+                if not blocked[neighbor] and (pathlength[neighbor] == -1 or pathlength[neighbor] > next_length):
+                    self._log(neighbor)
+                    pathlength[neighbor] = next_length
+                    current.append(neighbor)
+        return True
+
+    def get_path(self, start_point):
+        """Gets the path a unit at start_point would take with the current blockers
+
+        Returns:
+            The path, or None if start_point is blocked or out of bounds
+        """
+        start = self._get_index(start_point)
+        if start is None or self.blocked[start]:
+            return None
+        if self.pathlength[start] != -1:
+            return self._get_path(start, self.direction)
+
+        # The edge is unreachable, so path to the best self destruct tile of this pocket instead
+        pocket_finder = GridPathFinder()
+        pocket_finder.initialize_map(self.game_state)
+        pocket_finder.blocked = bytearray(self.blocked)
+        ideal_tile, _ = pocket_finder._idealness_search(start, self.idealness_table, self.is_end)
+        pocket_finder._validate([ideal_tile])
+        return pocket_finder._get_path(start, self.direction)
+
+    def path_sensitivity(self, start_point, candidate_locations):
+        """Checks how the path from start_point changes when a structure is placed at each candidate location
+
+        Args:
+            * start_point: The starting location of the unit
+            * candidate_locations: Locations to try placing a structure at, one at a time
+
+        Returns:
+            A list with a PathSensitivity for each candidate location that was not already blocked
+        """
+        base_path = self.get_path(start_point)
+        results = []
+        for location in candidate_locations:
+            checkpoint = self.checkpoint()
+            if not self.add_blocker(location):
+                continue
+            results.append(PathSensitivity(location, base_path, self.get_path(start_point)))
+            self.rollback(checkpoint)
+        return results
+
+
+"""
+The pathfinder GameState uses. "grid" is the array backed GridPathFinder,
+"node" is the original ShortestPathFinder.
+"""
+DEFAULT_BACKEND = "grid"
+
+
+def create_path_finder(backend=None):
+    """Creates a pathfinder for the requested backend
+
+    Args:
+        backend: "grid" or "node". Uses DEFAULT_BACKEND if None.
+
+    Returns:
+        A pathfinder with a navigate_multiple_endpoints method
+    """
+    if backend is None:
+        backend = DEFAULT_BACKEND
+    if backend == "node":
+        return ShortestPathFinder()
+    if not backend == "grid":
+        debug_write("Unknown pathfinder backend '{}', using 'grid'".format(backend))
+    return GridPathFinder()
+
+
+class PathCache:
+    """Bounded least recently used cache of paths
+
+    GameState.find_path_to_edge keys it by (x, y, target_edge, game_map.blocked_hash),
+    so a path is reused for as long as the same set of locations holds structures.
+
+    Attributes :
+        * maxsize (int): The most paths kept before the least recently used one is evicted
+        * hits (int): Number of lookups that found a path
+        * misses (int): Number of lookups that did not
+
+    """
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__paths = OrderedDict()
+
+    def __len__(self):
+        return len(self.__paths)
+
+    def get(self, key):
+        """Gets the cached path for a key
+
+        Returns:
+            The path, or None if it is not cached. Callers should copy the path before modifying it.
+        """
+        path = self.__paths.get(key)
+        if path is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            self.__paths.move_to_end(key)
+        except KeyError:
+            # Evicted by a background worker thread since the lookup
+            pass
+        return path
+
+    def put(self, key, path):
+        """Stores a path, evicting the least recently used path if the cache is full
+        """
+        self.__paths[key] = path
+        try:
+            self.__paths.move_to_end(key)
+            if len(self.__paths) > self.maxsize:
+                self.__paths.popitem(last=False)
+        except KeyError:
+            # Another thread evicted paths at the same time
+            pass
+
+    def clear(self):
+        """Removes all paths and resets the hit and miss counters
+        """
+        self.__paths.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+"""
+Shared by every GameState so paths carry over between turns while the structures do not change.
+"""
+PATH_CACHE = PathCache()
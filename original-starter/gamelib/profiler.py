@@ -0,0 +1,252 @@
+"""
+Measures where an algo's turn time goes.
+
+PROFILER is disabled until enabled, usually with AlgoCore.enable_profiling. Enabling it
+wraps the gamelib functions in TIMED_FUNCTIONS so each call is timed as a section, and
+the ones in COUNTED_FUNCTIONS, which are too small and frequent to time, so their calls
+are counted. Disabling it puts the original functions back, so a disabled profiler
+costs nothing in them. Strategies can time their own code with profile_section:
+
+    with gamelib.profile_section("choose defenses"):
+        ...
+
+Sections nest, and each one's time is recorded both under its name and under the stack
+of sections it ran in. write saves a JSON summary, and the stacks in the collapsed format
+flamegraph tools read.
+
+Only the thread that enabled the profiler is measured, so background work does not mix
+into the turn's stacks.
+"""
+import functools
+import importlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+"""
+Functions timed as sections while the profiler is enabled, as (module, class, function)
+"""
+TIMED_FUNCTIONS = [
+    ("game_state", "GameState", "__init__"),
+    ("game_state", "GameState", "submit_turn"),
+    ("game_state", "GameState", "attempt_spawn"),
+    ("game_state", "GameState", "attempt_remove"),
+    ("game_state", "GameState", "attempt_upgrade"),
+    ("game_state", "GameState", "find_path_to_edge"),
+    ("game_state", "GameState", "find_paths_to_edge_batch"),
+    ("game_state", "GameState", "enemy_path_heatmap"),
+    ("game_state", "GameState", "damage_map"),
+    ("navigation", "ShortestPathFinder", "navigate_multiple_endpoints"),
+    ("navigation", "GridPathFinder", "navigate_multiple_endpoints"),
+    ("navigation", "GridPathFinder", "navigate_batch"),
+    ("simulator", "Simulator", "run"),
+]
+
+"""
+Functions whose calls are only counted while the profiler is enabled, as (module, class, function)
+"""
+COUNTED_FUNCTIONS = [
+    ("game_map", "GameMap", "__getitem__"),
+    ("game_map", "GameMap", "in_arena_bounds"),
+    ("game_map", "GameMap", "locations_in_range"),
+    ("game_state", "GameState", "can_spawn"),
+    ("game_state", "GameState", "contains_stationary_unit"),
+    ("game_state", "GameState", "get_target"),
+    ("game_state", "GameState", "get_attackers"),
+    ("navigation", "PathCache", "get"),
+]
+
+
+class _NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class _Section:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler._exit()
+        return False
+
+
+class Profiler:
+    """Times named sections and counts calls of hot functions
+
+    Attributes :
+        * enabled (bool): Whether sections are being measured
+        * clock (function): Returns the current time in seconds, time.perf_counter by default
+        * sections (dict): For each section name, a list of its calls, total seconds and longest call in seconds
+        * stacks (dict): For each tuple of nested section names, the seconds spent in the innermost one outside of its children
+        * counts (Counter): Calls of each counted function
+        * turns (list): A (turn number, seconds) pair for each turn recorded with record_turn
+
+    """
+    def __init__(self, clock=time.perf_counter):
+        self.enabled = False
+        self.clock = clock
+        self.__thread = None
+        self.__installed = []
+        self.reset()
+
+    def reset(self):
+        """Forgets everything measured so far
+        """
+        self.sections = {}
+        self.stacks = {}
+        self.counts = Counter()
+        self.turns = []
+        self.__stack = []
+
+    def enable(self, instrument=True):
+        """Starts measuring on the calling thread
+
+        Args:
+            instrument: Whether to wrap TIMED_FUNCTIONS and COUNTED_FUNCTIONS, False to only measure profile_section
+        """
+        self.__thread = threading.get_ident()
+        self.enabled = True
+        if instrument and not self.__installed:
+            for module_name, class_name, function_name in TIMED_FUNCTIONS:
+                self.__install(module_name, class_name, function_name, self.__timed)
+            for module_name, class_name, function_name in COUNTED_FUNCTIONS:
+                self.__install(module_name, class_name, function_name, self.__counted)
+
+    def disable(self):
+        """Stops measuring and puts back the original functions. What was measured is kept.
+        """
+        self.enabled = False
+        for owner, function_name, original in reversed(self.__installed):
+            setattr(owner, function_name, original)
+        self.__installed = []
+
+    def __install(self, module_name, class_name, function_name, wrap):
+        owner = getattr(importlib.import_module("." + module_name, __package__), class_name)
+        original = owner.__dict__.get(function_name)
+        if original is None:
+            return
+        setattr(owner, function_name, wrap("{}.{}".format(class_name, function_name), original))
+        self.__installed.append((owner, function_name, original))
+
+    def __timed(self, name, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not self.enabled or threading.get_ident() != self.__thread:
+                return function(*args, **kwargs)
+            self._enter(name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._exit()
+        return wrapper
+
+    def __counted(self, name, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if self.enabled and threading.get_ident() == self.__thread:
+                self.counts[name] += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    def section(self, name):
+        """A context manager timing the code inside it as a section, see profile_section
+        """
+        if not self.enabled or threading.get_ident() != self.__thread:
+            return _NULL_SECTION
+        return _Section(self, name)
+
+    def _enter(self, name):
+        # Each frame of the stack is [name, start time, seconds spent in child sections]
+        self.__stack.append([name, self.clock(), 0.0])
+
+    def _exit(self):
+        name, start, children = self.__stack.pop()
+        elapsed = self.clock() - start
+        if self.__stack:
+            self.__stack[-1][2] += elapsed
+        totals = self.sections.get(name)
+        if totals is None:
+            totals = self.sections[name] = [0, 0.0, 0.0]
+        totals[0] += 1
+        totals[1] += elapsed
+        totals[2] = max(totals[2], elapsed)
+        stack = tuple(frame[0] for frame in self.__stack) + (name,)
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + elapsed - children
+
+    def record_turn(self, turn_number, seconds):
+        """Records how long a turn took
+        """
+        if self.enabled:
+            self.turns.append((turn_number, seconds))
+
+    def summary(self):
+        """Everything measured, as a dict that can be written as JSON
+
+        Returns:
+            A dict with "sections" mapping each name to its "calls", "seconds" and "max_seconds",
+            sorted by total seconds, the "counts" of counted functions and the "turns" recorded
+        """
+        sections = sorted(self.sections.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            "sections": {name: {"calls": calls, "seconds": seconds, "max_seconds": longest}
+                         for name, (calls, seconds, longest) in sections},
+            "counts": dict(self.counts.most_common()),
+            "turns": [{"turn": turn, "seconds": seconds} for turn, seconds in self.turns]}
+
+    def collapsed_stacks(self):
+        """The section stacks in the collapsed format read by flamegraph tools
+
+        Returns:
+            A string with a line per stack: the section names joined by semicolons and the microseconds spent in it
+        """
+        lines = []
+        for stack, seconds in sorted(self.stacks.items()):
+            microseconds = int(round(seconds * 1000000))
+            if microseconds > 0:
+                lines.append("{} {}".format(";".join(name.replace(";", ",").replace(" ", "_") for name in stack), microseconds))
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def write(self, path):
+        """Writes the summary as JSON to path, and the collapsed stacks next to it with a .folded extension
+
+        Returns:
+            The path the collapsed stacks were written to
+        """
+        with open(path, "w") as summary_file:
+            json.dump(self.summary(), summary_file, indent=1)
+        stacks_path = os.path.splitext(path)[0] + ".folded"
+        with open(stacks_path, "w") as stacks_file:
+            stacks_file.write(self.collapsed_stacks())
+        return stacks_path
+
+
+"""
+The profiler AlgoCore and profile_section use
+"""
+PROFILER = Profiler()
+
+
+def profile_section(name):
+    """Times the code in a with block as a section of PROFILER. Does nothing while it is disabled.
+
+    Args:
+        name: The section's name
+
+    Returns:
+        A context manager
+    """
+    return PROFILER.section(name)
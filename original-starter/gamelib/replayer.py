@@ -0,0 +1,276 @@
+"""
+Replays recorded games into an algo without the game engine.
+
+Setting AlgoCore.record_path saves every message the engine sends, exactly as received,
+one per line. replay feeds such a recording to a new algo in this process, seeding random
+first and emptying gamelib's caches so every run starts cold, and measures how long each
+turn takes and which commands the algo sends.
+check_determinism replays it several times and reports the first turn where the
+commands differ, since a recording only makes a repeatable benchmark if the algo acts
+the same way each time.
+
+Run the algo_strategy.py next to gamelib over a recording with:
+
+    python -m gamelib.replayer game.rec --runs 3
+"""
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import time
+
+from .debug_log import DEBUG_LOG, OFF
+from .message import classify, parse_fields, TURN, END
+
+
+"""
+Caches gamelib keeps for the life of the algo process, as (module, attribute, method emptying it).
+replay empties them first, so every run starts cold like a new process.
+"""
+CACHES = [
+    ("navigation", "PATH_CACHE", "clear"),
+    ("geometry", "_STENCILS", "clear"),
+    ("geometry", "_RANGE_CACHE", "clear"),
+    ("bitboard", "_RANGE_BITS", "clear"),
+    ("profiler", "PROFILER", "reset"),
+]
+
+
+class _EndOfRecording(Exception):
+    pass
+
+
+class ReplayRun:
+    """The result of replaying a recording once
+
+    Attributes :
+        * seed (int): The random seed the run started with
+        * turns (list): The turn number of each turn the algo played
+        * commands (list): For each turn, the command lines the algo sent
+        * latencies (list): For each turn, the seconds the algo spent on it
+        * frame_seconds (float): Total seconds the algo spent on action frames
+        * seconds (float): Total seconds of the run
+        * finished (bool): Whether the algo stopped at the end message
+        * error (str): The error the algo raised, None if it did not
+
+    """
+    def __init__(self, seed):
+        self.seed = seed
+        self.turns = []
+        self.commands = []
+        self.latencies = []
+        self.frame_seconds = 0.0
+        self.seconds = 0.0
+        self.finished = False
+        self.error = None
+
+    def mean_latency(self):
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0
+
+    def max_latency(self):
+        return max(self.latencies) if self.latencies else 0
+
+
+class _Player:
+    # Stands in for the engine: hands out the recorded messages and collects the algo's output
+    def __init__(self, messages, run):
+        self.messages = iter(messages)
+        self.run = run
+        self.kind = None
+        self.handed_out = None
+
+    def get_command(self):
+        self.__finish_message()
+        try:
+            message = next(self.messages)
+        except StopIteration:
+            raise _EndOfRecording()
+        self.kind = classify(message)
+        if self.kind == TURN:
+            self.run.turns.append(parse_fields(message, ()).data["turnInfo"][1])
+            self.run.commands.append([])
+        elif self.kind == END:
+            self.run.finished = True
+        self.handed_out = time.perf_counter()
+        return message
+
+    def __finish_message(self):
+        if self.handed_out is None:
+            return
+        seconds = time.perf_counter() - self.handed_out
+        if self.kind == TURN:
+            self.run.latencies.append(seconds)
+        elif self.kind is not None and self.kind != END:
+            self.run.frame_seconds += seconds
+        self.handed_out = None
+
+    def write(self, text):
+        if self.kind == TURN:
+            self.run.commands[-1].extend(line for line in text.splitlines() if line)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def load_recording(path):
+    """Reads the messages of a recording
+
+    Returns:
+        A list of the messages, each ending with a newline like the engine's
+    """
+    with open(path) as recording:
+        return [line for line in recording if line.strip()]
+
+
+def _start_module(algo):
+    # The module whose get_command the algo's start loop calls, so algos on any copy of gamelib can be replayed
+    for algo_class in type(algo).__mro__:
+        if "start" in algo_class.__dict__:
+            return sys.modules[algo_class.__module__]
+    raise TypeError("{} has no start method".format(type(algo).__name__))
+
+
+def reset_caches(package=__package__):
+    """Empties the caches in CACHES of a gamelib package. Modules or caches the package does not have are skipped.
+
+    Args:
+        package: The name of the package, this gamelib by default
+    """
+    for module_name, attribute, method in CACHES:
+        cache = getattr(sys.modules.get("{}.{}".format(package, module_name)), attribute, None)
+        if cache is not None:
+            getattr(cache, method)()
+
+
+def replay(make_algo, messages, seed=0, quiet=True):
+    """Plays recorded messages into a new algo in this process
+
+    Args:
+        make_algo: A function taking no arguments that returns the algo, for example the AlgoStrategy class
+        messages: The recorded messages, or the path of a recording
+        seed: The seed random is given before the algo is made
+        quiet: Whether to hide the algo's debug output
+
+    Returns:
+        A ReplayRun
+    """
+    if isinstance(messages, str):
+        messages = load_recording(messages)
+    reset_caches()
+    run = ReplayRun(seed)
+    player = _Player(messages, run)
+    random.seed(seed)
+    level = DEBUG_LOG.level
+    if quiet:
+        DEBUG_LOG.flush()
+        DEBUG_LOG.set_level(OFF)
+    stdout = sys.stdout
+    start = time.perf_counter()
+    try:
+        algo = make_algo()
+        module = _start_module(algo)
+        if module.__package__ != __package__:
+            # The algo runs on its own copy of gamelib, with its own caches
+            reset_caches(module.__package__)
+        get_command = module.get_command
+        module.get_command = player.get_command
+        sys.stdout = player
+        try:
+            algo.start()
+        finally:
+            module.get_command = get_command
+    except _EndOfRecording:
+        pass
+    except Exception as error:
+        run.error = "{}: {}".format(type(error).__name__, error)
+    finally:
+        sys.stdout = stdout
+        if quiet:
+            DEBUG_LOG.set_level(level)
+    run.seconds = time.perf_counter() - start
+    return run
+
+
+def first_difference(runs):
+    """Finds the first turn where the runs sent different commands
+
+    Returns:
+        The index of the turn, or None if all runs sent the same commands
+    """
+    turns = max(len(run.commands) for run in runs) if runs else 0
+    for turn in range(turns):
+        commands = [run.commands[turn] if turn < len(run.commands) else None for run in runs]
+        if any(command != commands[0] for command in commands[1:]):
+            return turn
+    return None
+
+
+def check_determinism(make_algo, messages, runs=2, seed=0, quiet=True):
+    """Replays a recording several times with the same seed
+
+    Args:
+        make_algo: A function taking no arguments that returns the algo
+        messages: The recorded messages, or the path of a recording
+        runs: Number of times to replay it
+        seed: The seed every run starts with
+        quiet: Whether to hide the algo's debug output
+
+    Returns:
+        A tuple of the list of ReplayRuns and the first turn where their commands differ, None if they never do
+    """
+    if isinstance(messages, str):
+        messages = load_recording(messages)
+    results = [replay(make_algo, messages, seed, quiet) for _ in range(runs)]
+    return results, first_difference(results)
+
+
+def summarize(results, difference):
+    """Describes the runs of check_determinism
+
+    Returns:
+        The summary as a string
+    """
+    lines = []
+    for index, run in enumerate(results):
+        lines.append("Run {}: {} turns in {:.3f}s, mean turn {:.1f}ms, slowest turn {:.1f}ms, frames {:.1f}ms{}{}".format(
+            index + 1, len(run.turns), run.seconds, run.mean_latency() * 1000, run.max_latency() * 1000,
+            run.frame_seconds * 1000, "" if run.finished else ", recording ended early",
+            ", error: {}".format(run.error) if run.error else ""))
+    if difference is None:
+        lines.append("Commands were the same in every run")
+    else:
+        turn = results[0].turns[difference] if difference < len(results[0].turns) else difference
+        lines.append("Commands differ from turn {}:".format(turn))
+        for index, run in enumerate(results):
+            commands = run.commands[difference] if difference < len(run.commands) else None
+            lines.append("    run {}: {}".format(index + 1, commands))
+    return "\n".join(lines)
+
+
+def load_strategy(path):
+    """Loads the AlgoStrategy class from an algo_strategy.py file
+    """
+    spec = importlib.util.spec_from_file_location("replayed_algo_strategy", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.AlgoStrategy
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Replays a recorded game into an algo and checks it acts the same every time")
+    parser.add_argument("recording", help="a file written by AlgoCore with record_path set")
+    parser.add_argument("--algo", default="algo_strategy.py", help="the algo_strategy.py to replay into")
+    parser.add_argument("-n", "--runs", type=int, default=2, help="number of times to replay the recording")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="random seed every run starts with")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the algo's debug output")
+    options = parser.parse_args(args)
+    strategy = load_strategy(os.path.abspath(options.algo))
+    results, difference = check_determinism(strategy, options.recording, options.runs, options.seed, not options.verbose)
+    sys.stderr.write(summarize(results, difference) + "\n")
+    return 0 if difference is None and all(run.error is None for run in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
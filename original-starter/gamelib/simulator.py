@@ -0,0 +1,825 @@
+"""
+Local simulation of the action phase, built on GameState.
+
+Simulator steps frames the way the engine does: supports shield friendly mobile units,
+mobile units move along their paths by speed, breach or self destruct at the end of
+them, every unit attacks the target get_target would choose, and dead units are removed,
+with paths recomputed whenever a structure is destroyed.
+"""
+import time
+
+from . import geometry
+from .bitboard import bit_index, iter_locations, range_bits
+
+_HALF_ARENA_CENTER = geometry.HALF_ARENA - 0.5
+_EDGE_SETS = [frozenset(edge) for edge in geometry.EDGES]
+
+
+def _mobile_tables(config):
+    # The self destruct (damage to mobile units, damage to structures, range, steps required), breach
+    # (health damage, SP gained) and MP cost of each mobile unit type
+    self_destruct = {}
+    breach = {}
+    mp_cost = {}
+    for type_config in config["unitInformation"]:
+        if type_config.get("unitCategory") == 1:
+            self_destruct[type_config["shorthand"]] = (
+                type_config.get("selfDestructDamageWalker", 0), type_config.get("selfDestructDamageTower", 0),
+                type_config.get("selfDestructRange", 0), type_config.get("selfDestructStepsRequired", 0))
+            breach[type_config["shorthand"]] = (
+                type_config.get("playerBreachDamage", 1), type_config.get("metalForBreach", 0))
+            mp_cost[type_config["shorthand"]] = type_config.get("cost2", 0)
+    return self_destruct, breach, mp_cost
+
+
+class SimUnit:
+    """The state of one unit during a simulation
+
+    Attributes :
+        * unit_type (str): The unit's shorthand
+        * player_index (int): 0 for you, 1 for the enemy
+        * x, y (int): The unit's location
+        * health (float): The unit's current health, including shields
+        * stationary (bool): Whether the unit is a structure
+        * speed, damage_f, damage_i, attackRange, shieldRange, shieldPerUnit, shieldBonusPerY: As on GameUnit
+        * unit_id (str): The engine's id for the unit, if known
+        * path (list): The locations the unit is walking, starting at the location it was last pathed from
+        * path_index (int): The unit's position in path
+        * steps (int): Number of tiles the unit has moved since it spawned
+        * progress (float): Movement accumulated towards the next step, the unit moves when it reaches 1
+        * target_edge (int): The edge the unit is walking to
+        * shielded_by (set): The locations (x, y) of the supports that have already shielded this unit
+
+    """
+    __slots__ = ("unit_type", "player_index", "x", "y", "health", "stationary", "speed", "damage_f", "damage_i",
+                 "attackRange", "shieldRange", "shieldPerUnit", "shieldBonusPerY", "unit_id",
+                 "path", "path_index", "steps", "progress", "target_edge", "shielded_by")
+
+    def __init__(self, unit, unit_id=None):
+        self.unit_type = unit.unit_type
+        self.player_index = unit.player_index
+        self.x = unit.x
+        self.y = unit.y
+        self.health = unit.health
+        self.stationary = unit.stationary
+        self.speed = unit.speed
+        self.damage_f = unit.damage_f
+        self.damage_i = unit.damage_i
+        self.attackRange = unit.attackRange
+        self.shieldRange = unit.shieldRange
+        self.shieldPerUnit = unit.shieldPerUnit
+        self.shieldBonusPerY = unit.shieldBonusPerY
+        self.unit_id = unit_id
+        self.path = None
+        self.path_index = 0
+        self.steps = 0
+        self.progress = 0
+        self.target_edge = None
+        self.shielded_by = set()
+
+    def copy(self):
+        """Creates a copy of this unit that can be changed without affecting the original. The path is shared.
+        """
+        unit = SimUnit.__new__(SimUnit)
+        for name in SimUnit.__slots__:
+            setattr(unit, name, getattr(self, name))
+        unit.shielded_by = set(self.shielded_by)
+        return unit
+
+    def __repr__(self):
+        owner = "Friendly" if self.player_index == 0 else "Enemy"
+        return "{} {}, health: {} location: {}".format(owner, self.unit_type, self.health, [self.x, self.y])
+
+
+class SimulationResult:
+    """What happened during a simulated action phase. Lists hold one value per player, [you, enemy].
+
+    Attributes :
+        * frames (int): Number of frames simulated
+        * breaches (list): Number of breaches each player scored
+        * damage_dealt (list): Damage each player's units dealt to enemy units, including self destructs
+        * structures_destroyed (list): Number of enemy structures each player destroyed
+        * self_destructs (list): Number of each player's units that self destructed
+        * sp_gained (list): SP each player earned from breaches
+        * mp_spent (list): MP cost of the mobile units each player spawned
+        * game_state (:obj: GameState): The simulated state after the action phase, with destroyed structures removed and health reduced by breaches
+
+    """
+    def __init__(self, game_state):
+        self.frames = 0
+        self.breaches = [0, 0]
+        self.damage_dealt = [0, 0]
+        self.structures_destroyed = [0, 0]
+        self.self_destructs = [0, 0]
+        self.sp_gained = [0, 0]
+        self.mp_spent = [0, 0]
+        self.game_state = game_state
+
+    def copy(self, game_state):
+        """Creates a copy of these totals for a copy of the simulated state
+        """
+        result = SimulationResult(game_state)
+        result.frames = self.frames
+        for name in ("breaches", "damage_dealt", "structures_destroyed", "self_destructs", "sp_gained", "mp_spent"):
+            setattr(result, name, list(getattr(self, name)))
+        return result
+
+    def __repr__(self):
+        return "SimulationResult(frames: {}, breaches: {}, damage_dealt: {}, structures_destroyed: {})".format(
+            self.frames, self.breaches, self.damage_dealt, self.structures_destroyed)
+
+
+class Simulator:
+    """Simulates the action phase that would follow a game state
+
+    The simulator works on a clone of the game state, so the state it was created from is
+    not changed. Mobile units on the map, such as the ones added by attempt_spawn, are
+    spawned when the simulator is created, and more can be added with spawn().
+
+    Each frame follows the engine's order:
+        1. Supports shield every friendly mobile unit in their shieldRange that they have not shielded yet,
+           giving shieldPerUnit plus shieldBonusPerY for each row the support is away from its own side
+        2. Mobile units move once every 1 / speed frames. A unit reaching its target edge breaches,
+           and a unit at the end of a path that does not reach the edge self destructs
+        3. Every unit alive after moving attacks the target get_target would choose, including units
+           killed by an earlier attack in the same frame
+        4. Units with no health left are removed, and if a structure was destroyed every mobile unit is pathed again
+
+    Paths are found with GameState.find_paths_to_edge_batch. A unit pathed again in the middle
+    of the map does not remember its previous move direction, so it may break ties differently
+    from the engine.
+
+    Attributes :
+        * game_state (:obj: GameState): The clone being simulated
+        * frame (int): The number of frames simulated so far
+        * structures (dict): Maps each location (x, y) holding a structure to its SimUnit
+        * mobile_units (list): The SimUnits of the mobile units still alive
+        * result (:obj: SimulationResult): The totals so far
+
+    """
+    def __init__(self, game_state):
+        self.game_state = game_state.clone()
+        self.config = self.game_state.config
+        self.frame = 0
+        self.result = SimulationResult(self.game_state)
+        self.structures = {}
+        self.mobile_units = []
+        self.__structure_bits = [0, 0]
+        self.__hit_radius = self.config["unitInformation"][0].get("getHitRadius", 0)
+        self.__edge_sets = _EDGE_SETS
+        self.__self_destruct, self.__breach, self.__mp_cost = _mobile_tables(self.config)
+
+        game_map = self.game_state.game_map
+        spawns = []
+        for player_index in (0, 1):
+            for unit in game_map.units_of(player_index):
+                if unit.stationary:
+                    structure = SimUnit(unit)
+                    self.structures[structure.x, structure.y] = structure
+                    self.__structure_bits[player_index] |= 1 << bit_index(structure.x, structure.y)
+                else:
+                    spawns.append(SimUnit(unit))
+        for unit in spawns:
+            game_map[unit.x, unit.y] = []
+        self.__add_mobile_units(spawns)
+
+    def spawn(self, unit_type, locations, num=1, player_index=0):
+        """Adds mobile units to the simulation, without checking resources or spawn rules
+
+        Args:
+            unit_type: The type of mobile unit
+            locations: A single location or list of locations to spawn units at
+            num: The number of units to spawn at each location
+            player_index: The player that owns the units, 0 for you 1 for the enemy
+
+        Returns:
+            The number of units spawned
+        """
+        from .unit import GameUnit
+        if type(locations[0]) == int:
+            locations = [locations]
+        spawns = []
+        for x, y in locations:
+            if (x, y) in self.structures:
+                self.game_state.warn("Could not simulate a {} at {}, the location is blocked".format(unit_type, [x, y]))
+                continue
+            unit = GameUnit(unit_type, self.config, player_index, None, x, y)
+            if unit.stationary:
+                self.game_state.warn("Passed structure {} to Simulator.spawn. Expected a mobile unit.".format(unit_type))
+                return 0
+            spawns.extend(SimUnit(unit) for _ in range(num))
+        self.__add_mobile_units(spawns)
+        return len(spawns)
+
+    def copy(self):
+        """Creates a copy of this simulation, including its game state, that can be stepped separately
+        """
+        simulator = Simulator.__new__(Simulator)
+        simulator.__dict__.update(self.__dict__)
+        simulator.game_state = self.game_state.clone()
+        simulator.result = self.result.copy(simulator.game_state)
+        simulator.structures = {location: unit.copy() for location, unit in self.structures.items()}
+        simulator.mobile_units = [unit.copy() for unit in self.mobile_units]
+        simulator.__structure_bits = list(self.__structure_bits)
+        return simulator
+
+    def __add_mobile_units(self, units):
+        for unit in units:
+            unit.target_edge = self.game_state.get_target_edge([unit.x, unit.y])
+            self.result.mp_spent[unit.player_index] += self.__mp_cost[unit.unit_type]
+        self.mobile_units.extend(units)
+        self.__find_paths(units)
+
+    def __find_paths(self, units):
+        by_edge = {}
+        for unit in units:
+            by_edge.setdefault(unit.target_edge, []).append(unit)
+        for edge, edge_units in by_edge.items():
+            paths = self.game_state.find_paths_to_edge_batch([[unit.x, unit.y] for unit in edge_units], edge)
+            for unit, path in zip(edge_units, paths):
+                unit.path = path or [[unit.x, unit.y]]
+                unit.path_index = 0
+
+    def run(self, max_frames=1000):
+        """Simulates frames until no mobile units are left
+
+        Args:
+            max_frames: The most frames to simulate
+
+        Returns:
+            The SimulationResult
+        """
+        while self.mobile_units and self.frame < max_frames:
+            self.step()
+        return self.result
+
+    def step(self):
+        """Simulates one frame
+
+        Returns:
+            The SimulationResult so far
+        """
+        self.frame += 1
+        self.result.frames = self.frame
+        self.__shield()
+        self.__move()
+        self.__attack()
+        self.__remove_dead()
+        return self.result
+
+    def __in_range(self, unit, other, reach):
+        reach += self.__hit_radius
+        return (unit.x - other.x) ** 2 + (unit.y - other.y) ** 2 < reach * reach
+
+    def __shield(self):
+        for location, structure in self.structures.items():
+            if structure.shieldPerUnit <= 0 or structure.health <= 0:
+                continue
+            rows_from_edge = structure.y if structure.player_index == 0 else geometry.ARENA_SIZE - 1 - structure.y
+            amount = structure.shieldPerUnit + structure.shieldBonusPerY * rows_from_edge
+            for unit in self.mobile_units:
+                if (unit.player_index == structure.player_index and location not in unit.shielded_by
+                        and self.__in_range(structure, unit, structure.shieldRange)):
+                    unit.shielded_by.add(location)
+                    unit.health += amount
+
+    def __move(self):
+        edge_sets = self.__edge_sets
+        for unit in self.mobile_units:
+            if unit.health <= 0:
+                continue
+            unit.progress += unit.speed
+            if unit.progress < 1:
+                continue
+            unit.progress -= 1
+            if unit.path_index + 1 < len(unit.path):
+                unit.path_index += 1
+                unit.x, unit.y = unit.path[unit.path_index]
+                unit.steps += 1
+                if (unit.x, unit.y) in edge_sets[unit.target_edge]:
+                    self.__breach_unit(unit)
+            else:
+                self.__self_destruct_unit(unit)
+
+    def __breach_unit(self, unit):
+        health_damage, sp = self.__breach[unit.unit_type]
+        player = unit.player_index
+        self.result.breaches[player] += 1
+        self.result.sp_gained[player] += sp
+        if player == 0:
+            self.game_state.enemy_health -= health_damage
+        else:
+            self.game_state.my_health -= health_damage
+        unit.health = 0
+
+    def __self_destruct_unit(self, unit):
+        damage_i, damage_f, reach, steps_required = self.__self_destruct[unit.unit_type]
+        unit.health = 0
+        self.result.self_destructs[unit.player_index] += 1
+        if unit.steps < steps_required:
+            return
+        for other in self.mobile_units:
+            if other.player_index != unit.player_index and other.health > 0 and self.__in_range(unit, other, reach):
+                self.__damage(unit, other, damage_i)
+        enemy_bits = self.__structure_bits[1 - unit.player_index]
+        for x, y in iter_locations(range_bits(unit.x, unit.y, reach + self.__hit_radius) & enemy_bits):
+            structure = self.structures[x, y]
+            if structure.health > 0:
+                self.__damage(unit, structure, damage_f)
+
+    def __damage(self, attacker, target, damage):
+        target.health -= damage
+        self.result.damage_dealt[attacker.player_index] += damage
+
+    def __attack(self):
+        # Every unit alive when the attacks start gets to attack, even if an earlier attacker kills it
+        mobile_bits = [0, 0]
+        mobile_tiles = {}
+        attackers = []
+        for unit in self.mobile_units:
+            if unit.health > 0:
+                mobile_bits[unit.player_index] |= 1 << bit_index(unit.x, unit.y)
+                mobile_tiles.setdefault((unit.x, unit.y), []).append(unit)
+                attackers.append(unit)
+        attackers.extend(structure for structure in self.structures.values()
+                         if structure.damage_i > 0 and structure.health > 0 and mobile_bits[1 - structure.player_index])
+
+        for attacker in attackers:
+            self.__attack_target(attacker, mobile_bits, mobile_tiles)
+
+    def __attack_target(self, attacker, mobile_bits, mobile_tiles):
+        # Same priority as GameState.get_target: mobile units, nearest, lowest health, lowest y (highest for the enemy), closest to an edge
+        opponent = 1 - attacker.player_index
+        attacker_x, attacker_y = attacker.x, attacker.y
+        y_sign = 1 if attacker.player_index == 0 else -1
+        reach = attacker.attackRange + self.__hit_radius
+        in_range = range_bits(attacker_x, attacker_y, reach)
+        target = None
+        target_key = None
+        if attacker.damage_i > 0 and in_range & mobile_bits[opponent]:
+            for x, y in iter_locations(in_range & mobile_bits[opponent]):
+                distance = (x - attacker_x) ** 2 + (y - attacker_y) ** 2
+                for unit in mobile_tiles[x, y]:
+                    if unit.player_index != opponent or unit.health <= 0:
+                        continue
+                    key = (distance, unit.health, y_sign * y, -abs(_HALF_ARENA_CENTER - x))
+                    if target_key is None or key < target_key:
+                        target = unit
+                        target_key = key
+            if target is not None:
+                self.__damage(attacker, target, attacker.damage_i)
+                return
+        if attacker.damage_f > 0 and in_range & self.__structure_bits[opponent]:
+            for x, y in iter_locations(in_range & self.__structure_bits[opponent]):
+                unit = self.structures[x, y]
+                if unit.health <= 0:
+                    continue
+                key = ((x - attacker_x) ** 2 + (y - attacker_y) ** 2, unit.health, y_sign * y, -abs(_HALF_ARENA_CENTER - x))
+                if target_key is None or key < target_key:
+                    target = unit
+                    target_key = key
+            if target is not None:
+                self.__damage(attacker, target, attacker.damage_f)
+
+    def __remove_dead(self):
+        self.mobile_units = [unit for unit in self.mobile_units if unit.health > 0]
+        destroyed = [location for location, structure in self.structures.items() if structure.health <= 0]
+        if not destroyed:
+            return
+        game_map = self.game_state.game_map
+        for x, y in destroyed:
+            structure = self.structures.pop((x, y))
+            self.__structure_bits[structure.player_index] &= ~(1 << bit_index(x, y))
+            self.result.structures_destroyed[1 - structure.player_index] += 1
+            game_map.remove_unit([x, y])
+        self.__find_paths(self.mobile_units)
+
+
+class BatchSimulator:
+    """Simulates many hypothetical deployments from the same game state with a shared step
+
+    Every scenario starts from the same structures, so they are read once and each scenario only
+    keeps its own structure health as a column. Mobile units of all scenarios are stored together
+    as parallel columns, one row per unit. Each step runs one pass per frame over the shared
+    structures instead of one per scenario: a support or turret with no unit of any scenario in
+    range is skipped for all of them at once, and only structures that took damage are checked
+    for destruction. When structures are destroyed, scenarios left with the same blocked tiles
+    are pathed again together, once per distinct blocked_hash.
+
+    The results match running a Simulator for each scenario.
+
+    Attributes :
+        * frame (int): The number of frames simulated so far
+        * player_index (int): The player deploying the units
+        * game_state (:obj: GameState): The state every scenario starts from, without its mobile units
+
+    """
+    def __init__(self, game_state, scenarios, player_index=0):
+        """Sets up one simulation per scenario
+
+        Args:
+            game_state: The state every scenario starts from
+            scenarios: A list of deployments. Each deployment is a list of (unit_type, location, num) tuples,
+                for example [[(SCOUT, [13, 0], 5)], [(DEMOLISHER, [14, 0], 2), (SCOUT, [13, 0], 1)]]
+            player_index: The player deploying the units, 0 for you 1 for the enemy
+        """
+        from .unit import GameUnit
+        self.player_index = player_index
+        self.frame = 0
+        self.game_state = game_state.clone()
+        config = self.game_state.config
+        self.__hit_radius = config["unitInformation"][0].get("getHitRadius", 0)
+        self.__self_destruct, self.__breach, self.__mp_cost = _mobile_tables(config)
+
+        # Structures are shared by every scenario, only their health is kept per scenario
+        game_map = self.game_state.game_map
+        self.__structures = []
+        self.__structure_at = {}
+        base_bits = [0, 0]
+        base_health = []
+        base_mobile = []
+        for player_index_on_map in (0, 1):
+            for unit in game_map.units_of(player_index_on_map):
+                if unit.stationary:
+                    self.__structure_at[unit.x, unit.y] = len(self.__structures)
+                    self.__structures.append(unit)
+                    base_health.append(unit.health)
+                    base_bits[unit.player_index] |= 1 << bit_index(unit.x, unit.y)
+                else:
+                    base_mobile.append(unit)
+        for unit in base_mobile:
+            game_map[unit.x, unit.y] = []
+        # Supports as (structure, player, shield bits, shield amount, bit marking units it shielded)
+        self.__supports = []
+        # Structures that attack as (structure, player, attack bits, whether they can hit structures)
+        self.__turrets = []
+        for index, unit in enumerate(self.__structures):
+            if unit.shieldPerUnit > 0:
+                rows_from_edge = unit.y if unit.player_index == 0 else geometry.ARENA_SIZE - 1 - unit.y
+                self.__supports.append((index, unit.player_index, range_bits(unit.x, unit.y, unit.shieldRange + self.__hit_radius),
+                                        unit.shieldPerUnit + unit.shieldBonusPerY * rows_from_edge, 1 << len(self.__supports)))
+            if unit.damage_i > 0:
+                bits = range_bits(unit.x, unit.y, unit.attackRange + self.__hit_radius)
+                self.__turrets.append((index, unit.player_index, bits, unit.damage_f > 0 and bool(bits & base_bits[1 - unit.player_index])))
+
+        # Mobile unit columns, one row per unit of every scenario
+        self.__scenario = []
+        self.__player = []
+        self.__type = []
+        self.__x = []
+        self.__y = []
+        self.__bit = []
+        self.__health = []
+        self.__speed = []
+        self.__progress = []
+        self.__path = []
+        self.__path_index = []
+        self.__steps = []
+        self.__edge = []
+        self.__shielded = []
+        self.__damage_f = []
+        self.__damage_i = []
+        self.__reach = []
+
+        # Per scenario state
+        self.__structure_health = []
+        self.__structure_bits = []
+        self.__rows = []
+        self.__results = []
+
+        templates = {}
+        target_edges = {}
+        for deployment in scenarios:
+            scenario = len(self.__rows)
+            self.__rows.append([])
+            self.__structure_health.append(list(base_health))
+            self.__structure_bits.append(list(base_bits))
+            self.__results.append(SimulationResult(self.game_state.clone()))
+            for unit in base_mobile:
+                self.__add_row(scenario, unit, unit.x, unit.y, target_edges)
+            for unit_type, locations, num in deployment:
+                if type(locations[0]) == int:
+                    locations = [locations]
+                template = templates.get(unit_type)
+                if template is None:
+                    template = templates[unit_type] = GameUnit(unit_type, config, player_index, None, 0, 0)
+                if template.stationary:
+                    self.game_state.warn("Passed structure {} to BatchSimulator. Expected a mobile unit.".format(unit_type))
+                    continue
+                for x, y in locations:
+                    if (x, y) in self.__structure_at:
+                        self.game_state.warn("Could not simulate a {} at {}, the location is blocked".format(unit_type, [x, y]))
+                        continue
+                    for _ in range(num):
+                        self.__add_row(scenario, template, x, y, target_edges)
+        self.__find_paths(self.game_state, [row for rows in self.__rows for row in rows])
+
+    def __add_row(self, scenario, unit, x, y, target_edges):
+        row = len(self.__scenario)
+        target_edge = target_edges.get((x, y))
+        if target_edge is None:
+            target_edge = target_edges[x, y] = self.game_state.get_target_edge([x, y])
+        self.__scenario.append(scenario)
+        self.__player.append(unit.player_index)
+        self.__type.append(unit.unit_type)
+        self.__x.append(x)
+        self.__y.append(y)
+        self.__bit.append(1 << bit_index(x, y))
+        self.__health.append(unit.health)
+        self.__speed.append(unit.speed)
+        self.__progress.append(0)
+        self.__path.append(None)
+        self.__path_index.append(0)
+        self.__steps.append(0)
+        self.__edge.append(target_edge)
+        self.__shielded.append(0)
+        self.__damage_f.append(unit.damage_f)
+        self.__damage_i.append(unit.damage_i)
+        self.__reach.append(unit.attackRange + self.__hit_radius)
+        self.__rows[scenario].append(row)
+        self.__results[scenario].mp_spent[unit.player_index] += self.__mp_cost[unit.unit_type]
+
+    def __find_paths(self, game_state, rows):
+        # One pathfinding call per edge for every distinct start location of the rows
+        by_edge = {}
+        for row in rows:
+            by_edge.setdefault(self.__edge[row], {}).setdefault((self.__x[row], self.__y[row]), []).append(row)
+        for edge, starts in by_edge.items():
+            paths = game_state.find_paths_to_edge_batch([list(start) for start in starts], edge)
+            for (x, y), path in zip(starts, paths):
+                path = path or [[x, y]]
+                for row in starts[x, y]:
+                    self.__path[row] = path
+                    self.__path_index[row] = 0
+
+    def step(self):
+        """Simulates one frame of every scenario that still has mobile units
+
+        Returns:
+            The number of scenarios still running
+        """
+        running = [scenario for scenario, rows in enumerate(self.__rows) if rows]
+        if not running:
+            return 0
+        self.frame += 1
+        for scenario in running:
+            self.__results[scenario].frames += 1
+        self.__damaged = set()
+        self.__shield(running)
+        self.__move(running)
+        damaged = self.__attack(running)
+        self.__remove_dead(running, damaged)
+        return len(running)
+
+    def __shield(self, running):
+        if not self.__supports:
+            return
+        player, bit, health, shielded = self.__player, self.__bit, self.__health, self.__shielded
+        unit_bits = [0, 0]
+        for scenario in running:
+            for row in self.__rows[scenario]:
+                unit_bits[player[row]] |= bit[row]
+        for index, owner, shield_bits, amount, mark in self.__supports:
+            if not shield_bits & unit_bits[owner]:
+                continue
+            for scenario in running:
+                if self.__structure_health[scenario][index] <= 0:
+                    continue
+                for row in self.__rows[scenario]:
+                    if player[row] == owner and bit[row] & shield_bits and not shielded[row] & mark:
+                        shielded[row] |= mark
+                        health[row] += amount
+
+    def __move(self, running):
+        health, speed, progress, path, path_index = self.__health, self.__speed, self.__progress, self.__path, self.__path_index
+        x, y, bit, steps, edge = self.__x, self.__y, self.__bit, self.__steps, self.__edge
+        for scenario in running:
+            for row in self.__rows[scenario]:
+                if health[row] <= 0:
+                    continue
+                progress[row] += speed[row]
+                if progress[row] < 1:
+                    continue
+                progress[row] -= 1
+                if path_index[row] + 1 < len(path[row]):
+                    path_index[row] += 1
+                    x[row], y[row] = path[row][path_index[row]]
+                    bit[row] = 1 << bit_index(x[row], y[row])
+                    steps[row] += 1
+                    if (x[row], y[row]) in _EDGE_SETS[edge[row]]:
+                        self.__breach_row(scenario, row)
+                else:
+                    self.__self_destruct_row(scenario, row)
+
+    def __breach_row(self, scenario, row):
+        health_damage, sp = self.__breach[self.__type[row]]
+        player = self.__player[row]
+        result = self.__results[scenario]
+        result.breaches[player] += 1
+        result.sp_gained[player] += sp
+        if player == 0:
+            result.game_state.enemy_health -= health_damage
+        else:
+            result.game_state.my_health -= health_damage
+        self.__health[row] = 0
+
+    def __self_destruct_row(self, scenario, row):
+        damage_i, damage_f, reach, steps_required = self.__self_destruct[self.__type[row]]
+        health, player = self.__health, self.__player
+        owner = player[row]
+        result = self.__results[scenario]
+        health[row] = 0
+        result.self_destructs[owner] += 1
+        if self.__steps[row] < steps_required:
+            return
+        reach_bits = range_bits(self.__x[row], self.__y[row], reach + self.__hit_radius)
+        for other in self.__rows[scenario]:
+            if player[other] != owner and health[other] > 0 and self.__bit[other] & reach_bits:
+                health[other] -= damage_i
+                result.damage_dealt[owner] += damage_i
+        structure_health = self.__structure_health[scenario]
+        for x, y in iter_locations(reach_bits & self.__structure_bits[scenario][1 - owner]):
+            index = self.__structure_at[x, y]
+            if structure_health[index] > 0:
+                structure_health[index] -= damage_f
+                result.damage_dealt[owner] += damage_f
+                self.__damaged.add((scenario, index))
+
+    def __attack(self, running):
+        health, player, x, y, bit = self.__health, self.__player, self.__x, self.__y, self.__bit
+        # As in Simulator, every unit alive when the attacks start gets to attack. Structures killed
+        # during the attacks are remembered in __killed so they still fire this frame.
+        self.__killed = set()
+        unit_bits = {}
+        tiles = {}
+        attackers = {}
+        any_bits = [0, 0]
+        for scenario in running:
+            scenario_bits = [0, 0]
+            scenario_attackers = attackers[scenario] = []
+            for row in self.__rows[scenario]:
+                if health[row] > 0:
+                    scenario_bits[player[row]] |= bit[row]
+                    tiles.setdefault((scenario, player[row], x[row], y[row]), []).append(row)
+                    scenario_attackers.append(row)
+            unit_bits[scenario] = scenario_bits
+            any_bits[0] |= scenario_bits[0]
+            any_bits[1] |= scenario_bits[1]
+
+        for scenario in running:
+            for row in attackers[scenario]:
+                self.__hit(scenario, player[row], x[row], y[row], range_bits(x[row], y[row], self.__reach[row]),
+                           self.__damage_i[row], self.__damage_f[row], unit_bits[scenario], tiles)
+        for index, owner, attack_bits, hits_structures in self.__turrets:
+            opponent = 1 - owner
+            if not any_bits[opponent] or not (hits_structures or attack_bits & any_bits[opponent]):
+                continue
+            structure = self.__structures[index]
+            for scenario in running:
+                scenario_bits = unit_bits[scenario]
+                if not scenario_bits[opponent]:
+                    continue
+                if self.__structure_health[scenario][index] <= 0 and (scenario, index) not in self.__killed:
+                    continue
+                if hits_structures or attack_bits & scenario_bits[opponent]:
+                    self.__hit(scenario, owner, structure.x, structure.y, attack_bits,
+                               structure.damage_i, structure.damage_f, scenario_bits, tiles)
+        return self.__damaged
+
+    def __hit(self, scenario, owner, attacker_x, attacker_y, in_range, damage_i, damage_f, scenario_bits, tiles):
+        # Same priority as Simulator and GameState.get_target
+        opponent = 1 - owner
+        y_sign = 1 if owner == 0 else -1
+        result = self.__results[scenario]
+        target = None
+        target_key = None
+        if damage_i > 0 and in_range & scenario_bits[opponent]:
+            health = self.__health
+            for x, y in iter_locations(in_range & scenario_bits[opponent]):
+                distance = (x - attacker_x) ** 2 + (y - attacker_y) ** 2
+                for row in tiles[scenario, opponent, x, y]:
+                    if health[row] <= 0:
+                        continue
+                    key = (distance, health[row], y_sign * y, -abs(_HALF_ARENA_CENTER - x))
+                    if target_key is None or key < target_key:
+                        target = row
+                        target_key = key
+            if target is not None:
+                health[target] -= damage_i
+                result.damage_dealt[owner] += damage_i
+                return
+        structure_bits = self.__structure_bits[scenario][opponent]
+        if damage_f > 0 and in_range & structure_bits:
+            structure_health = self.__structure_health[scenario]
+            for x, y in iter_locations(in_range & structure_bits):
+                index = self.__structure_at[x, y]
+                if structure_health[index] <= 0:
+                    continue
+                key = ((x - attacker_x) ** 2 + (y - attacker_y) ** 2, structure_health[index], y_sign * y, -abs(_HALF_ARENA_CENTER - x))
+                if target_key is None or key < target_key:
+                    target = index
+                    target_key = key
+            if target is not None:
+                structure_health[target] -= damage_f
+                result.damage_dealt[owner] += damage_f
+                self.__damaged.add((scenario, target))
+                if structure_health[target] <= 0:
+                    self.__killed.add((scenario, target))
+
+    def __remove_dead(self, running, damaged):
+        health = self.__health
+        for scenario in running:
+            self.__rows[scenario] = [row for row in self.__rows[scenario] if health[row] > 0]
+        destroyed = {}
+        for scenario, index in damaged:
+            if self.__structure_health[scenario][index] <= 0:
+                destroyed.setdefault(scenario, []).append(index)
+        if not destroyed:
+            return
+        groups = {}
+        for scenario, indexes in destroyed.items():
+            result = self.__results[scenario]
+            structure_bits = self.__structure_bits[scenario]
+            for index in sorted(indexes):
+                structure = self.__structures[index]
+                structure_bits[structure.player_index] &= ~(1 << bit_index(structure.x, structure.y))
+                result.structures_destroyed[1 - structure.player_index] += 1
+                result.game_state.game_map.remove_unit([structure.x, structure.y])
+            # Scenarios that destroyed the same structures share their paths
+            groups.setdefault(result.game_state.game_map.blocked_hash, []).append(scenario)
+        for scenarios in groups.values():
+            self.__find_paths(self.__results[scenarios[0]].game_state, [row for scenario in scenarios for row in self.__rows[scenario]])
+
+    def run(self, max_frames=1000):
+        """Simulates every scenario until no mobile units are left
+
+        Args:
+            max_frames: The most frames to simulate
+
+        Returns:
+            A list with the SimulationResult of each scenario
+        """
+        while self.frame < max_frames and self.step():
+            pass
+        return self.results()
+
+    def results(self):
+        """Gets the SimulationResult of each scenario so far, in the order the scenarios were given
+        """
+        return list(self.__results)
+
+    def best(self, key=None):
+        """Gets the index of the best scenario so far
+
+        Args:
+            key: A function taking a SimulationResult and returning a value, higher is better.
+                Defaults to the most breaches, then structures destroyed, then damage dealt, then the least MP spent,
+                counted for the deploying player.
+
+        Returns:
+            The index of the best scenario, or None if there are none
+        """
+        results = self.results()
+        if not results:
+            return None
+        if key is None:
+            player = self.player_index
+            key = lambda result: (result.breaches[player], result.structures_destroyed[player], result.damage_dealt[player], -result.mp_spent[player])
+        return max(range(len(results)), key=lambda index: key(results[index]))
+
+def simulate(game_state, max_frames=1000):
+    """Simulates the action phase that would follow a game state, see Simulator
+
+    Returns:
+        The SimulationResult
+    """
+    return Simulator(game_state).run(max_frames)
+
+
+def benchmark_batch(game_state, scenarios, player_index=0, repeat=3):
+    """Times a BatchSimulator against a separate Simulator run for each scenario
+
+    Args:
+        game_state: The state every scenario starts from
+        scenarios: A list of deployments, as given to BatchSimulator
+        player_index: The player deploying the units
+        repeat: Number of times each is timed, the fastest time is kept
+
+    Returns:
+        A tuple of the seconds taken by the separate Simulators and by the BatchSimulator
+    """
+    separate = batch = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for deployment in scenarios:
+            simulator = Simulator(game_state)
+            for unit_type, locations, num in deployment:
+                simulator.spawn(unit_type, locations, num, player_index)
+            simulator.run()
+        seconds = time.perf_counter() - start
+        separate = seconds if separate is None else min(separate, seconds)
+        start = time.perf_counter()
+        BatchSimulator(game_state, scenarios, player_index).run()
+        seconds = time.perf_counter() - start
+        batch = seconds if batch is None else min(batch, seconds)
+    return separate, batch
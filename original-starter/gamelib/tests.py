@@ -1,7 +1,30 @@
 import unittest
 import json
+import random
+import sys
+import os
+import tempfile
+import io
+import pickle
+import time
+import threading
+from functools import partial
+from unittest import mock
+from .algocore import AlgoCore
+from .deadline import Deadline, anytime_search, iterative_deepening
+from .background import BackgroundWorker, precompute_artifacts
+from .debug_log import DebugLog, DEBUG_LOG, DEBUG, INFO, ERROR, OFF
+from .util import debug_write
+from .profiler import Profiler, profile_section
+from .replayer import replay, load_recording, check_determinism, first_difference
+from .message import ParsedState, decode, classify, parse_fields, JSON_BACKEND, CONFIG, TURN, FRAME, END, UNKNOWN
 from .game_state import GameState
 from .unit import GameUnit
+from .bitboard import Bitboard, VALID_MASK, BOTTOM_HALF_MASK
+from . import geometry, fidelity
+from . import game_map as game_map_module
+from .simulator import Simulator, BatchSimulator, simulate, benchmark_batch
+from .navigation import ShortestPathFinder, GridPathFinder, IncrementalPathFinder, PathCache, PATH_CACHE, EDGE_LOCATIONS, get_edge_tables
 
 class BasicTests(unittest.TestCase):
 
@@ -275,3 +298,834 @@ class BasicTests(unittest.TestCase):
         actual = game.project_future_MP(turns)
         self.assertAlmostEqual(actual, expected, 0, "Expected {} MP {} turns from now, got {}".format(expected, turns, actual))
 
+    def make_random_map(self, seed, density):
+        game = self.make_turn_0_map()
+        rng = random.Random(seed)
+        for location in game.game_map:
+            if rng.random() < density:
+                game.game_map.add_unit(rng.choice(["FF", "EF", "DF"]), location, rng.randint(0, 1))
+        return game
+
+    def test_grid_pathfinder_matches_reference(self):
+        for seed in range(8):
+            game = self.make_random_map(seed, [0.1, 0.3, 0.5, 0.7][seed % 4])
+            for edge in [game.game_map.TOP_RIGHT, game.game_map.TOP_LEFT, game.game_map.BOTTOM_LEFT, game.game_map.BOTTOM_RIGHT]:
+                end_points = game.game_map.get_edge_locations(edge)
+                for start in game.game_map.get_edge_locations((edge + 2) % 4):
+                    expected = ShortestPathFinder().navigate_multiple_endpoints(start, end_points, game)
+                    got = GridPathFinder().navigate_multiple_endpoints(start, end_points, game)
+                    self.assertEqual(expected, got, "Grid pathfinder disagrees from {} on seed {}".format(start, seed))
+
+    def test_path_cache(self):
+        game = self.make_turn_0_map()
+        game.path_cache = PathCache(maxsize=2)
+        empty_hash = game.game_map.blocked_hash
+        first = game.find_path_to_edge([13, 0])
+        self.assertEqual(first, game.find_path_to_edge([13, 0]), "Cached path should match the computed path")
+        self.assertEqual((1, 1), (game.path_cache.hits, game.path_cache.misses), "Second lookup should be a cache hit")
+
+        game.game_map.add_unit("FF", [13, 5])
+        self.assertNotEqual(empty_hash, game.game_map.blocked_hash, "Adding a structure should change the blocked hash")
+        game.game_map.add_unit("EI", [13, 6])
+        blocked_hash = game.game_map.blocked_hash
+        game.game_map.add_unit("DF", [13, 5])
+        self.assertEqual(blocked_hash, game.game_map.blocked_hash, "Replacing a structure should not change the blocked hash")
+        blocked_path = game.find_path_to_edge([13, 0])
+        self.assertEqual(ShortestPathFinder().navigate_multiple_endpoints([13, 0], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), game), blocked_path, "Path should be recomputed after blocking it")
+
+        game.game_map.remove_unit([13, 5])
+        self.assertEqual(empty_hash, game.game_map.blocked_hash, "Removing the structure should restore the blocked hash")
+        self.assertEqual(first, game.find_path_to_edge([13, 0]), "Original path should come back from the cache")
+        self.assertEqual(2, game.path_cache.hits, "Original path should be a cache hit")
+        game.find_path_to_edge([14, 0])
+        self.assertEqual(2, len(game.path_cache), "Cache should not grow past maxsize")
+
+    def test_find_paths_to_edge_batch(self):
+        for seed in range(4):
+            game = self.make_random_map(seed, [0.2, 0.4, 0.6, 0.8][seed])
+            game.path_cache = None
+            starts = [location for location in game.game_map if location[1] < game.HALF_ARENA]
+            expected = [None if game.contains_stationary_unit(start) else GridPathFinder().navigate_multiple_endpoints(
+                start, game.game_map.get_edge_locations(game.get_target_edge(start)), game) for start in starts]
+            self.assertEqual(expected, game.find_paths_to_edge_batch(starts), "Batch paths differ on seed {}".format(seed))
+            expected = [None if game.contains_stationary_unit(start) else GridPathFinder().navigate_multiple_endpoints(
+                start, game.game_map.get_edge_locations(game.game_map.TOP_LEFT), game) for start in starts]
+            self.assertEqual(expected, game.find_paths_to_edge_batch(starts, game.game_map.TOP_LEFT), "Batch paths to an edge differ on seed {}".format(seed))
+
+    def test_incremental_path_finder(self):
+        rng = random.Random(7)
+        for seed in range(3):
+            game = self.make_random_map(seed, 0.3)
+            end_points = game.game_map.get_edge_locations(game.game_map.TOP_RIGHT)
+            path_finder = IncrementalPathFinder()
+            path_finder.prepare(game, end_points)
+            original = list(path_finder.pathlength)
+            locations = list(game.game_map)
+            for _ in range(40):
+                location = rng.choice(locations)
+                if path_finder.blocked[geometry.tile_id(*location)]:
+                    path_finder.remove_blocker(location)
+                else:
+                    path_finder.add_blocker(location)
+                fresh = GridPathFinder()
+                fresh.initialize_map(game)
+                fresh.blocked = bytearray(path_finder.blocked)
+                fresh._validate(path_finder.end_indices)
+                self.assertEqual(fresh.pathlength, path_finder.pathlength, "Repaired distances differ from a fresh search")
+            path_finder.rollback()
+            self.assertEqual(original, path_finder.pathlength, "Rollback should restore the original distances")
+
+    def test_path_sensitivity(self):
+        game = self.make_random_map(3, 0.2)
+        game.path_cache = None
+        start = [13, 0]
+        game.game_map.remove_unit(start)
+        candidates = [location for location in game.game_map if location[1] < 14]
+        results = game.path_sensitivity(start, candidates)
+        self.assertEqual(len([location for location in candidates if not game.contains_stationary_unit(location)]), len(results), "Every open candidate should be reported")
+        base_path = game.find_path_to_edge(start)
+        for result in results:
+            game.game_map.add_unit("FF", result.location)
+            expected = None if result.location == start else game.find_path_to_edge(start)
+            game.game_map.remove_unit(result.location)
+            self.assertEqual(expected, result.path, "Wrong path with a structure at {}".format(result.location))
+            self.assertEqual(expected != base_path, result.changed, "Wrong changed flag for {}".format(result.location))
+
+    def test_enemy_path_heatmap(self):
+        game = self.make_random_map(5, 0.3)
+        heatmap = game.enemy_path_heatmap()
+        expected = [[0] * 28 for _ in range(28)]
+        for start in game.game_map.get_edge_locations(game.game_map.TOP_LEFT) + game.game_map.get_edge_locations(game.game_map.TOP_RIGHT):
+            if not game.contains_stationary_unit(start):
+                for x, y in game.find_path_to_edge(start):
+                    expected[x][y] += 1
+        self.assertEqual(expected, heatmap, "Heatmap should count every enemy spawn path")
+
+    def test_idealness_tables(self):
+        game = self.make_turn_0_map()
+        self.assertEqual(game.game_map.get_edges(), EDGE_LOCATIONS, "Precomputed edges should match GameMap.get_edges")
+        for edge in game.game_map.get_edges():
+            idealness_table, is_end, _ = get_edge_tables(edge)
+            direction = [1 if edge[0][0] >= 14 else -1, 1 if edge[0][1] >= 14 else -1]
+            for x, y in game.game_map:
+                if [x, y] in edge:
+                    expected = sys.maxsize
+                else:
+                    expected = 28 * (y if direction[1] == 1 else 27 - y) + (x if direction[0] == 1 else 27 - x)
+                self.assertEqual(expected, idealness_table[geometry.tile_id(x, y)], "Wrong idealness for {}".format([x, y]))
+                self.assertEqual([x, y] in edge, bool(is_end[geometry.tile_id(x, y)]), "Wrong end point mask for {}".format([x, y]))
+
+    def test_geometry(self):
+        game = self.make_turn_0_map()
+        all_locations = list(game.game_map)
+        self.assertEqual(420, geometry.TILE_COUNT, "The arena should have 420 tiles")
+        self.assertEqual([13, 0], all_locations[0], "Iteration should start at the bottom corner")
+        self.assertEqual([14, 27], all_locations[-1], "Iteration should end at the top corner")
+        self.assertEqual(all_locations, list(game.game_map), "Iterating twice should give the same locations")
+        for tile, location in enumerate(all_locations):
+            self.assertEqual(tile, geometry.tile_id(*location), "Tile ids should follow iteration order")
+            self.assertEqual(tuple(location), geometry.LOCATIONS[tile], "Tile ids should map back to their location")
+        self.assertEqual(420, len([[x, y] for x in range(-2, 30) for y in range(-2, 30) if game.game_map.in_arena_bounds([x, y])]), "Bounds should match the arena")
+        self.assertIsNone(geometry.tile_id(0, 0), "Corners of the square are outside the arena")
+        self.assertTrue(game.game_map.in_arena_bounds([13.5, 0]), "Float locations should use the bounds formula")
+        neighbors = [geometry.LOCATIONS[tile] for tile in geometry.NEIGHBORS[geometry.tile_id(13, 13)]]
+        self.assertEqual([(13, 14), (13, 12), (14, 13), (12, 13)], neighbors, "Neighbors should be up, down, right, left")
+        self.assertEqual(25, geometry.distance_squared(geometry.tile_id(13, 0), geometry.tile_id(16, 4)), "Wrong squared distance")
+
+        def legacy_range(location, radius):
+            locations = []
+            for i in range(int(location[0] - 5), int(location[0] + 6)):
+                for j in range(int(location[1] - 5), int(location[1] + 6)):
+                    if game.game_map.in_arena_bounds([i, j]) and game.game_map.distance_between_locations(location, [i, j]) < radius + 0.01:
+                        locations.append([i, j])
+            return locations
+        for location in [[13, 0], [0, 13], [20, 20], [14, 27], [13.5, 6.5]]:
+            for radius in [0, 1, 2.5, 3.5, 4.5]:
+                in_range = game.game_map.get_locations_in_range(location, radius)
+                self.assertEqual(legacy_range(location, radius), in_range, "Wrong locations in range of {}".format(location))
+                self.assertEqual(in_range, [list(tile) for tile in game.game_map.locations_in_range(location, radius)], "Both range functions should agree")
+        self.assertIn([13, 1], game.game_map.get_locations_in_range([13, 0], 4.5), "get_locations_in_range should return [x, y] lists")
+        self.assertIs(game.game_map.locations_in_range([13, 0], 4.5), game.game_map.locations_in_range([13, 0], 4.5), "Tile ranges should be cached")
+
+    def make_unit_state(self, seed):
+        rng = random.Random(seed)
+        player_units = [[[] for _ in range(8)] for _ in range(2)]
+        for x, y in geometry.LOCATIONS:
+            player = 0 if y < 14 else 1
+            roll = rng.random()
+            if roll < 0.3:
+                player_units[player][rng.randint(0, 2)].append([x, y, rng.choice([0, 20.0, 42.5])])
+                if rng.random() < 0.2:
+                    player_units[player][6].append([x, y, 0])
+                if rng.random() < 0.2:
+                    player_units[player][7].append([x, y, 0])
+            elif roll < 0.4:
+                for _ in range(rng.randint(1, 3)):
+                    player_units[player][rng.randint(3, 5)].append([x, y, rng.choice([0, 5.0])])
+        return json.dumps({"p1Units": player_units[0], "p2Units": player_units[1], "turnInfo": [0, 3, -1],
+                           "p1Stats": [30.0, 25.0, 5.0, 0], "p2Stats": [30.0, 25.0, 5.0, 0], "events": {}})
+
+    def test_array_game_map(self):
+        config = self.make_turn_0_map().config
+        for seed in range(3):
+            state_string = self.make_unit_state(seed)
+            game = GameState(config, state_string)
+            game_map_module.DEFAULT_STORAGE = "arrays"
+            try:
+                array_game = GameState(config, state_string)
+            finally:
+                game_map_module.DEFAULT_STORAGE = "lists"
+            self.assertIsInstance(array_game.game_map, game_map_module.ArrayGameMap)
+            self.assertEqual(game.game_map.blocked_hash, array_game.game_map.blocked_hash, "Both storages should block the same tiles")
+            for location in game.game_map:
+                units = game.game_map[location]
+                views = array_game.game_map[location]
+                self.assertEqual(repr(units), repr(views), "Units differ at {}".format(location))
+                for unit, view in zip(units, views):
+                    for name in ["unit_type", "player_index", "x", "y", "stationary", "speed", "damage_f", "damage_i", "attackRange",
+                                 "shieldRange", "max_health", "health", "cost", "shieldPerUnit", "shieldBonusPerY", "pending_removal", "upgraded"]:
+                        self.assertEqual(getattr(unit, name), getattr(view, name), "{} differs at {}".format(name, location))
+                    self.assertEqual(repr(game.get_target(unit)), repr(array_game.get_target(view)), "Targets differ at {}".format(location))
+                self.assertEqual(repr(game.get_attackers(location, 0)), repr(array_game.get_attackers(location, 0)), "Attackers differ at {}".format(location))
+
+        array_map = game_map_module.ArrayGameMap(config)
+        array_map.add_unit("PI", [13, 0], 0)
+        array_map.add_unit("PI", [13, 0], 0)
+        self.assertEqual(2, len(array_map[13, 0]), "Mobile units should stack")
+        array_map[13, 0][0].health = 3
+        self.assertEqual(3, array_map[13, 0][0].health, "Views should write to the table")
+        array_map.add_unit("FF", [13, 0], 0)
+        self.assertEqual(["FF"], [unit.unit_type for unit in array_map[13, 0]], "Structures should replace the tile")
+        array_map[13, 0] = array_map[13, 0] + [GameUnit("EI", config, 1, None, 13, 0)]
+        self.assertEqual(["FF", "EI"], [unit.unit_type for unit in array_map[13, 0]], "Assignment should copy units into the table")
+        array_map.remove_unit([13, 0])
+        self.assertEqual([], array_map[13, 0], "Removed tiles should be empty")
+        self.assertFalse([13, 0] in array_map.blocked_board, "Removed structures should not be blocked")
+
+    def test_units_of(self):
+        config = self.make_turn_0_map().config
+        game = GameState(config, self.make_unit_state(6))
+        rng = random.Random(6)
+        for _ in range(30):
+            player_index = rng.randint(0, 1)
+            unit_type = rng.choice([None, "FF", "EF", "DF", "PI", "EI", "SI"])
+            xs = rng.choice([None, rng.sample(range(28), 5)])
+            ys = rng.choice([None, [14, 15, 16], [0, 1, 2, 3]])
+            expected = [unit for location in game.game_map for unit in game.game_map[location]
+                        if unit.player_index == player_index and (unit_type is None or unit.unit_type == unit_type)
+                        and (xs is None or location[0] in xs) and (ys is None or location[1] in ys)]
+            self.assertEqual(expected, game.game_map.units_of(player_index, unit_type, xs, ys), "Wrong units for {} {} {} {}".format(player_index, unit_type, xs, ys))
+        location = [13, 14]
+        game.game_map.remove_unit(location)
+        game.game_map.add_unit("DF", location, 1)
+        self.assertIn(game.game_map[location][0], game.game_map.units_of(1, "DF", ys=[14]), "Added units should be indexed")
+        game.game_map.remove_unit(location)
+        self.assertEqual([], game.game_map.units_of(1, xs=[13], ys=[14]), "Removed units should leave the index")
+
+    def check_damage_map(self, game, player_index):
+        damage_map = game.damage_map(player_index)
+        for location in game.game_map:
+            attackers = game.get_attackers(location, player_index)
+            self.assertEqual(sum(unit.damage_i for unit in attackers), damage_map.mobile_damage(location), "Wrong mobile damage at {}".format(location))
+            self.assertEqual(sum(unit.damage_f for unit in attackers), damage_map.structure_damage(location), "Wrong structure damage at {}".format(location))
+
+    def test_damage_map(self):
+        config = self.make_turn_0_map().config
+        game = GameState(config, self.make_unit_state(8))
+        game.suppress_warnings(True)
+        game._player_resources[0]["SP"] = 1000
+        for player_index in [0, 1]:
+            self.check_damage_map(game, player_index)
+        start = [location for location in game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT) if not game.contains_stationary_unit(location)][0]
+        path = game.find_path_to_edge(start)
+        self.assertEqual(sum(game.damage_map(0).mobile_damage(location) for location in path), game.damage_map(0).path_damage(path), "Path damage should sum the path")
+
+        checkpoint = game.checkpoint()
+        rng = random.Random(8)
+        for location in rng.sample([location for location in game.game_map if location[1] < 14], 30):
+            game.attempt_spawn("DF", location)
+            game.attempt_upgrade(location)
+        for location in rng.sample([location for location in game.game_map if location[1] >= 14], 30):
+            game.game_map.remove_unit(location)
+        self.check_damage_map(game, 1)
+        self.check_damage_map(game, 0)
+        game.rollback(checkpoint)
+        self.check_damage_map(game, 1)
+
+    def test_score_spawn_options(self):
+        config = self.make_turn_0_map().config
+        game = GameState(config, self.make_unit_state(10))
+        game.suppress_warnings(True)
+        locations = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT) + game.game_map.get_edge_locations(game.game_map.BOTTOM_RIGHT)
+        speed = GameUnit("EI", config).speed
+        expected = {}
+        for location in locations:
+            path = game.find_path_to_edge(location)
+            if path is not None:
+                expected[tuple(location)] = sum(sum(unit.damage_i for unit in game.get_attackers(tile, 0)) for tile in path) / speed
+        options = game.score_spawn_options("EI", locations)
+        self.assertEqual(len(expected), len(options), "Every open location should be scored")
+        for option in options:
+            self.assertAlmostEqual(expected[tuple(option.location)], option.damage, msg="Wrong damage for {}".format(option.location))
+        self.assertEqual(sorted(option.damage for option in options), [option.damage for option in options], "Options should be ranked by damage")
+
+        options = game.score_spawn_options("EI", locations, metric="targets")
+        self.assertEqual(sorted((-option.targets for option in options)), [option.score for option in options], "Options should be ranked by targets")
+        for option in options[:3]:
+            in_range = set()
+            for tile in option.path:
+                in_range.update(tuple(location) for location in game.game_map.get_locations_in_range(tile, GameUnit("EI", config).attackRange))
+            targets = [location for location in in_range if any(unit.player_index == 1 and unit.stationary for unit in game.game_map[location])]
+            self.assertEqual(len(targets), option.targets, "Wrong targets for {}".format(option.location))
+
+    def test_resolve_targets(self):
+        config = self.make_turn_0_map().config
+        for seed in range(3):
+            for storage in ["lists", "arrays"]:
+                game_map_module.DEFAULT_STORAGE = storage
+                try:
+                    game = GameState(config, self.make_unit_state(20 + seed))
+                finally:
+                    game_map_module.DEFAULT_STORAGE = "lists"
+                units = [unit for location in game.game_map for unit in game.game_map[location]]
+                expected = [game.get_target(unit) for unit in units]
+                self.assertEqual(expected, game.resolve_targets(units), "Bulk targets should match get_target with {} storage".format(storage))
+
+    def snapshot(self, game):
+        return ([repr(game.game_map[location]) for location in game.game_map], game.game_map.blocked_hash,
+                list(game.game_map.blocked_board), repr(game._player_resources), list(game._build_stack), list(game._deploy_stack))
+
+    def test_clone_and_rollback(self):
+        config = self.make_turn_0_map().config
+        for storage in ["lists", "arrays"]:
+            game_map_module.DEFAULT_STORAGE = storage
+            try:
+                game = GameState(config, self.make_unit_state(4))
+            finally:
+                game_map_module.DEFAULT_STORAGE = "lists"
+            game.suppress_warnings(True)
+            game._player_resources[0]["SP"] = 1000
+            original = self.snapshot(game)
+            rng = random.Random(9)
+            our_half = [location for location in game.game_map if location[1] < 14]
+
+            clone = game.clone()
+            for location in rng.sample(our_half, 40):
+                clone.attempt_spawn(rng.choice(["FF", "DF", "EF"]), location)
+                clone.attempt_upgrade(location)
+                clone.game_map.remove_unit(rng.choice(our_half))
+            self.assertEqual(original, self.snapshot(game), "Changing a {} clone should not change the original".format(storage))
+            self.assertNotEqual(original, self.snapshot(clone), "The clone should have changed")
+
+            outer = game.checkpoint()
+            for location in rng.sample(our_half, 20):
+                game.attempt_spawn(rng.choice(["FF", "DF", "EF"]), location)
+            middle_snapshot = self.snapshot(game)
+            middle = game.checkpoint()
+            for location in rng.sample(our_half, 20):
+                game.attempt_upgrade(location)
+                game.attempt_spawn("EI", [13, 0])
+                game.game_map.remove_unit(location)
+            game.rollback(middle)
+            self.assertEqual(middle_snapshot, self.snapshot(game), "Rollback should undo changes since the inner {} checkpoint".format(storage))
+            game.rollback(outer)
+            self.assertEqual(original, self.snapshot(game), "Rollback should undo changes since the outer {} checkpoint".format(storage))
+
+    def test_simulator(self):
+        game = self.make_turn_0_map()
+        game.attempt_spawn("PI", [13, 0], 3)
+        original = self.snapshot(game)
+        result = simulate(game)
+        self.assertEqual(original, self.snapshot(game), "Simulating should not change the original state")
+        self.assertEqual([3, 0], result.breaches, "Undefended scouts should all breach")
+        self.assertEqual([3, 0], result.sp_gained, "Breaches should earn SP")
+        self.assertEqual(game.enemy_health - 3, result.game_state.enemy_health, "Breaches should damage the enemy")
+        self.assertEqual(28, result.frames, "A scout should cross the arena in 28 frames")
+
+        game = self.make_turn_0_map()
+        for x in range(28):
+            game.game_map.add_unit("FF", [x, 14], 1)
+        simulator = Simulator(game)
+        simulator.spawn("PI", [13, 0])
+        simulator.spawn("EI", [14, 27], player_index=1)
+        result = simulator.run()
+        self.assertEqual([0, 0], result.breaches, "Walled off scouts should not breach")
+        self.assertEqual([1, 1], result.self_destructs, "Units with no path to their edge should self destruct")
+        self.assertEqual(0, result.game_state.enemy_health - game.enemy_health, "Self destructs should not damage the enemy")
+        wall_damage = sum(75 - simulator.structures[x, 14].health for x in range(28))
+        self.assertEqual(result.damage_dealt[0], wall_damage, "All of the scout's damage should land on the walls")
+        self.assertGreaterEqual(wall_damage, 30, "The self destruct should damage the walls next to it")
+
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 3], 1)
+        game.attempt_spawn("PI", [13, 0])
+        simulator = Simulator(game)
+        simulator.step()
+        self.assertLess(simulator.mobile_units[0].health, 15, "The turret should attack the scout")
+        result = simulator.run()
+        self.assertEqual([0, 0], result.breaches, "The scout should not survive the turret")
+        self.assertEqual([0, 0], result.structures_destroyed, "The scout should not destroy the turret")
+        self.assertTrue(result.game_state.contains_stationary_unit([13, 3]), "Structures should only be removed when destroyed")
+
+        # A demolisher and a turret that kill each other in the same frame both deal their damage
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 2], 1, 6)
+        game.attempt_spawn("EI", [13, 0])
+        simulator = Simulator(game)
+        simulator.step()
+        self.assertEqual([], simulator.mobile_units, "The turret should kill the demolisher")
+        self.assertNotIn((13, 2), simulator.structures, "The demolisher should destroy the turret")
+        self.assertEqual([6, 5], simulator.result.damage_dealt, "Both should attack even though the other died first")
+
+    def test_batch_simulator(self):
+        game = self.make_turn_0_map()
+        for x in range(8, 20):
+            game.game_map.add_unit("FF", [x, 14], 1)
+        game.game_map.add_unit("DF", [12, 15], 1)
+        game.game_map.add_unit("DF", [16, 15], 1)
+        game.game_map.add_unit("EF", [13, 16], 1)
+        scenarios = [[], [("PI", [13, 0], 5)], [("EI", [14, 0], 2), ("PI", [13, 0], 1)], [("SI", [4, 9], 3)],
+                     [("EI", [14, 0], 6)], [("EI", [20, 6], 5)], [("EI", [20, 6], 5), ("PI", [[7, 6], [20, 6]], 4)],
+                     [("EI", [13, 0], 1)]]
+        # The last scenario's demolisher and this turret kill each other in the first frame
+        game.game_map.add_unit("DF", [13, 2], 1, 6)
+        batch = BatchSimulator(game, scenarios)
+        results = batch.run()
+        self.assertEqual(len(scenarios), len(results), "There should be one result per scenario")
+        for deployment, result in zip(scenarios, results):
+            simulator = Simulator(game)
+            for unit_type, location, num in deployment:
+                simulator.spawn(unit_type, location, num)
+            expected = simulator.run()
+            for name in ["frames", "breaches", "damage_dealt", "structures_destroyed", "self_destructs", "mp_spent", "sp_gained"]:
+                self.assertEqual(getattr(expected, name), getattr(result, name), "Batched {} should match a single simulation of {}".format(name, deployment))
+            self.assertEqual(expected.game_state.enemy_health, result.game_state.enemy_health, "Batched breaches should cost the same health")
+        self.assertTrue(any(result.structures_destroyed[0] for result in results), "Some scenario should destroy structures and find new paths")
+        self.assertEqual([6, 5], results[-1].damage_dealt, "Units killing each other in the same frame should both deal damage")
+        self.assertEqual([1, 0], results[-1].structures_destroyed, "The demolisher should destroy the turret")
+        self.assertEqual([0, 0], results[0].mp_spent, "An empty deployment should spend nothing")
+        self.assertEqual([7, 0], results[2].mp_spent, "MP spent should add up the unit costs")
+        best = max(range(len(results)), key=lambda index: (results[index].breaches[0], results[index].structures_destroyed[0], results[index].damage_dealt[0]))
+        self.assertEqual(best, batch.best(), "The best scenario should have the most breaches")
+        separate_seconds, batch_seconds = benchmark_batch(game, scenarios, repeat=1)
+        self.assertGreater(separate_seconds, 0, "The separate simulations should be timed")
+        self.assertGreater(batch_seconds, 0, "The batch should be timed")
+
+    def test_fidelity(self):
+        game = self.make_turn_0_map()
+        config = game.config
+        type_index = {type_config["shorthand"]: index for index, type_config in enumerate(config["unitInformation"])}
+        for x in range(10, 18):
+            game.game_map.add_unit("FF", [x, 14], 1, 10)
+        game.game_map.add_unit("DF", [13, 16], 1)
+        game.attempt_spawn("PI", [13, 0], 4)
+
+        def frame_line(simulator, frame, breaches):
+            units = [[[] for _ in range(8)] for _ in range(2)]
+            for unit in list(simulator.structures.values()) + simulator.mobile_units:
+                units[unit.player_index][type_index[unit.unit_type]].append([unit.x, unit.y, unit.health, ""])
+            return json.dumps({"p1Units": units[0], "p2Units": units[1], "turnInfo": [1, 1, frame],
+                               "p1Stats": [30.0, 25.0, 5.0, 0], "p2Stats": [30.0, 25.0, 5.0, 0],
+                               "events": {"breach": [[[0, 0], 1, 3, "", 1]] * breaches}})
+
+        simulator = Simulator(game)
+        lines = [json.dumps(config), frame_line(simulator, 0, 0)]
+        while simulator.mobile_units:
+            breaches = simulator.result.breaches[0]
+            simulator.step()
+            lines.append(frame_line(simulator, simulator.frame, simulator.result.breaches[0] - breaches))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "match.replay")
+            with open(path, "w") as replay_file:
+                replay_file.write("\n".join(lines))
+            report = fidelity.check_replays([directory])[0]
+            self.assertIsNone(report.error, "The replay should load")
+            self.assertEqual(len(lines) - 2, len(report.frames), "Every frame after the first should be compared")
+            self.assertEqual(len(report.frames), report.exact_frames(), "The simulator should match its own replay exactly")
+            self.assertEqual(len(report.frames), report.simulated_frames, "Each frame should be simulated once")
+
+            tampered = json.loads(lines[5])
+            tampered["p1Units"][3][0][2] -= 4
+            tampered["events"]["breach"].append([[0, 0], 1, 3, "", 1])
+            lines[5] = json.dumps(tampered)
+            with open(path, "w") as replay_file:
+                replay_file.write("\n".join(lines))
+            report = fidelity.check_replay(path)
+            worst = max(report.frames, key=fidelity.FrameDivergence.sort_key)
+            self.assertEqual(4, worst.frame, "The tampered frame should diverge the most")
+            self.assertEqual(4, worst.health, "Health divergence should be measured")
+            self.assertEqual(-1, worst.breaches[0], "Missing breaches should be counted")
+            self.assertIn("Worst frames", fidelity.summarize([report]), "The summary should list mismatches")
+
+    def test_deadline(self):
+        now = [10.0]
+        clock = lambda: now[0]
+        deadline = Deadline(2.0, clock=clock)
+        now[0] = 11.5
+        self.assertAlmostEqual(1.5, deadline.elapsed(), msg="Elapsed time should use the clock")
+        self.assertAlmostEqual(0.5, deadline.remaining(), msg="Remaining time should count down from the budget")
+        self.assertFalse(deadline.expired(), "The deadline should not have passed yet")
+        self.assertAlmostEqual(0.25, deadline.sub(fraction=0.5).budget, msg="A part should get its share of the remaining time")
+        self.assertAlmostEqual(0.1, deadline.sub(seconds=0.1).budget, msg="A part should not take more than asked")
+        self.assertEqual(float("inf"), Deadline(None, clock=clock).remaining(), "No budget should never run out")
+
+        def evaluate(candidate):
+            now[0] += 0.2
+            return -abs(candidate - 3)
+        best, score, evaluated = anytime_search(range(10), evaluate, deadline)
+        self.assertEqual(3, evaluated, "The search should stop once the deadline passes")
+        self.assertEqual((2, -1), (best, score), "The best candidate so far should be returned")
+        self.assertEqual((None, None, 0), anytime_search([], evaluate, deadline), "No candidates should give no answer")
+        self.assertEqual(1, anytime_search(range(10), evaluate, deadline)[2], "An expired search should still give an answer")
+
+        now[0] = 0.0
+        def search(depth):
+            now[0] += 0.01 * 2 ** depth
+            return depth * 10
+        result, depth = iterative_deepening(search, Deadline(1.0, clock=clock))
+        self.assertEqual((50, 5), (result, depth), "Depths predicted to miss the deadline should not start")
+        self.assertLessEqual(now[0], 1.0, "Iterative deepening should finish inside the deadline")
+        self.assertEqual(2, iterative_deepening(search, Deadline(None, clock=clock), max_depth=2)[1], "max_depth should limit the search")
+
+        class TimedAlgo(AlgoCore):
+            def on_turn(self, game_state):
+                self.turn_deadline = self.deadline
+        config = self.make_turn_0_map().config
+        messages = [json.dumps(config), """{"turnInfo":[0,1,-1]}""", """{"turnInfo":[2,1,-1]}"""]
+        algo = TimedAlgo()
+        with mock.patch("gamelib.algocore.get_command", side_effect=messages), mock.patch("sys.stderr"):
+            algo.start()
+        self.assertAlmostEqual(4.0, algo.turn_budget, msg="The budget should default to part of the soft time limit")
+        self.assertEqual(algo.turn_budget, algo.turn_deadline.budget, "on_turn should see the turn's deadline")
+        self.assertLess(algo.turn_deadline.elapsed(), 1, "The deadline should start when the turn arrives")
+
+    def test_background_worker(self):
+        release = threading.Event()
+        started = []
+        def compute(frame):
+            started.append(frame)
+            release.wait(5)
+            return frame * 2
+        worker = BackgroundWorker(compute)
+        def wait_for(condition):
+            for _ in range(500):
+                if condition():
+                    break
+                time.sleep(0.01)
+        for frame in range(5):
+            worker.submit(frame, 1)
+        self.assertIsNone(worker.collect(0, 1), "Nothing should be collected before a frame finishes")
+        release.set()
+        wait_for(lambda: worker.frames_discarded == 1)
+        self.assertIsNone(worker.collect(0, 1), "A computation running at collect should never be handed back")
+        self.assertEqual([0], started, "Frames pending at collect should be dropped")
+        release.clear()
+        worker.submit(5, 2)
+        threading.Timer(0.05, release.set).start()
+        self.assertEqual(10, worker.collect(5, 2), "Collect should wait for the frame in progress")
+        release.clear()
+        for frame in range(6, 9):
+            worker.submit(frame, 3)
+        release.set()
+        wait_for(lambda: worker.frames_computed == 3)
+        self.assertEqual(16, worker.collect(0, 3), "Frames arriving while busy should be replaced by the latest")
+        self.assertEqual([0, 5, 6, 8], started, "Only the latest pending frame should be computed")
+        self.assertEqual(4, worker.frames_skipped, "Replaced frames should be counted")
+        self.assertIsNone(worker.collect(), "Artifacts should only be handed off once")
+        worker.submit(9, 3)
+        wait_for(lambda: worker.frames_computed == 4)
+        self.assertIsNone(worker.collect(0, 4), "Artifacts of an earlier turn should be discarded")
+        self.assertEqual(2, worker.frames_discarded, "Discarded artifacts should be counted")
+        worker.stop()
+
+        game = self.make_turn_0_map()
+        state = json.loads(self.make_unit_state(7))
+        state["turnInfo"] = [1, 3, 12]
+        frame = json.dumps(state)
+        worker = BackgroundWorker(partial(precompute_artifacts, game.config), "process")
+        worker.submit(frame)
+        artifacts = worker.collect(30)
+        worker.stop()
+        self.assertIsNotNone(artifacts, "The forked worker should hand back its artifacts")
+        expected = GameState(game.config, frame)
+        for location in expected.game_map:
+            if any(not unit.stationary for unit in expected.game_map[location]):
+                expected.game_map.remove_unit(location)
+        self.assertEqual(3, artifacts["turn"], "The artifacts should record their turn")
+        self.assertEqual(expected.game_map.blocked_hash, artifacts["blocked_hash"], "The artifacts should record the map they describe")
+        self.assertEqual(expected.enemy_path_heatmap(), artifacts["enemy_path_heatmap"], "The heatmap should match computing it directly")
+        self.assertEqual(expected.damage_map(0).mobile, artifacts["damage"][0][0], "Damage should ignore mobile units")
+
+        class PrecomputingAlgo(AlgoCore):
+            def on_game_start(self, config):
+                self.config = config
+                self.enable_background_precompute(lambda frame: json.loads(frame)["turnInfo"][2])
+                self.background_wait = 5
+                self.seen = []
+            def on_turn(self, game_state):
+                self.seen.append(self.precomputed)
+        messages = [json.dumps(game.config), """{"turnInfo":[0,0,-1]}"""]
+        messages += ["""{{"turnInfo":[1,0,{}]}}""".format(frame) for frame in range(3)]
+        messages += ["""{"turnInfo":[0,1,-1]}""", """{"turnInfo":[2,1,-1]}"""]
+        algo = PrecomputingAlgo()
+        with mock.patch("gamelib.algocore.get_command", side_effect=messages), mock.patch("sys.stderr"):
+            algo.start()
+        self.assertEqual(None, algo.seen[0], "The first turn has no action frames to precompute from")
+        self.assertIn(algo.seen[1], [0, 1, 2], "The next turn should get the artifacts of a finished frame")
+
+    def test_parsed_state(self):
+        config = self.make_turn_0_map().config
+        raw = self.make_unit_state(3)
+        state = ParsedState(raw)
+        self.assertEqual(raw, state, "A ParsedState should still be the message string")
+        self.assertEqual(json.loads(raw), state.data, "The decoded data should match json.loads")
+        self.assertIs(type(state.raw), str, "The raw message should be a plain string")
+        self.assertIs(state.data, decode(state), "Decoding a ParsedState should not decode again")
+        self.assertEqual(state.data, pickle.loads(pickle.dumps(state)).data, "A pickled ParsedState should keep its data")
+        self.assertIn(JSON_BACKEND, ["orjson", "ujson", "json"], "A known JSON backend should be selected")
+
+        with mock.patch("gamelib.message.loads", side_effect=AssertionError("decoded twice")):
+            game = GameState(config, state)
+        self.assertEqual(repr(GameState(config, raw).game_map[[13, 0]]), repr(game.game_map[[13, 0]]), "Parsed and raw states should build the same map")
+
+        class CountingAlgo(AlgoCore):
+            def on_turn(self, game_state):
+                self.turn_units = len(GameState(self.config, game_state).game_map.units_of(0))
+            def on_action_frame(self, action_frame_game_state):
+                self.frame_turn = action_frame_game_state.data["turnInfo"][1]
+        messages = [json.dumps(config), raw, """{"turnInfo":[1,3,0]}""", """{"turnInfo":[2,3,-1]}"""]
+        algo = CountingAlgo()
+        counting_loads = mock.Mock(side_effect=json.loads)
+        with mock.patch("gamelib.algocore.get_command", side_effect=messages), mock.patch("sys.stderr"), \
+                mock.patch("gamelib.message.loads", counting_loads), mock.patch("gamelib.algocore.loads", counting_loads):
+            algo.start()
+        self.assertEqual(len(messages) - 1, counting_loads.call_count, "Each message but the end should be decoded once")
+        self.assertEqual(len(game.game_map.units_of(0)), algo.turn_units, "on_turn should get the turn's state")
+        self.assertEqual(3, algo.frame_turn, "on_action_frame should get the decoded frame")
+
+    def test_message_fields(self):
+        config = self.make_turn_0_map().config
+        turn = self.make_unit_state(4)
+        breach = [[3, 10], 1, 3, "11", 2]
+        quiet_frame = """{"p2Units":[[],[]],"turnInfo": [1, 5, 2],"events":{"selfDestruct":[],"breach":[],"move":[[[1,2]]]}}"""
+        breach_frame = json.dumps({"p2Units": [[], []], "turnInfo": [1, 5, 3], "events": {"breach": [breach], "move": []}})
+        self.assertEqual(CONFIG, classify(json.dumps(config)), "The config should be recognized")
+        self.assertEqual(TURN, classify(turn), "A turn should be recognized")
+        self.assertEqual(FRAME, classify(quiet_frame), "A frame should be recognized")
+        self.assertEqual(END, classify("""{"turnInfo":[2,5,-1]}"""), "The end should be recognized")
+        self.assertEqual(UNKNOWN, classify("""{"turnInfo":[7,5,-1]}"""), "Unknown states should not be guessed")
+        self.assertEqual(UNKNOWN, classify("hello"), "Other strings should not be guessed")
+
+        partial_state = parse_fields(breach_frame, ["events.breach", "events.spawn", "p1Stats"])
+        self.assertFalse(partial_state.complete, "A partially decoded state should say so")
+        self.assertEqual({"turnInfo": [1, 5, 3], "events": {"breach": [breach]}}, partial_state.data, "Only the requested fields should be decoded")
+        self.assertEqual([breach], partial_state.field("events.breach"), "Fields should be found by path")
+        self.assertEqual([], partial_state.field("events.spawn", []), "Missing fields should give the default")
+        self.assertEqual(json.loads(breach_frame), decode(partial_state), "Decoding an incomplete state should decode all of it")
+        self.assertEqual([], parse_fields(quiet_frame, ["events.breach"]).field("events.breach"), "Spaces and empty lists should be handled")
+
+        class BreachAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.frame_fields = ["events.breach"]
+                self.breaches = []
+            def on_turn(self, game_state):
+                pass
+            def on_action_frame(self, action_frame_game_state):
+                self.breaches.append((action_frame_game_state.data["turnInfo"][2], action_frame_game_state.field("events.breach")))
+        algo = BreachAlgo()
+        messages = [json.dumps(config), turn, quiet_frame, breach_frame, quiet_frame, """{"turnInfo":[2,5,-1]}"""]
+        with mock.patch("gamelib.algocore.get_command", side_effect=messages), mock.patch("sys.stderr"), \
+                mock.patch("gamelib.message.loads", side_effect=json.loads) as counting_loads:
+            algo.start()
+        self.assertEqual([(3, [breach])], algo.breaches, "Only frames with breaches should reach on_action_frame")
+        self.assertEqual(1, counting_loads.call_count, "Only the turn should be fully decoded")
+
+    def test_debug_log(self):
+        class Expensive:
+            formatted = 0
+            def __format__(self, spec):
+                Expensive.formatted += 1
+                return "expensive"
+
+        stream = io.StringIO()
+        log = DebugLog(level=INFO, capacity=3, stream=stream)
+        log.debug("hidden {}", Expensive())
+        log.info("shown {} {}", 1, Expensive())
+        log.warning(lambda first, second: first + second, "joined ", "lazily")
+        self.assertEqual(0, Expensive.formatted, "Messages should not be formatted before they are flushed")
+        self.assertEqual("", stream.getvalue(), "Messages should wait for flush")
+        self.assertEqual(2, log.pending(), "Messages below the level should be dropped")
+        log.flush()
+        self.assertEqual(1, Expensive.formatted, "Only kept messages should be formatted")
+        self.assertEqual("shown 1 expensive\njoined lazily\n", stream.getvalue(), "Flushed messages should be written in order")
+
+        for number in range(5):
+            log.error("line {}", number)
+        log.flush()
+        self.assertEqual(["(2 older debug messages dropped)", "line 2", "line 3", "line 4"], stream.getvalue().splitlines()[2:], "The ring buffer should keep the newest messages")
+
+        log.set_level(OFF)
+        self.assertFalse(log.enabled_for(ERROR), "Nothing should be enabled when off")
+        log.error("off {}", Expensive())
+        self.assertEqual(0, log.pending(), "A disabled log should keep nothing")
+        log.set_level(DEBUG)
+        log.buffered = False
+        log.debug("{braces}")
+        self.assertEqual("{braces}", stream.getvalue().splitlines()[-1], "An unbuffered log should write messages without arguments as they are, right away")
+
+        # debug_write formats right away, so later changes to its arguments do not show
+        locations = [[13, 0]]
+        with mock.patch.object(DEBUG_LOG, "stream", stream):
+            DEBUG_LOG.flush()
+            debug_write("Locations:", locations)
+            locations.append([14, 0])
+            DEBUG_LOG.flush()
+        self.assertEqual("Locations:, [[13, 0]]", stream.getvalue().splitlines()[-1], "debug_write should show its arguments as they were when called")
+
+        # debug_write goes to the shared log, which AlgoCore flushes after each turn and when it crashes
+        class CrashingAlgo(AlgoCore):
+            def on_turn(self, game_state):
+                debug_write("before", "the crash ")
+                if game_state.data["turnInfo"][1] == 1:
+                    raise ValueError("crash")
+            def on_action_frame(self, action_frame_game_state):
+                debug_write("frame")
+        messages = [json.dumps(self.make_turn_0_map().config), """{"turnInfo":[0,0,-1]}""", """{"turnInfo":[1,0,0]}""", """{"turnInfo":[0,1,-1]}"""]
+        output = io.StringIO()
+        with mock.patch("gamelib.algocore.get_command", side_effect=messages), mock.patch.object(DEBUG_LOG, "stream", output):
+            DEBUG_LOG.flush()
+            output.truncate(0)
+            with mock.patch.object(DEBUG_LOG, "flush", wraps=DEBUG_LOG.flush) as flush:
+                with self.assertRaises(ValueError):
+                    CrashingAlgo().start()
+        self.assertEqual(4, flush.call_count, "The log should be flushed after the banner, the finished turn, the action frame and the crash")
+        self.assertEqual(2, output.getvalue().count("before, the crash\n"), "Both turns' messages should be written")
+        self.assertEqual(["before, the crash", "frame", "before, the crash"], output.getvalue().splitlines()[-3:], "Action frame messages should be written before the next turn")
+
+    def test_profiler(self):
+        ticks = iter(range(100))
+        profiler = Profiler(clock=lambda: next(ticks))
+        with profiler.section("ignored"):
+            pass
+        self.assertEqual({}, profiler.sections, "A disabled profiler should measure nothing")
+        profiler.enable(instrument=False)
+        with profiler.section("turn"):
+            with profiler.section("search"):
+                pass
+            with profiler.section("search"):
+                pass
+        self.assertEqual([2, 2, 1], profiler.sections["search"], "Section calls, seconds and longest call should be recorded")
+        self.assertEqual({("turn",): 3, ("turn", "search"): 2}, profiler.stacks, "Stacks should hold time spent outside of child sections")
+        self.assertEqual("turn 3000000\nturn;search 2000000\n", profiler.collapsed_stacks(), "Collapsed stacks should be in microseconds")
+        profiler.disable()
+
+        original_spawn = GameState.__dict__["attempt_spawn"]
+        class ProfiledAlgo(AlgoCore):
+            def on_turn(self, game_state):
+                game_state = GameState(self.config, game_state)
+                with profile_section("my defenses"):
+                    game_state.attempt_spawn("FF", [[13, 13], [14, 13]])
+                game_state.submit_turn()
+        config = self.make_turn_0_map().config
+        messages = [json.dumps(config), """{"turnInfo":[0,0,-1],"p1Stats":[30,40,5,0],"p2Stats":[30,40,5,0],"p1Units":[[],[],[],[],[],[],[],[]],"p2Units":[[],[],[],[],[],[],[],[]]}""", """{"turnInfo":[2,0,-1]}"""]
+        algo = ProfiledAlgo()
+        with tempfile.TemporaryDirectory() as directory:
+            algo.enable_profiling(os.path.join(directory, "profile.json"))
+            self.assertIsNot(original_spawn, GameState.__dict__["attempt_spawn"], "Enabling should wrap the timed functions")
+            with mock.patch("gamelib.algocore.get_command", side_effect=messages), mock.patch("sys.stderr"), mock.patch("sys.stdout"):
+                algo.start()
+            with open(os.path.join(directory, "profile.json")) as summary_file:
+                summary = json.load(summary_file)
+            with open(os.path.join(directory, "profile.folded")) as stacks_file:
+                stacks = stacks_file.read()
+        self.assertIs(original_spawn, GameState.__dict__["attempt_spawn"], "The original functions should be restored at the end of the game")
+        for name in ("on_turn", "my defenses", "GameState.__init__", "GameState.attempt_spawn", "GameState.submit_turn"):
+            self.assertEqual(1, summary["sections"][name]["calls"], "{} should be timed once".format(name))
+        self.assertEqual(2, summary["counts"]["GameState.can_spawn"], "Hot functions should be counted")
+        self.assertEqual([0], [turn["turn"] for turn in summary["turns"]], "Each turn should be recorded")
+        self.assertIn("on_turn;my_defenses;GameState.attempt_spawn ", stacks, "Stacks should nest strategy and gamelib sections")
+
+    def test_replayer(self):
+        config = self.make_turn_0_map().config
+        turn = """{{"turnInfo":[0,{},-1],"p1Stats":[30,40,5,0],"p2Stats":[30,40,5,0],"p1Units":[[],[],[],[],[],[],[],[]],"p2Units":[[],[],[],[],[],[],[],[]]}}"""
+        messages = [json.dumps(config) + "\n", turn.format(0) + "\n", """{"turnInfo":[1,0,0]}\n""", turn.format(1) + "\n", """{"turnInfo":[2,1,-1]}\n"""]
+
+        class RandomAlgo(AlgoCore):
+            calls = 0
+            def on_turn(self, game_state):
+                game_state = GameState(self.config, game_state)
+                game_state.attempt_spawn("FF", [[random.randint(0, 27), 13]])
+                RandomAlgo.calls += 1
+                game_state.attempt_spawn("PI", [[13, 0]], 1 + RandomAlgo.calls % 3)
+                game_state.submit_turn()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "game.rec")
+            algo = RandomAlgo()
+            algo.record_path = path
+            with mock.patch("gamelib.algocore.get_command", side_effect=messages), mock.patch("sys.stderr"), mock.patch("sys.stdout"):
+                algo.start()
+            self.assertEqual(messages, load_recording(path), "The recording should hold the messages as they were received")
+
+            class ReadingAlgo(RandomAlgo):
+                recorded = []
+                def on_turn(self, game_state):
+                    ReadingAlgo.recorded.append(len(load_recording(path)))
+                    super().on_turn(game_state)
+            algo = ReadingAlgo()
+            algo.record_path = path
+            with mock.patch("gamelib.algocore.get_command", side_effect=messages), mock.patch("sys.stderr"), mock.patch("sys.stdout"):
+                algo.start()
+            self.assertEqual([2, 4], ReadingAlgo.recorded, "Each message should be on disk before it is handled, in case the algo is killed")
+
+            run = replay(RandomAlgo, path, seed=3)
+            self.assertIsNone(run.error, "The replay should not fail")
+            self.assertTrue(run.finished, "The replay should reach the end message")
+            self.assertEqual([0, 1], run.turns, "Each turn should be played")
+            self.assertEqual(2, len(run.latencies), "Each turn should be timed")
+            self.assertEqual(2, len(run.commands[0]), "Each turn should send its build and deploy commands")
+            seeded = replay(RandomAlgo, path, seed=3)
+            self.assertEqual(run.commands[0][0], seeded.commands[0][0], "Runs with the same seed should build the same")
+            self.assertEqual(0, first_difference([run, seeded]), "The counter kept between runs should make the deploys differ")
+            self.assertIsNone(first_difference([run, run]), "Identical runs should have no difference")
+
+            class CacheAlgo(RandomAlgo):
+                cached = []
+                def on_turn(self, game_state):
+                    CacheAlgo.cached.append((len(PATH_CACHE), PATH_CACHE.misses, len(geometry._RANGE_CACHE)))
+                    super().on_turn(game_state)
+            PATH_CACHE.put("warm", [[13, 0]])
+            geometry.locations_in_range(13, 13, 3.5)
+            replay(CacheAlgo, path)
+            self.assertEqual((0, 0, 0), CacheAlgo.cached[0], "Each replay should start with empty caches")
+
+        results, difference = check_determinism(RandomAlgo, messages[:2], runs=2, seed=5)
+        self.assertFalse(results[0].finished, "A recording without its end message should be noticed")
+        self.assertEqual(0, difference, "Nondeterministic commands should be reported")
+
+    def test_bitboard(self):
+        game = self.make_turn_0_map()
+        all_locations = list(game.game_map)
+        self.assertEqual(420, len(Bitboard(VALID_MASK)), "The arena should have 420 locations")
+        self.assertEqual(sorted(all_locations), sorted(Bitboard(VALID_MASK)), "Valid mask should match the arena")
+        self.assertEqual(210, len(Bitboard(BOTTOM_HALF_MASK)), "Half of the arena should be ours")
+        for edge, locations in enumerate(game.game_map.get_edges()):
+            self.assertEqual(Bitboard.from_locations(locations), Bitboard.edge(edge), "Edge masks should match get_edges")
+        self.assertEqual(Bitboard(), ~Bitboard(VALID_MASK), "Complement should stay inside the arena")
+        self.assertEqual(5, len(Bitboard.from_locations([[13, 13]]).expand()), "A middle tile should have 4 neighbors")
+        self.assertEqual(3, len(Bitboard.from_locations([[0, 13]]).expand()), "Expanding should not wrap around rows")
+
+        game.game_map.add_unit("FF", [13, 5], 0)
+        game.game_map.add_unit("DF", [13, 20], 1)
+        game.game_map.add_unit("EI", [13, 6], 1)
+        self.assertEqual([[13, 5], [13, 20]], list(game.game_map.blocked_board), "Structures should be blocked")
+        self.assertEqual([[13, 20]], list(game.game_map.structure_boards[1]), "Enemy structures should be tracked")
+        self.assertEqual([[13, 6]], list(game.game_map.unit_boards["EI"]), "Mobile units should be tracked by type")
+        game.game_map.remove_unit([13, 5])
+        self.assertFalse([13, 5] in game.game_map.blocked_board, "Removed structures should not be blocked")
+
+        row = Bitboard.from_locations([x, 3] for x in range(10, 18))
+        pocket = Bitboard.from_locations([[13, 0]]).flood_fill(~row)
+        self.assertEqual(12, len(pocket), "Flood fill should stop at the wall")
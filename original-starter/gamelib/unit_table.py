@@ -0,0 +1,265 @@
+"""
+Struct of arrays storage for the units on a map, used by ArrayGameMap.
+
+Each unit is one row across a set of flat arrays instead of a GameUnit object,
+and the units on each tile are chained through a linked list of row indices,
+so parsing a full board allocates a handful of arrays rather than one object
+per unit. UnitView wraps a row so it can be used wherever a GameUnit is expected.
+"""
+from array import array
+from . import geometry
+
+
+def _type_stats(type_config, base=None):
+    """The per type values GameUnit reads from the config, optionally applying an upgrade on top of base
+    """
+    if base is None:
+        base = {"speed": 0, "damage_f": 0, "damage_i": 0, "attackRange": 0, "shieldRange": 0,
+                "max_health": 0, "shieldPerUnit": 0, "shieldBonusPerY": 0, "cost": [0, 0],
+                "stationary": type_config.get("unitCategory") == 0}
+        cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
+    else:
+        cost = [type_config.get("cost1", 0) + base["cost"][0], type_config.get("cost2", 0) + base["cost"][1]]
+    return {
+        "stationary": base["stationary"],
+        "speed": type_config.get("speed", base["speed"]),
+        "damage_f": type_config.get("attackDamageTower", base["damage_f"]),
+        "damage_i": type_config.get("attackDamageWalker", base["damage_i"]),
+        "attackRange": type_config.get("attackRange", base["attackRange"]),
+        "shieldRange": type_config.get("shieldRange", base["shieldRange"]),
+        "max_health": type_config.get("startHealth", base["max_health"]),
+        "shieldPerUnit": type_config.get("shieldPerUnit", base["shieldPerUnit"]),
+        "shieldBonusPerY": type_config.get("shieldBonusPerY", base["shieldBonusPerY"]),
+        "cost": cost}
+
+
+class UnitTable:
+    """Units stored as columns, one row per unit
+
+    Attributes :
+        * config (JSON): Contains information about the game
+        * type_names (list): The shorthand of each type id, in config order
+        * type_ids (dict): Maps a shorthand to its type id
+        * x, y, type_id, player, upgraded, pending_removal, alive (array): One entry per row. player is -1 for units without an owner
+        * health (array): The current health of each row
+        * cell_head (array): The first row on each tile id, -1 if the tile is empty
+        * next_unit (array): The next row on the same tile, -1 for the last one
+
+    Rows of removed units stay in the columns with alive set to 0.
+
+    """
+    def __init__(self, config):
+        self.config = config
+        unit_information = config["unitInformation"]
+        self.type_names = [type_config.get("shorthand") for type_config in unit_information]
+        self.type_ids = {name: type_id for type_id, name in enumerate(self.type_names)}
+        self.type_stats = []
+        for type_config in unit_information:
+            stats = _type_stats(type_config)
+            self.type_stats.append((stats, _type_stats(type_config.get("upgrade", {}), stats)))
+
+        self.x = array("b")
+        self.y = array("b")
+        self.type_id = array("b")
+        self.player = array("b")
+        self.health = array("d")
+        self.upgraded = array("b")
+        self.pending_removal = array("b")
+        self.alive = array("b")
+        self.next_unit = array("i")
+        self.cell_head = array("i", [-1]) * geometry.TILE_COUNT
+
+    def __len__(self):
+        return len(self.x)
+
+    def add(self, unit_type, x, y, player_index=None, health=None, upgraded=False, pending_removal=False):
+        """Adds a unit to the end of the tile's chain
+
+        Args:
+            unit_type: The unit's shorthand
+            x, y: The unit's location, which must be inside the arena
+            player_index: 0 or 1, or None for a unit without an owner
+            health: The unit's health, defaults to its starting health like GameUnit
+
+        Returns:
+            The row of the new unit
+        """
+        type_id = self.type_ids[unit_type]
+        if not health:
+            health = self.type_stats[type_id][1 if upgraded else 0]["max_health"]
+        index = len(self.x)
+        self.x.append(x)
+        self.y.append(y)
+        self.type_id.append(type_id)
+        self.player.append(-1 if player_index is None else player_index)
+        self.health.append(health)
+        self.upgraded.append(1 if upgraded else 0)
+        self.pending_removal.append(1 if pending_removal else 0)
+        self.alive.append(1)
+        self.next_unit.append(-1)
+
+        tile = geometry.TILE_IDS[x * geometry.ARENA_SIZE + y]
+        last = self.cell_head[tile]
+        if last == -1:
+            self.cell_head[tile] = index
+        else:
+            while self.next_unit[last] != -1:
+                last = self.next_unit[last]
+            self.next_unit[last] = index
+        return index
+
+    def add_unit_like(self, unit, x, y):
+        """Adds a copy of a GameUnit or UnitView at [x, y]
+
+        Returns:
+            The row of the new unit
+        """
+        return self.add(unit.unit_type, x, y, unit.player_index, unit.health, unit.upgraded, unit.pending_removal)
+
+    def clear_cell(self, x, y):
+        """Removes every unit on a tile
+        """
+        tile = geometry.TILE_IDS[x * geometry.ARENA_SIZE + y]
+        index = self.cell_head[tile]
+        while index != -1:
+            self.alive[index] = 0
+            index = self.next_unit[index]
+        self.cell_head[tile] = -1
+
+    def relink_cell(self, x, y, rows):
+        """Makes rows, in order, the units on a tile again
+        """
+        tile = geometry.TILE_IDS[x * geometry.ARENA_SIZE + y]
+        self.clear_cell(x, y)
+        previous = -1
+        for index in rows:
+            self.alive[index] = 1
+            if previous == -1:
+                self.cell_head[tile] = index
+            else:
+                self.next_unit[previous] = index
+            previous = index
+        if previous != -1:
+            self.next_unit[previous] = -1
+
+    def truncate(self, row_count):
+        """Drops every row from row_count on. Those rows must no longer be on any tile.
+        """
+        for column in (self.x, self.y, self.type_id, self.player, self.health, self.upgraded,
+                       self.pending_removal, self.alive, self.next_unit):
+            del column[row_count:]
+
+    def copy(self):
+        """Creates a table with copies of the columns, sharing the config and type data
+        """
+        table = UnitTable.__new__(UnitTable)
+        table.__dict__.update(self.__dict__)
+        for name in ("x", "y", "type_id", "player", "health", "upgraded", "pending_removal", "alive", "next_unit", "cell_head"):
+            setattr(table, name, getattr(self, name)[:])
+        return table
+
+    def cell_rows(self, x, y):
+        """Gets the rows of the units on a tile, in the order they were added
+        """
+        rows = []
+        index = self.cell_head[geometry.TILE_IDS[x * geometry.ARENA_SIZE + y]]
+        while index != -1:
+            rows.append(index)
+            index = self.next_unit[index]
+        return rows
+
+    def stats(self, index):
+        """The per type values of a row, taking its upgrade into account
+        """
+        return self.type_stats[self.type_id[index]][self.upgraded[index]]
+
+
+class UnitView:
+    """A GameUnit-like view of one row of a UnitTable
+
+    Reads every attribute a GameUnit has from the table. health and pending_removal
+    can be assigned and upgrade() works as on GameUnit; other attributes are read only.
+
+    Attributes :
+        * table (:obj: UnitTable): The table holding the unit
+        * index (int): The unit's row
+
+    """
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def unit_type(self):
+        return self.table.type_names[self.table.type_id[self.index]]
+
+    @property
+    def config(self):
+        return self.table.config
+
+    @property
+    def player_index(self):
+        player = self.table.player[self.index]
+        return None if player == -1 else player
+
+    @property
+    def x(self):
+        return self.table.x[self.index]
+
+    @property
+    def y(self):
+        return self.table.y[self.index]
+
+    @property
+    def health(self):
+        return self.table.health[self.index]
+
+    @health.setter
+    def health(self, value):
+        self.table.health[self.index] = value
+
+    @property
+    def pending_removal(self):
+        return self.table.pending_removal[self.index] == 1
+
+    @pending_removal.setter
+    def pending_removal(self, value):
+        self.table.pending_removal[self.index] = 1 if value else 0
+
+    @property
+    def upgraded(self):
+        return self.table.upgraded[self.index] == 1
+
+    @property
+    def cost(self):
+        return list(self.table.stats(self.index)["cost"])
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name in UnitView.__slots__:
+            raise AttributeError(name)
+        try:
+            return self.table.stats(self.index)[name]
+        except KeyError:
+            raise AttributeError("'UnitView' object has no attribute '{}'".format(name))
+
+    def upgrade(self):
+        self.table.upgraded[self.index] = 1
+
+    def __eq__(self, other):
+        return isinstance(other, UnitView) and self.table is other.table and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.table), self.index))
+
+    def __toString(self):
+        owner = "Friendly" if self.player_index == 0 else "Enemy"
+        removal = ", pending removal" if self.pending_removal else ""
+        return "{} {}, health: {} location: {} removal: {} upgrade: {} ".format(owner, self.unit_type, self.health, [self.x, self.y], removal, self.upgraded)
+
+    def __str__(self):
+        return self.__toString()
+
+    def __repr__(self):
+        return self.__toString()
@@ -1,5 +1,7 @@
 import sys
 
+from .debug_log import DEBUG_LOG, INFO
+
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
 
@@ -29,13 +31,19 @@ def send_command(cmd):
     sys.stdout.write(cmd.strip() + "\n")
     sys.stdout.flush()
 
+def _join_message(*msg):
+    return ", ".join(map(str, msg)).strip()
+
 def debug_write(*msg):
     """Prints a message to the games debug output
 
+    The message is joined right away, so it shows the arguments as they are now, and logged to
+    DEBUG_LOG at the INFO level to be written when the log is flushed.
+
     Args:
         msg: The message to output
 
     """
     #Printing to STDERR is okay and printed out by the game but doesn't effect turns.
-    sys.stderr.write(", ".join(map(str, msg)).strip() + "\n")
-    sys.stderr.flush()
+    if DEBUG_LOG.enabled_for(INFO):
+        DEBUG_LOG.info(_join_message(*msg))